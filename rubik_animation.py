@@ -0,0 +1,87 @@
+"""
+Планировщик анимации сборки: ходы показываются поворотами слоёв.
+
+Положение анимации вычисляется по прошедшему времени, а не по числу
+отрисованных кадров, поэтому скорость не зависит от частоты кадров, а при
+нехватке времени на отрисовку кадры просто пропускаются. Модель куба
+меняется только в момент завершения хода; отрисовка лишь показывает
+текущий поворот слоя поверх состояния до хода (см. turn_geometry в rubik_render).
+"""
+import time
+from collections import deque
+
+from rubik_moves import layer_turn
+from rubik_render import turn_geometry
+
+
+def _ease(t):
+    """Плавный разгон и торможение поворота (smoothstep)."""
+    return t * t * (3 - 2 * t)
+
+
+class TurnScheduler:
+    """
+    Очередь ходов, проигрываемых во времени. Перед каждым кадром вызывается
+    advance(now): завершённые к этому моменту ходы применяются к кубу (если
+    кадры запаздывают — несколько за один вызов), а возвращается текущий
+    поворот для отрисовки. on_move(move, before, after) вызывается после
+    каждого применённого хода.
+    """
+    TURN_TIME = 0.3  # длительность поворота на 90° при скорости 1, с
+
+    def __init__(self, cube, speed=1.0, on_move=None):
+        self.cube = cube
+        self.speed = speed
+        self.on_move = on_move
+        self.queue = deque()
+        self.current = None
+        self._turn_start = 0.0
+
+    @property
+    def active(self):
+        return self.current is not None
+
+    def _duration(self, move):
+        # Поворот на 180° длиннее, но не вдвое, как у двух четвертей
+        half = layer_turn(move)[2] == 2
+        return self.TURN_TIME * (1.5 if half else 1.0) / self.speed
+
+    def start(self, moves, now=None):
+        """Начинает проигрывание ходов moves с момента now (по умолчанию — сейчас)."""
+        self.queue = deque(moves)
+        self.current = self.queue.popleft() if self.queue else None
+        self._turn_start = time.monotonic() if now is None else now
+
+    def stop(self):
+        """Останавливает анимацию; незавершённый ход к кубу не применяется."""
+        self.queue.clear()
+        self.current = None
+
+    def set_speed(self, speed, now=None):
+        """Меняет скорость (1 — ход за TURN_TIME секунд); текущий поворот продолжается с той же доли."""
+        if self.current is not None:
+            now = time.monotonic() if now is None else now
+            fraction = (now - self._turn_start) / self._duration(self.current)
+            self.speed = speed
+            self._turn_start = now - fraction * self._duration(self.current)
+        else:
+            self.speed = speed
+
+    def advance(self, now=None):
+        """
+        Продвигает анимацию к моменту now и возвращает текущий поворот
+        (ход, угол в градусах) или None, если все ходы применены.
+        """
+        now = time.monotonic() if now is None else now
+        while self.current is not None:
+            duration = self._duration(self.current)
+            fraction = (now - self._turn_start) / duration
+            if fraction < 1:
+                return self.current, turn_geometry(self.current)[1] * _ease(max(fraction, 0.0))
+            move, before = self.current, self.cube.state
+            self.cube.move(move)
+            self._turn_start += duration
+            self.current = self.queue.popleft() if self.queue else None
+            if self.on_move is not None:
+                self.on_move(move, before, self.cube.state)
+        return None
@@ -0,0 +1,196 @@
+"""
+Векторные операции над множеством кубов сразу.
+
+N состояний хранятся в массиве (N, 54) uint8 в том же формате, что и буфер
+RubiksCube (буквы цветов в ASCII, грани в порядке FACES). Ход — это одна
+выборка по индексам: общий ход для всех строк или свой ход для каждой строки.
+"""
+import numpy as np
+
+from rubik_cube import CENTERS, FACES, MOVE_INDEX, MOVE_PERMUTATIONS, MOVES, RubiksCube
+from rubik_moves import compile_sequence
+from rubik_solver import CORNER_FACELETS, CORNERS, EDGE_FACELETS, EDGES, INVALID_CODES
+
+# Номер «пустого» хода для выравнивания последовательностей разной длины
+NOP = len(MOVES)
+# Перестановки клеток для 18 ходов и тождественная перестановка для NOP
+MOVE_TABLE = np.vstack([np.array(MOVE_PERMUTATIONS, dtype=np.intp), np.arange(54, dtype=np.intp)])
+SOLVED_STATE = np.frombuffer(''.join(CENTERS[face] * 9 for face in FACES).encode('ascii'), dtype=np.uint8)
+
+
+def move_codes(moves):
+    """Номера ходов (индексы MOVES) по имени, номеру или массиву имён/номеров."""
+    if isinstance(moves, str):
+        return MOVE_INDEX[moves]
+    codes = np.asarray(moves)
+    if codes.dtype.kind in 'US':
+        codes = np.vectorize(MOVE_INDEX.__getitem__, otypes=[np.intp])(codes.astype(str))
+    return codes.astype(np.intp) if codes.ndim else int(codes)
+
+
+def apply_move(states, moves):
+    """
+    Применяет ход ко всем состояниям (N, 54). moves — один ход для всех строк
+    или массив из N ходов, по одному на строку (NOP — без хода).
+    """
+    codes = move_codes(moves)
+    if np.ndim(codes) == 0:
+        return states[:, MOVE_TABLE[codes]]
+    # Индексы в плоском массиве: одна выборка np.take на все строки
+    offsets = np.arange(len(states), dtype=np.intp)[:, None] * 54
+    return np.take(states, MOVE_TABLE[codes] + offsets)
+
+
+def apply_sequences(states, sequences):
+    """
+    Применяет к каждой строке свою последовательность ходов: sequences —
+    массив (N, L) номеров ходов, короткие последовательности дополняются NOP.
+    """
+    sequences = move_codes(sequences)
+    for column in np.atleast_2d(sequences).T:
+        states = apply_move(states, column)
+    return states
+
+
+def is_solved(states):
+    """Булев массив (N,): собрано ли каждое состояние (каждая грань одного цвета)."""
+    faces = states.reshape(len(states), 6, 9)
+    return (faces == faces[:, :, 4:5]).all(axis=(1, 2))
+
+
+def _build_piece_tables():
+    # Номер кубика и ориентация (c * 3 + o, e * 2 + o) по номерам граней его наклеек;
+    # -1 — такого кубика нет. Ориентация угла — номер наклейки цвета U/D.
+    corners = np.full(6 ** 3, -1, dtype=np.int16)
+    for c, name in enumerate(CORNERS):
+        faces = [FACES.index(f) for f in name]
+        for o in range(3):
+            t = [0] * 3
+            for k in range(3):
+                t[(o + k) % 3] = faces[k]
+            corners[(t[0] * 6 + t[1]) * 6 + t[2]] = c * 3 + o
+    edges = np.full(6 ** 2, -1, dtype=np.int16)
+    for e, name in enumerate(EDGES):
+        a, b = (FACES.index(f) for f in name)
+        edges[a * 6 + b] = e * 2
+        edges[b * 6 + a] = e * 2 + 1
+    return corners, edges
+
+
+_CORNER_LOOKUP, _EDGE_LOOKUP = _build_piece_tables()
+_CORNER_CELLS = np.array(CORNER_FACELETS, dtype=np.intp)
+_EDGE_CELLS = np.array(EDGE_FACELETS, dtype=np.intp)
+
+
+def _parity(perm):
+    n = perm.shape[1]
+    upper = np.triu(np.ones((n, n), dtype=bool), 1)
+    return ((perm[:, :, None] > perm[:, None, :]) & upper).sum(axis=(1, 2)) % 2
+
+
+def _pieces(faces):
+    # Коды кубиков на каждой позиции (c * 3 + o, e * 2 + o; -1 — нет такого кубика)
+    # по номерам граней клеток (N, 54)
+    corner_faces = faces[:, _CORNER_CELLS]
+    corner = _CORNER_LOOKUP[(corner_faces[..., 0] * 6 + corner_faces[..., 1]) * 6 + corner_faces[..., 2]]
+    edge_faces = faces[:, _EDGE_CELLS]
+    edge = _EDGE_LOOKUP[edge_faces[..., 0] * 6 + edge_faces[..., 1]]
+    return corner, edge
+
+
+def to_cubies(states):
+    """
+    Кубиковые координаты (cp, co, ep, eo) массива допустимых состояний (N, 54):
+    массивы (N, 8) и (N, 12). Недопустимые состояния нужно заранее отсеять
+    через validate.
+    """
+    states = np.asarray(states, dtype=np.uint8)
+    faces = (states[:, :, None] == states[:, None, 4::9]).argmax(axis=2)
+    corner, edge = _pieces(faces)
+    cp, co = np.divmod(corner, 3)
+    ep, eo = np.divmod(edge, 2)
+    return cp, co, ep, eo
+
+
+def validate(states):
+    """
+    Проверка допустимости раскраски для массива состояний (N, 54).
+    Возвращает массив кодов (N,) int8: 0 — состояние допустимо, иначе
+    i + 1 для первой нарушенной проверки INVALID_CODES[i] (порядок проверок
+    тот же, что в rubik_solver.facelets_to_cubies).
+    """
+    states = np.asarray(states, dtype=np.uint8)
+    n = len(states)
+    codes = np.zeros(n, dtype=np.int8)
+
+    def fail(name, mask):
+        codes[(codes == 0) & mask] = INVALID_CODES.index(name) + 1
+
+    # Номер грани для каждой клетки — по цветам центров этого же куба
+    centers = states[:, 4::9]
+    match = states[:, :, None] == centers[:, None, :]
+    fail('centers', (centers[:, :, None] == centers[:, None, :]).sum(axis=(1, 2)) != 6)
+    fail('color_count', ~match.any(axis=2).all(axis=1) | (match.sum(axis=1) != 9).any(axis=1))
+    corner, edge = _pieces(match.argmax(axis=2))
+    fail('corner', (corner < 0).any(axis=1))
+    fail('edge', (edge < 0).any(axis=1))
+
+    cp, co = np.divmod(np.maximum(corner, 0), 3)
+    ep, eo = np.divmod(np.maximum(edge, 0), 2)
+    duplicate = ((np.eye(8, dtype=bool)[cp].sum(axis=1) != 1).any(axis=1)
+                 | (np.eye(12, dtype=bool)[ep].sum(axis=1) != 1).any(axis=1))
+    fail('duplicate', duplicate)
+    fail('twist', co.sum(axis=1) % 3 != 0)
+    fail('flip', eo.sum(axis=1) % 2 != 0)
+    fail('parity', _parity(cp) != _parity(ep))
+    return codes
+
+
+class CubeBatch:
+    """Набор из N кубов с векторными ходами и проверкой собранности."""
+
+    def __init__(self, states):
+        states = np.asarray(states, dtype=np.uint8)
+        if states.ndim != 2 or states.shape[1] != 54:
+            raise ValueError("ожидается массив состояний формы (N, 54)")
+        self.states = states
+
+    @classmethod
+    def solved(cls, n):
+        return cls(np.tile(SOLVED_STATE, (n, 1)))
+
+    @classmethod
+    def from_cubes(cls, cubes):
+        return cls(np.array([np.frombuffer(cube.state, dtype=np.uint8) for cube in cubes]))
+
+    def to_cubes(self):
+        return [RubiksCube(row.tobytes()) for row in self.states]
+
+    def __len__(self):
+        return len(self.states)
+
+    def move(self, moves):
+        """Ход для всех кубов или по ходу на каждый куб (аналог RubiksCube.move)."""
+        self.states = apply_move(self.states, moves)
+
+    def apply(self, sequences):
+        """
+        Последовательность ходов для всех кубов или матрица (N, L) по строке на куб.
+        Строка нотации ("R U R' U'", допускаются Rw, M, x, ...) компонуется
+        в одну перестановку и применяется одной выборкой.
+        """
+        if isinstance(sequences, str):
+            self.states = self.states[:, np.array(compile_sequence(sequences), dtype=np.intp)]
+            return
+        codes = move_codes(sequences)
+        if np.ndim(codes) == 2:
+            self.states = apply_sequences(self.states, codes)
+        else:
+            for code in np.atleast_1d(codes):
+                self.states = apply_move(self.states, int(code))
+
+    def is_solved(self):
+        return is_solved(self.states)
+
+    def validate(self):
+        return validate(self.states)
@@ -0,0 +1,417 @@
+"""
+Замеры производительности решателя, проверки, отрисовки и записи анимаций.
+
+    python -m rubik_cube bench --out bench.json
+    python -m rubik_cube bench --compare old.json --out new.json
+
+Все случайные данные строятся из --seed, поэтому прогоны на одной машине
+сравнимы между собой. Результат — JSON {"meta": {...}, "results": {...}}:
+в meta — версии Python и библиотек, в results — по словарю метрик на каждый
+замер. Метрики с суффиксом _per_s — чем больше, тем лучше, с суффиксами _s
+и _ms — чем меньше, тем лучше; по ним --compare ищет ухудшения. Замер,
+который нельзя выполнить (например, нет OpenGL), записывается как
+{"skipped": "причина"}.
+"""
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from rubik_cube import MOVES, RubiksCube
+
+BENCHMARKS = ('startup', 'moves', 'random', 'validate', 'solve', 'tables', 'render', 'paint', 'export')
+
+# Бюджет времени импорта при запуске приложения (import main), мс
+STARTUP_BUDGET_MS = 450
+# Модули, которые приложение загружает только по требованию или в фоне после показа окна
+LAZY_MODULES = ('imageio', 'rubik_solver', 'rubik_optimal', 'rubik_cache', 'rubik_tables', 'rubik_stats')
+
+
+def _best(func, repeat=3):
+    """Лучшее из repeat время выполнения func() в секундах."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _scrambles(count, seed, length=25):
+    rng = random.Random(seed)
+    return [[rng.choice(MOVES) for _ in range(length)] for _ in range(count)]
+
+
+def _scrambled_cubes(count, seed):
+    # Равномерно случайные состояния: случайные ходы дают смещённую выборку
+    from rubik_random import random_states
+
+    return [RubiksCube(row.tobytes()) for row in random_states(count, seed)]
+
+
+def _percentiles(samples):
+    ms = np.array(samples) * 1000
+    return {
+        'count': len(samples),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p90_ms': float(np.percentile(ms, 90)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+    }
+
+
+def import_times(statement='import main', repeat=3):
+    """
+    Время импорта по python -X importtime в отдельном процессе (лучший из repeat
+    запусков): (общее время в мс, {модуль: накопленное время в мс}).
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], cwd=root, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else statement)
+        total, modules = 0.0, {}
+        for line in proc.stderr.splitlines():
+            # "import time:  self [us] | cumulative | imported package"
+            if not line.startswith('import time:') or 'imported package' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            cumulative = int(cumulative) / 1000
+            modules[name.strip()] = cumulative
+            if not name[1:].startswith(' '):  # модуль верхнего уровня
+                total += cumulative
+        if best is None or total < best[0]:
+            best = (total, modules)
+    return best
+
+
+def check_startup(budget_ms=STARTUP_BUDGET_MS, statement='import main'):
+    """
+    Проверка времени запуска: список нарушений (пустой, если всё в порядке) —
+    превышение бюджета и модули из LAZY_MODULES, загруженные при импорте.
+    """
+    total, modules = import_times(statement)
+    problems = []
+    if total > budget_ms:
+        slowest = sorted(modules.items(), key=lambda item: -item[1])[:5]
+        details = ', '.join(f"{name} {ms:.0f} мс" for name, ms in slowest)
+        problems.append(f"импорт занимает {total:.0f} мс при бюджете {budget_ms:.0f} мс ({details})")
+    for name in LAZY_MODULES:
+        if name in modules:
+            problems.append(f"модуль {name} загружается при запуске, хотя нужен только по требованию")
+    return problems
+
+
+def bench_startup(seed=0, quick=False):
+    """Время импорта модулей приложения (import main) по -X importtime."""
+    try:
+        total, modules = import_times(repeat=1 if quick else 3)
+    except RuntimeError as e:
+        return {'skipped': f"приложение не импортируется: {e}"}
+    top = sorted(modules.items(), key=lambda item: -item[1])[:10]
+    return {
+        'import_ms': total,
+        'slowest_modules_ms': dict(top),
+        'eager_lazy_modules': [name for name in LAZY_MODULES if name in modules],
+    }
+
+
+def bench_moves(seed=0, quick=False):
+    """Ходы в секунду: RubiksCube.move, apply (скомпилированная последовательность) и rubik_batch."""
+    from rubik_batch import CubeBatch, apply_move, apply_sequences, move_codes
+
+    count = 20000 if quick else 200000
+    moves = _scrambles(1, seed, count)[0]
+    cube = RubiksCube.solved()
+
+    def single():
+        move = cube.move
+        for m in moves:
+            move(m)
+
+    sequences = [' '.join(s) for s in _scrambles(256, seed, 20)]
+    rounds = count // (20 * len(sequences))
+
+    def compiled():
+        for _ in range(rounds):
+            for sequence in sequences:
+                cube.apply(sequence)
+
+    n = 1000 if quick else 10000
+    batch = CubeBatch.solved(n)
+    codes = move_codes(moves[:20])
+    matrix = np.tile(codes, (n, 1))
+
+    def batch_moves():
+        states = batch.states
+        for code in codes:
+            states = apply_move(states, int(code))
+
+    single_time = _best(single)
+    compiled()  # прогрев кэша перестановок
+    compiled_time = _best(compiled)
+    return {
+        'move_per_s': count / single_time,
+        'apply_moves_per_s': 20 * rounds * len(sequences) / compiled_time,
+        'batch_moves_per_s': n * len(codes) / _best(batch_moves),
+        'batch_sequences_moves_per_s': n * len(codes) / _best(lambda: apply_sequences(batch.states, matrix)),
+        'batch_size': n,
+    }
+
+
+def bench_random(seed=0, quick=False):
+    """Генерация равномерно случайных состояний (rubik_random): состояния в секунду."""
+    from rubik_random import random_states, states_to_facelets
+
+    n = 100000 if quick else 1000000
+    states = random_states(n, seed)
+    return {
+        'states_per_s': n / _best(lambda: random_states(n, seed)),
+        'facelets_per_s': n / _best(lambda: states_to_facelets(states)),
+    }
+
+
+def bench_validate(seed=0, quick=False):
+    """Проверка допустимости раскраски: по одному кубу и векторно для массива."""
+    from rubik_batch import CubeBatch, validate
+    from rubik_solver import check_facelets, cube_to_facelets
+
+    cubes = _scrambled_cubes(200 if quick else 1000, seed)
+    facelets = [cube_to_facelets(cube) for cube in cubes]
+    states = CubeBatch.from_cubes(cubes * (10 if quick else 50)).states
+
+    def scalar():
+        for f in facelets:
+            check_facelets(f)
+
+    return {
+        'scalar_states_per_s': len(facelets) / _best(scalar),
+        'batch_states_per_s': len(states) / _best(lambda: validate(states)),
+    }
+
+
+def bench_solve(seed=0, quick=False, count=None):
+    """
+    Задержка решения (двухфазный алгоритм, без кэша) на фиксированном наборе
+    случайных состояний. С quick замер пропускается, если таблиц ещё нет на диске.
+    """
+    from rubik_solver import TABLES_VERSION, get_tables
+    from rubik_tables import table_path
+
+    if quick and not os.path.exists(table_path('kociemba', TABLES_VERSION)):
+        return {'skipped': "таблицы решателя не построены"}
+    get_tables()
+    cubes = _scrambled_cubes(count or (20 if quick else 200), seed)
+    samples, lengths = [], []
+    for cube in cubes:
+        start = time.perf_counter()
+        moves = cube.solve(cache=False)
+        samples.append(time.perf_counter() - start)
+        lengths.append(len(moves))
+    result = _percentiles(samples)
+    result['mean_length'] = float(np.mean(lengths))
+    return result
+
+
+def bench_tables(seed=0, quick=False, full=False):
+    """
+    Построение и загрузка таблиц решателей во временном каталоге; загрузка
+    из рабочего кэша — без проверки и с проверкой контрольных сумм.
+    Таблицы оптимального решателя строятся только при full (около минуты),
+    с quick таблицы не строятся вовсе и замеряется загрузка только уже
+    существующих файлов.
+    """
+    import rubik_optimal
+    import rubik_solver
+    from rubik_tables import load_tables, read_tables, table_path
+
+    sets = [('kociemba', rubik_solver.TABLES_VERSION, rubik_solver._build_tables)]
+    if full:
+        sets.append(('optimal', rubik_optimal.TABLES_VERSION, rubik_optimal._build_databases))
+    result = {}
+    if not quick:
+        with tempfile.TemporaryDirectory() as directory:
+            for name, version, build in sets:
+                start = time.perf_counter()
+                load_tables(name, version, build, directory)
+                result[f'{name}_build_s'] = time.perf_counter() - start
+    if not quick:
+        rubik_solver.get_tables()
+        if full:
+            rubik_optimal.get_databases()
+    for name, version in (('kociemba', rubik_solver.TABLES_VERSION), ('optimal', rubik_optimal.TABLES_VERSION)):
+        path = table_path(name, version)
+        if not os.path.exists(path):
+            continue
+        result[f'{name}_load_s'] = _best(lambda: read_tables(path, version))
+        result[f'{name}_load_verify_s'] = _best(lambda: read_tables(path, version, verify=True))
+        result[f'{name}_bytes'] = os.path.getsize(path)
+    return result
+
+
+def bench_render(seed=0, quick=False):
+    """Кадры в секунду растеризатора без дисплея (rubik_render.Rasterizer)."""
+    from rubik_render import Rasterizer
+
+    start = time.perf_counter()
+    rasterizer = Rasterizer()
+    setup = time.perf_counter() - start
+    states = [cube.state for cube in _scrambled_cubes(50, seed)]
+
+    def frames():
+        for state in states:
+            rasterizer.render(state, flash=range(9))
+
+    return {'setup_s': setup, 'frames_per_s': len(states) / _best(frames)}
+
+
+def bench_paint(seed=0, quick=False):
+    """Время Cube3DWidget.paintGL в скрытом окне (нужен контекст OpenGL)."""
+    try:
+        from PyQt5.QtWidgets import QApplication, QOpenGLWidget
+        import PyQt5.QtOpenGL
+        # Как в main.py: QOpenGLWidget находится в PyQt5.QtWidgets
+        PyQt5.QtOpenGL.QOpenGLWidget = QOpenGLWidget
+        from OpenGL.GL import glFinish
+        from rubik_gui import Cube3DWidget
+    except ImportError as e:
+        return {'skipped': f"нет зависимостей GUI: {e}"}
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    cubes = _scrambled_cubes(20, seed)
+    widget = Cube3DWidget(cubes[0])
+    widget.resize(480, 352)
+    widget.grabFramebuffer()  # создаёт контекст и вызывает initializeGL
+    if not widget.isValid():
+        return {'skipped': "не удалось создать контекст OpenGL"}
+    widget.makeCurrent()
+    count = 50 if quick else 500
+    samples = []
+    for i in range(count):
+        widget.cube = cubes[i % len(cubes)]
+        # Каждый второй кадр — с поворотом слоя, как во время анимации
+        widget.turn = ('R', 45.0) if i % 2 else None
+        start = time.perf_counter()
+        widget.paintGL()
+        glFinish()
+        samples.append(time.perf_counter() - start)
+    widget.doneCurrent()
+    return _percentiles(samples)
+
+
+def bench_export(seed=0, quick=False):
+    """Кодирование кадров в GIF (и MP4, если установлен imageio-ffmpeg): кадры в секунду."""
+    from rubik_render import OPENCOLOR_MAP, Rasterizer
+    from rubik_video import export
+
+    rasterizer = Rasterizer()
+    states = [cube.state for cube in _scrambled_cubes(30 if quick else 120, seed)]
+    frames = [rasterizer.render(state) for state in states]
+    result = {'frames': len(frames)}
+    with tempfile.TemporaryDirectory() as directory:
+        for ext in ('gif', 'mp4'):
+            path = os.path.join(directory, f'bench.{ext}')
+            try:
+                elapsed = _best(lambda: export(frames, path, 20, colors=OPENCOLOR_MAP.values()), repeat=1)
+            except (ImportError, RuntimeError, OSError) as e:
+                result[f'{ext}_skipped'] = str(e)
+                continue
+            result[f'{ext}_frames_per_s'] = len(frames) / elapsed
+            result[f'{ext}_bytes'] = os.path.getsize(path)
+    return result
+
+
+def _meta(seed, quick):
+    meta = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'seed': seed,
+        'quick': quick,
+    }
+    try:
+        import PIL
+        meta['pillow'] = PIL.__version__
+    except ImportError:
+        pass
+    return meta
+
+
+def run(names=BENCHMARKS, seed=0, quick=False, full=False, log=None):
+    """Выполняет замеры names и возвращает словарь результатов для записи в JSON."""
+    results = {}
+    for name in names:
+        func = globals()[f'bench_{name}']
+        options = {'full': full} if name == 'tables' else {}
+        if log is not None:
+            log.write(f"{name}...\n")
+            log.flush()
+        start = time.perf_counter()
+        results[name] = func(seed=seed, quick=quick, **options)
+        results[name]['elapsed_s'] = time.perf_counter() - start
+    return {'meta': _meta(seed, quick), 'results': results}
+
+
+def compare(old, new, threshold=0.1):
+    """
+    Список ухудшений более чем на threshold (доля) между двумя результатами run():
+    строки вида "solve.p50_ms: 41.2 -> 55.0 (+33%)". Общее время замеров не сравнивается.
+    """
+    regressions = []
+    for name, metrics in new['results'].items():
+        previous = old['results'].get(name, {})
+        for key, value in metrics.items():
+            before = previous.get(key)
+            if key == 'elapsed_s' or not isinstance(value, (int, float)) or not isinstance(before, (int, float)):
+                continue
+            if before <= 0:
+                continue
+            change = value / before - 1
+            if key.endswith('_per_s'):
+                worse = change < -threshold
+            elif key.endswith(('_s', '_ms')):
+                worse = change > threshold
+            else:
+                continue
+            if worse:
+                regressions.append(f"{name}.{key}: {before:.4g} -> {value:.4g} ({change:+.0%})")
+    return regressions
+
+
+def main(args):
+    names = args.only or BENCHMARKS
+    report = run(names, args.seed, args.quick, args.full, log=sys.stderr)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        for line in regressions:
+            sys.stderr.write(f"ухудшение: {line}\n")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    from rubik_cli import main as cli_main
+
+    cli_main(['bench'] + sys.argv[1:])
@@ -0,0 +1,151 @@
+"""
+Кэш решений с учётом 48 симметрий куба.
+
+Симметрия g (поворот или отражение всего куба) переставляет клетки и, чтобы
+центры остались на месте, переименовывает грани (цвета). Состояния S и g(S)
+решаются «одинаково»: если ходы M1..Mk собирают S, то g(M1)..g(Mk) собирают
+g(S). Поэтому в кэше хранится одно решение на класс симметрии — для
+канонического (лексикографически минимального) представителя, а при чтении
+ходы переводятся обратно через ту же симметрию.
+"""
+import json
+import os
+import random
+import tempfile
+from collections import OrderedDict
+from itertools import permutations, product
+from operator import itemgetter
+
+from rubik_cube import FACES, MOVE_INDEX, MOVE_PERMUTATIONS, MOVES, _FACE_FRAME, _sticker_geometry
+
+
+def _build_symmetries():
+    """
+    Для каждой из 48 симметрий (матрицы перестановок координат со знаками)
+    возвращает функцию преобразования строки граней и перестановку ходов.
+    """
+    stickers = _sticker_geometry()
+    index = {sticker: i for i, sticker in enumerate(stickers)}
+    face_of_normal = {_FACE_FRAME[face][0]: face for face in FACES}
+    symmetries = []
+    for axes in permutations(range(3)):
+        for signs in product((1, -1), repeat=3):
+            def transform(v, axes=axes, signs=signs):
+                return tuple(signs[i] * v[axes[i]] for i in range(3))
+            # Клетка i переходит в клетку target[i], грань f — в грань relabel[f]
+            target = [index[(transform(pos), transform(normal))] for pos, normal in stickers]
+            source = [0] * 54
+            for i, j in enumerate(target):
+                source[j] = i
+            relabel = {face: face_of_normal[transform(_FACE_FRAME[face][0])] for face in FACES}
+            symmetries.append((itemgetter(*source), str.maketrans(relabel)))
+
+    # Образ каждого хода при симметрии находим проверкой на «общем» состоянии
+    rng = random.Random(0)
+    probe = ''.join(face * 9 for face in FACES)
+    for _ in range(40):
+        probe = _apply(probe, MOVE_PERMUTATIONS[rng.randrange(len(MOVES))])
+    result = []
+    for getter, table in symmetries:
+        image = _transform(probe, getter, table)
+        conj = []
+        for perm in MOVE_PERMUTATIONS:
+            moved = _transform(_apply(probe, perm), getter, table)
+            conj.append(next(m for m, p in enumerate(MOVE_PERMUTATIONS) if _apply(image, p) == moved))
+        result.append((getter, table, tuple(conj)))
+    return result
+
+
+def _apply(facelets, perm):
+    return ''.join(facelets[i] for i in perm)
+
+
+def _transform(facelets, getter, table):
+    return ''.join(getter(facelets.translate(table)))
+
+
+# (перестановка клеток, переименование граней, образы 18 ходов)
+SYMMETRIES = _build_symmetries()
+# Обратное отображение ходов: ход решения g(S) -> ход решения S
+_INVERSE_MOVES = tuple(
+    tuple(conj.index(m) for m in range(len(MOVES))) for _, _, conj in SYMMETRIES
+)
+
+
+def canonical(facelets):
+    """
+    Канонический представитель класса симметрии строки граней (URFDLB)
+    и номер симметрии, которая переводит в него исходное состояние.
+    """
+    best, best_k = None, 0
+    for k, (getter, table, _) in enumerate(SYMMETRIES):
+        image = _transform(facelets, getter, table)
+        if best is None or image < best:
+            best, best_k = image, k
+    return best, best_k
+
+
+class SolutionCache:
+    """
+    Ограниченный по размеру LRU-кэш решений с учётом симметрий.
+    Если задан path, кэш загружается из файла и сохраняется в него методом save().
+    """
+
+    def __init__(self, maxsize=100000, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, facelets, optimal=False, max_length=None):
+        """
+        Решение (список ходов) для строки граней или None. Сохранённое решение
+        длиннее max_length считается промахом.
+        """
+        key, k = canonical(facelets)
+        moves = self._entries.get((key, optimal))
+        if moves is None or (max_length is not None and len(moves) > max_length):
+            self.misses += 1
+            return None
+        self._entries.move_to_end((key, optimal))
+        self.hits += 1
+        inverse = _INVERSE_MOVES[k]
+        return [MOVES[inverse[m]] for m in moves]
+
+    def put(self, facelets, solution, optimal=False):
+        key, k = canonical(facelets)
+        conj = SYMMETRIES[k][2]
+        self._entries[(key, optimal)] = tuple(conj[MOVE_INDEX[m]] for m in solution)
+        self._entries.move_to_end((key, optimal))
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+    def save(self, path=None):
+        """Записывает кэш в JSON-файл (атомарно, через временный файл)."""
+        path = path or self.path
+        entries = [[key, optimal, list(moves)] for (key, optimal), moves in self._entries.items()]
+        folder = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+        os.replace(tmp, path)
+
+    def load(self, path):
+        with open(path, encoding='utf-8') as f:
+            for key, optimal, moves in json.load(f):
+                self._entries[(key, optimal)] = tuple(moves)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+# Кэш по умолчанию, которым пользуется RubiksCube.solve
+default_cache = SolutionCache(maxsize=10000)
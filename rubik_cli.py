@@ -0,0 +1,513 @@
+"""
+Консольный режим без GUI.
+
+    python -m rubik_cube solve --in states.jsonl --out solutions.jsonl --workers 8
+
+Каждая строка входного файла — JSON-объект {"id": ..., "facelets": "UUU...BBB"}
+(54 буквы граней в порядке URFDLB, как в нотации Кочембы; id необязателен,
+по умолчанию — номер строки) или просто JSON-строка с состоянием. Для каждой
+строки выводится {"id": ..., "solution": "R U2 F' ...", "length": N}
+или {"id": ..., "error": "..."}.
+Состояния читаются и решаются потоком: в работе одновременно не больше
+--inflight задач, результаты пишутся по мере готовности. С --stats FILE
+статистика решений (rubik_stats) дописывается в FILE строками JSON.
+С --max-time SECONDS на каждое состояние даётся срок: после первого решения
+ищутся более короткие, а в результат добавляется поле "improvements".
+
+    python -m rubik_cube render --in jobs.jsonl --out-dir anim --format mp4 --workers 8
+
+Отрисовка анимаций без дисплея: каждая строка — {"id": ..., "state": "...",
+"moves": "R U2 ..."}, где state — 54 буквы цветов (как в RubiksCube) или
+"facelets" — 54 буквы граней URFDLB. Если moves не задан, анимируется
+найденное решение. Для каждой задачи пишется файл <id>.<format> и строка
+{"id": ..., "file": ..., "frames": N} или {"id": ..., "error": "..."}.
+
+    python -m rubik_cube bench --out bench.json --compare previous.json
+
+Замеры производительности (см. rubik_bench).
+
+    python -m rubik_cube serve --port 8765 --workers 4
+
+Резидентный HTTP-сервис решения (см. rubik_server).
+
+    python -m rubik_cube random --count 1000000 --seed 1 --out states.jsonl
+
+Равномерно случайные допустимые состояния (см. rubik_random) в JSONL (формат
+входа solve, с --scrambles — и перемешивание к каждому состоянию) или
+двоичный файл с --format bin.
+
+    python -m rubik_cube pack --in scrambles.jsonl --out scrambles.rcp
+    python -m rubik_cube unpack --in scrambles.rcp --out scrambles.jsonl
+
+Перевод архива состояний и ходов из JSONL в компактный корпус (9 байт на
+состояние, 5 бит на ход, см. rubik_corpus) и обратно.
+
+    python -m rubik_cube startup --budget-ms 450
+
+Проверка времени запуска приложения по python -X importtime: код выхода 1,
+если импорт дольше бюджета или при запуске загружаются модули, нужные
+только по требованию (решатель, imageio).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+import rubik_solver
+from rubik_bench import BENCHMARKS, STARTUP_BUDGET_MS
+from rubik_cache import SolutionCache
+from rubik_cube import CENTERS, RubiksCube
+from rubik_stats import JsonLinesLogger, SolveStats
+
+# Как часто (в секундах) печатать прогресс
+REPORT_INTERVAL = 5.0
+
+
+def _read_records(stream):
+    """Пары (id, facelets); для нечитаемых строк вместо facelets — исключение."""
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+            if isinstance(record, str):
+                yield line_no, record
+            else:
+                yield record.get('id', line_no), record['facelets']
+        except (ValueError, KeyError, AttributeError) as e:
+            yield line_no, e
+
+
+def _solve_record(record, max_length, with_stats=False, max_time=None):
+    record_id, facelets = record
+    if isinstance(facelets, Exception):
+        return {'id': record_id, 'error': f"некорректная строка: {facelets}"}
+    # Статистика возвращается из рабочего процесса словарём в поле 'stats'
+    stats = SolveStats() if with_stats else None
+    # В поиске со сроком — [мс от начала, длина] для каждого найденного решения
+    improvements = []
+    started = time.perf_counter()
+
+    def improved(moves):
+        improvements.append([round((time.perf_counter() - started) * 1000, 3), len(moves)])
+
+    try:
+        solution = rubik_solver.solve_facelets(facelets, max_length, stats=stats, max_time=max_time,
+                                               on_solution=improved if max_time is not None else None)
+    except rubik_solver.SolveError as e:
+        result = {'id': record_id, 'error': str(e)}
+        if stats is not None:
+            stats.finish(error=str(e))
+            result['stats'] = stats.as_dict()
+        return result
+    result = {'id': record_id, 'solution': ' '.join(solution), 'length': len(solution)}
+    if max_time is not None:
+        result['improvements'] = improvements
+    if stats is not None:
+        stats.finish(len(solution))
+        result['stats'] = stats.as_dict()
+    return result
+
+
+class _Progress:
+    def __init__(self, stream):
+        self.stream = stream
+        self.start = self.last = time.perf_counter()
+        self.done = self.failed = 0
+
+    def add(self, result):
+        self.done += 1
+        self.failed += 'error' in result
+        now = time.perf_counter()
+        if now - self.last >= REPORT_INTERVAL:
+            self.last = now
+            self.report()
+            return True
+        return False
+
+    def report(self, final=False):
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        prefix = "Готово" if final else "Решено"
+        print(f"{prefix}: {self.done} (ошибок: {self.failed}) за {elapsed:.1f} с, {rate:.1f} кубов/с",
+              file=self.stream, flush=True)
+
+
+def _cached_result(cache, record, max_length, with_stats=False):
+    """Результат из кэша решений или None (кэш ведёт главный процесс)."""
+    record_id, facelets = record
+    if cache is None or not isinstance(facelets, str) or len(facelets) != 54:
+        return None
+    stats = SolveStats() if with_stats else None
+    solution = cache.get(facelets, max_length=max_length)
+    if solution is None:
+        return None
+    result = {'id': record_id, 'solution': ' '.join(solution), 'length': len(solution)}
+    if stats is not None:
+        stats.cache = 'hit'
+        stats.finish(len(solution))
+        result['stats'] = stats.as_dict()
+    return result
+
+
+def solve_stream(records, out, workers=1, max_length=22, inflight=None, ordered=True, progress=None,
+                 cache=None, stats=None, max_time=None):
+    """
+    Решает поток записей (id, facelets) и пишет JSONL в out.
+    ordered=True сохраняет порядок входа, иначе результаты пишутся по готовности.
+    cache — SolutionCache: повторяющиеся (с точностью до симметрии) состояния
+    не отправляются решателю. stats — наблюдатель (например,
+    rubik_stats.JsonLinesLogger), получающий статистику каждого решения.
+    max_time — срок на одно состояние (секунды): решатель ищет решения короче
+    первого найденного, пока срок не истечёт, а в результат добавляется поле
+    improvements — [мс, длина] для каждого найденного решения (кроме решений из кэша).
+    """
+    with_stats = stats is not None
+
+    def emit(record, result):
+        record_stats = result.pop('stats', None)
+        if record_stats is not None:
+            if cache is not None and record_stats['cache'] is None:
+                record_stats['cache'] = 'miss'
+            stats(record_stats, id=result['id'])
+        if cache is not None and 'solution' in result:
+            cache.put(record[1], result['solution'].split())
+        out.write(json.dumps(result, ensure_ascii=False) + '\n')
+        if progress is not None and progress.add(result):
+            out.flush()
+
+    def submit(record):
+        future = Future()
+        result = _cached_result(cache, record, max_length, with_stats)
+        if result is not None:
+            future.set_result(result)
+            return future
+        return pool.submit(_solve_record, record, max_length, with_stats, max_time)
+
+    if workers <= 1:
+        for record in records:
+            result = _cached_result(cache, record, max_length, with_stats)
+            emit(record, result if result is not None else _solve_record(record, max_length, with_stats, max_time))
+        return
+
+    inflight = inflight or workers * 8
+    with rubik_solver.share_tables() as shared, ProcessPoolExecutor(
+            workers, initializer=rubik_solver.init_worker, initargs=(shared.descriptor,)) as pool:
+        if ordered:
+            pending = deque()
+            for record in records:
+                pending.append((record, submit(record)))
+                if len(pending) >= inflight:
+                    record, future = pending.popleft()
+                    emit(record, future.result())
+            while pending:
+                record, future = pending.popleft()
+                emit(record, future.result())
+        else:
+            pending = {}
+            for record in records:
+                pending[submit(record)] = record
+                if len(pending) >= inflight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        emit(pending.pop(future), future.result())
+            for future in wait(pending).done:
+                emit(pending[future], future.result())
+
+
+# Растеризатор рабочего процесса (пиксели наклеек считаются один раз на процесс)
+_rasterizer = None
+
+
+def _read_jobs(stream):
+    """Пары (id, задача) для render; для нечитаемых строк вместо задачи — исключение."""
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+            yield job.get('id', line_no), job
+        except (ValueError, AttributeError) as e:
+            yield line_no, e
+
+
+def _render_record(record, options):
+    global _rasterizer
+    from rubik_render import Rasterizer, render_animation
+
+    record_id, job = record
+    if isinstance(job, Exception):
+        return {'id': record_id, 'error': f"некорректная строка: {job}"}
+    size = (options['width'], options['height'])
+    if _rasterizer is None or _rasterizer.size != size:
+        _rasterizer = Rasterizer(size)
+    path = os.path.join(options['out_dir'], f"{str(record_id).replace(os.sep, '_')}.{options['format']}")
+    try:
+        field = 'state' if 'state' in job else 'facelets'
+        state = job[field]
+        if not isinstance(state, str):
+            raise ValueError(f"{field} должно быть строкой")
+        if field == 'facelets':
+            state = ''.join(CENTERS.get(face, '-') for face in state)
+        moves = job.get('moves')
+        if moves is None:
+            moves = rubik_solver.solve(RubiksCube(state))
+        elif isinstance(moves, str):
+            moves = moves.split()
+        elif not isinstance(moves, list) or not all(isinstance(move, str) for move in moves):
+            raise ValueError("moves должно быть строкой или списком строк")
+        frames = render_animation(state, moves, path, fps=options['fps'], rasterizer=_rasterizer)
+    except (KeyError, ValueError, OSError) as e:
+        return {'id': record_id, 'error': f"{type(e).__name__}: {e}"}
+    return {'id': record_id, 'file': path, 'frames': frames}
+
+
+def render_stream(records, out, options, workers=1, inflight=None, progress=None):
+    """Отрисовывает поток задач (id, задача) и пишет JSONL-отчёт в out (в порядке входа)."""
+    def emit(result):
+        out.write(json.dumps(result, ensure_ascii=False) + '\n')
+        if progress is not None and progress.add(result):
+            out.flush()
+
+    os.makedirs(options['out_dir'], exist_ok=True)
+    if workers <= 1:
+        for record in records:
+            emit(_render_record(record, options))
+        return
+    inflight = inflight or workers * 4
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for record in records:
+            pending.append(pool.submit(_render_record, record, options))
+            if len(pending) >= inflight:
+                emit(pending.popleft().result())
+        while pending:
+            emit(pending.popleft().result())
+
+
+def _cmd_render(args):
+    src = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    dst = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    progress = _Progress(sys.stderr)
+    options = {'out_dir': args.out_dir, 'format': args.format, 'fps': args.fps,
+               'width': args.width, 'height': args.height}
+    try:
+        render_stream(_read_jobs(src), dst, options, args.workers, args.inflight, progress)
+    finally:
+        dst.flush()
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    progress.report(final=True)
+
+
+def _cmd_solve(args):
+    src = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    dst = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    progress = _Progress(sys.stderr)
+    cache = SolutionCache(args.cache_size, args.cache)
+    stats_file = open(args.stats, 'a', encoding='utf-8') if args.stats else None
+    stats = JsonLinesLogger(stats_file, args.stats_sample, args.stats_slow_ms) if stats_file else None
+    try:
+        # Таблицы загружаются до запуска пула, чтобы не строить их в каждом процессе
+        rubik_solver.get_tables()
+        solve_stream(_read_records(src), dst, args.workers, args.max_length,
+                     args.inflight, not args.unordered, progress, cache, stats, args.max_time)
+    finally:
+        if args.cache:
+            cache.save()
+        if stats_file is not None:
+            stats_file.close()
+        dst.flush()
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    progress.report(final=True)
+
+
+def _cmd_bench(args):
+    import rubik_bench
+
+    rubik_bench.main(args)
+
+
+def _cmd_startup(args):
+    import rubik_bench
+
+    problems = rubik_bench.check_startup(args.budget_ms)
+    for line in problems:
+        print(line, file=sys.stderr)
+    if problems:
+        sys.exit(1)
+    print("время запуска в пределах бюджета", file=sys.stderr)
+
+
+def _cmd_random(args):
+    import rubik_random
+
+    if args.scrambles and args.format != 'jsonl':
+        sys.exit("--scrambles доступно только для --format jsonl")
+    start = time.perf_counter()
+    if args.format == 'bin':
+        dst = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+        try:
+            rubik_random.write_binary(dst, args.count, args.seed)
+        finally:
+            dst.flush()
+            if dst is not sys.stdout.buffer:
+                dst.close()
+    else:
+        dst = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+        try:
+            rubik_random.write_jsonl(dst, args.count, args.seed, args.scrambles, args.workers)
+        finally:
+            dst.flush()
+            if dst is not sys.stdout:
+                dst.close()
+    elapsed = time.perf_counter() - start
+    rate = args.count / elapsed if elapsed > 0 else 0.0
+    print(f"Готово: {args.count} состояний за {elapsed:.1f} с, {rate:.0f} состояний/с", file=sys.stderr)
+
+
+def _cmd_pack(args):
+    import rubik_corpus
+
+    src = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    try:
+        written, skipped = rubik_corpus.pack_jsonl(src, args.output, args.max_moves)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+    print(f"Записано: {written}, пропущено: {skipped}", file=sys.stderr)
+
+
+def _cmd_unpack(args):
+    import rubik_corpus
+
+    try:
+        corpus = rubik_corpus.Corpus(args.input)
+    except rubik_corpus.CorpusError as e:
+        sys.exit(str(e))
+    dst = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        rubik_corpus.unpack_jsonl(corpus, dst)
+    finally:
+        dst.flush()
+        if dst is not sys.stdout:
+            dst.close()
+
+
+def _cmd_serve(args):
+    import asyncio
+    import rubik_server
+
+    if not rubik_server.MIN_MAX_LENGTH <= args.max_length <= rubik_server.MAX_MAX_LENGTH:
+        sys.exit(f"--max-length должно быть от {rubik_server.MIN_MAX_LENGTH} до {rubik_server.MAX_MAX_LENGTH}")
+
+    def ready(service):
+        where = args.unix or f"http://{args.host}:{args.port}"
+        print(f"Сервис решения запущен: {where} (процессов: {service.workers})", file=sys.stderr, flush=True)
+
+    asyncio.run(rubik_server.serve(
+        args.host, args.port, args.unix, ready, workers=args.workers, batch_size=args.batch_size,
+        batch_wait=args.batch_wait_ms / 1000, queue_size=args.queue, max_length=args.max_length,
+        cache_size=args.cache_size, max_time=args.max_time or None))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m rubik_cube', description="Решатель кубика Рубика")
+    commands = parser.add_subparsers(dest='command', required=True)
+    solve = commands.add_parser('solve', help="решить состояния из JSONL-файла")
+    solve.add_argument('--in', dest='input', default='-', help="входной JSONL (по умолчанию stdin)")
+    solve.add_argument('--out', dest='output', default='-', help="выходной JSONL (по умолчанию stdout)")
+    solve.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="число процессов")
+    solve.add_argument('--max-length', type=int, default=22, help="максимальная длина решения")
+    solve.add_argument('--max-time', type=float, default=None,
+                       help="секунд на состояние: искать решения короче первого, пока не истечёт срок")
+    solve.add_argument('--inflight', type=int, default=None,
+                       help="максимум одновременно решаемых состояний (по умолчанию 8 на процесс)")
+    solve.add_argument('--unordered', action='store_true',
+                       help="писать результаты по готовности, а не в порядке входа")
+    solve.add_argument('--cache', default=None,
+                       help="файл кэша решений (загружается при старте и сохраняется в конце)")
+    solve.add_argument('--cache-size', type=int, default=100000,
+                       help="максимум решений в кэше (вытесняются давно не использованные)")
+    solve.add_argument('--stats', default=None,
+                       help="дописывать статистику решений строками JSON в этот файл")
+    solve.add_argument('--stats-sample', type=float, default=1.0,
+                       help="доля решений, попадающих в статистику (ошибки и медленные — всегда)")
+    solve.add_argument('--stats-slow-ms', type=float, default=None,
+                       help="всегда записывать решения дольше стольких миллисекунд")
+    solve.set_defaults(handler=_cmd_solve)
+    render = commands.add_parser('render', help="отрисовать анимации решений в GIF/MP4 без дисплея")
+    render.add_argument('--in', dest='input', default='-', help="входной JSONL (по умолчанию stdin)")
+    render.add_argument('--out', dest='output', default='-', help="отчёт JSONL (по умолчанию stdout)")
+    render.add_argument('--out-dir', default='.', help="каталог для файлов анимаций")
+    render.add_argument('--format', choices=('gif', 'mp4'), default='gif', help="формат анимаций")
+    render.add_argument('--fps', type=float, default=3, help="кадров в секунду")
+    render.add_argument('--width', type=int, default=480, help="ширина кадра")
+    render.add_argument('--height', type=int, default=352, help="высота кадра (для MP4 лучше кратная 16)")
+    render.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="число процессов")
+    render.add_argument('--inflight', type=int, default=None,
+                        help="максимум одновременно отрисовываемых задач (по умолчанию 4 на процесс)")
+    render.set_defaults(handler=_cmd_render)
+    bench = commands.add_parser('bench', help="замеры производительности, результат в JSON")
+    bench.add_argument('--out', dest='output', default='-', help="файл результатов JSON (по умолчанию stdout)")
+    bench.add_argument('--only', nargs='+', choices=BENCHMARKS, help="выполнить только указанные замеры")
+    bench.add_argument('--seed', type=int, default=0, help="зерно случайных перемешиваний")
+    bench.add_argument('--quick', action='store_true', help="малые объёмы, без построения таблиц")
+    bench.add_argument('--full', action='store_true', help="строить и таблицы оптимального решателя")
+    bench.add_argument('--compare', default=None,
+                       help="JSON прошлого прогона: при ухудшении метрик код выхода 1")
+    bench.add_argument('--threshold', type=float, default=0.1,
+                       help="допустимое ухудшение для --compare (доля, по умолчанию 0.1)")
+    bench.set_defaults(handler=_cmd_bench)
+    serve = commands.add_parser('serve', help="резидентный HTTP-сервис решения с тёплыми таблицами")
+    serve.add_argument('--host', default='127.0.0.1', help="адрес для TCP (по умолчанию 127.0.0.1)")
+    serve.add_argument('--port', type=int, default=8765, help="порт TCP")
+    serve.add_argument('--unix', default=None, help="слушать Unix-сокет по этому пути вместо TCP")
+    serve.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="число процессов")
+    serve.add_argument('--batch-size', type=int, default=32, help="максимум состояний в пакете")
+    serve.add_argument('--batch-wait-ms', type=float, default=2.0,
+                       help="сколько ждать других запросов для пакета, мс")
+    serve.add_argument('--queue', type=int, default=1024,
+                       help="максимум ожидающих состояний; сверх него — ответ 503")
+    serve.add_argument('--max-length', type=int, default=22, help="максимальная длина решения по умолчанию")
+    serve.add_argument('--cache-size', type=int, default=100000, help="размер кэша решений (0 — без кэша)")
+    serve.add_argument('--max-time', type=float, default=2.0,
+                       help="срок решения одного состояния, с (0 — без срока); по истечении — ответ 422")
+    serve.set_defaults(handler=_cmd_serve)
+    rand = commands.add_parser('random', help="равномерно случайные состояния в JSONL или двоичный файл")
+    rand.add_argument('--count', type=int, required=True, help="число состояний")
+    rand.add_argument('--seed', type=int, default=None, help="зерно генератора (для воспроизводимости)")
+    rand.add_argument('--out', dest='output', default='-', help="выходной файл (по умолчанию stdout)")
+    rand.add_argument('--format', choices=('jsonl', 'bin'), default='jsonl',
+                      help="jsonl — {\"id\", \"facelets\"} по строкам, bin — записи по 54 байта")
+    rand.add_argument('--scrambles', action='store_true',
+                      help="добавить перемешивание к каждому состоянию (решает каждое, медленно)")
+    rand.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                      help="число процессов для --scrambles")
+    rand.set_defaults(handler=_cmd_random)
+    pack = commands.add_parser('pack', help="перевести JSONL с состояниями и ходами в двоичный корпус")
+    pack.add_argument('--in', dest='input', default='-', help="входной JSONL (по умолчанию stdin)")
+    pack.add_argument('--out', dest='output', required=True, help="файл корпуса")
+    pack.add_argument('--max-moves', type=int, default=25,
+                      help="максимальная длина последовательности ходов в записи")
+    pack.set_defaults(handler=_cmd_pack)
+    unpack = commands.add_parser('unpack', help="вывести двоичный корпус строками JSONL")
+    unpack.add_argument('--in', dest='input', required=True, help="файл корпуса")
+    unpack.add_argument('--out', dest='output', default='-', help="выходной JSONL (по умолчанию stdout)")
+    unpack.set_defaults(handler=_cmd_unpack)
+    startup = commands.add_parser('startup', help="проверить время импорта приложения по -X importtime")
+    startup.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS,
+                         help=f"допустимое время импорта, мс (по умолчанию {STARTUP_BUDGET_MS})")
+    startup.set_defaults(handler=_cmd_startup)
+    args = parser.parse_args(argv)
+    args.handler(args)
@@ -0,0 +1,387 @@
+"""
+Компактный двоичный формат состояний и ходов и корпус записей на его основе.
+
+Состояние хранится кубиковыми координатами в 9 байтах вместо 54 букв:
+
+    байты 0..3  номер перестановки углов * 3^7 + ориентация углов (uint32)
+    байты 4..8  номер перестановки рёбер * 2^11 + ориентация рёбер (40 бит)
+
+Ход — 5-битный код (номер в MOVES), последовательность упаковывается по
+5 бит подряд, старшим битом вперёд.
+
+Корпус — файл из заголовка и записей одинакового размера:
+
+    заголовок   <8sIIQ: сигнатура, версия формата, max_moves, число записей
+                (дополнен нулями до HEADER_SIZE байт)
+    запись      9 байт состояния, 1 байт длины последовательности ходов и
+                ceil(5 * max_moves / 8) байт ходов
+
+Запись i лежит по смещению HEADER_SIZE + i * размер записи, поэтому файл
+отображается в память (numpy.memmap) как массив записей: выборка по номерам
+записей — представление без копирования, с диска читаются только нужные
+страницы. Распаковка в массив состояний (N, 54) для rubik_batch и в массив
+кодов ходов для apply_sequences идёт векторно.
+
+    python -m rubik_cube pack --in scrambles.jsonl --out scrambles.rcp
+"""
+import json
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from rubik_batch import NOP, CubeBatch, move_codes, to_cubies, validate
+from rubik_cube import CENTERS, FACES, MOVES, RubiksCube
+from rubik_random import CHUNK, cubies_to_states, states_to_facelets
+from rubik_solver import _ori_coord, _rank_perm
+
+MAGIC = b'RUBIKCRP'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<8sIIQ')
+HEADER_SIZE = 64
+# Байт на упакованное состояние и бит на код хода
+STATE_BYTES = 9
+MOVE_BITS = 5
+# Максимальная длина последовательности в корпусе по умолчанию (решения
+# двухфазного алгоритма — до 22 ходов, перемешивания обычно 20–25)
+MAX_MOVES = 25
+
+# Код цвета наклейки по букве грани (URFDLB)
+_COLOR_OF_FACE = np.zeros(256, dtype=np.uint8)
+for _face in FACES:
+    _COLOR_OF_FACE[ord(_face)] = ord(CENTERS[_face])
+# Поля JSONL, из которых pack_jsonl берёт последовательность ходов (первое найденное)
+MOVE_FIELDS = ('moves', 'scramble', 'solution')
+
+
+class CorpusError(Exception):
+    """Файл корпуса отсутствует, повреждён или другой версии формата."""
+
+
+def _unrank_perm(ranks, n):
+    # Обратная к rubik_solver._rank_perm: перестановки (N, n) по лексикографическим номерам
+    ranks = np.asarray(ranks, dtype=np.int64)
+    digits = np.zeros((len(ranks), n), dtype=np.int64)
+    for i in range(n - 2, -1, -1):
+        ranks, digits[:, i] = np.divmod(ranks, n - i)
+    perms = np.empty((len(digits), n), dtype=np.int8)
+    free = np.ones((len(digits), n), dtype=bool)
+    for i in range(n):
+        # digits[:, i]-й по порядку ещё не занятый кубик
+        pick = ((free.cumsum(axis=1) == digits[:, i:i + 1] + 1) & free).argmax(axis=1)
+        perms[:, i] = pick
+        free[np.arange(len(digits)), pick] = False
+    return perms
+
+
+def _unrank_orientation(coords, pieces, base):
+    ori = np.empty((len(coords), pieces), dtype=np.int8)
+    coords = np.asarray(coords, dtype=np.int64)
+    for i in range(pieces - 2, -1, -1):
+        coords, ori[:, i] = np.divmod(coords, base)
+    ori[:, -1] = -ori[:, :-1].sum(axis=1, dtype=np.int64) % base
+    return ori
+
+
+def pack_cubies(cp, co, ep, eo):
+    """Упакованные состояния (N, 9) uint8 по кубиковым координатам."""
+    n = len(cp)
+    corners = _rank_perm(np.asarray(cp)) * 3 ** 7 + _ori_coord(np.asarray(co), 3)
+    edges = _rank_perm(np.asarray(ep)) * 2 ** 11 + _ori_coord(np.asarray(eo), 2)
+    packed = np.empty((n, STATE_BYTES), dtype=np.uint8)
+    packed[:, :4] = corners.astype('<u4').view(np.uint8).reshape(n, 4)
+    packed[:, 4:] = edges.astype('<u8').view(np.uint8).reshape(n, 8)[:, :5]
+    return packed
+
+
+def unpack_cubies(packed):
+    """Кубиковые координаты (cp, co, ep, eo) упакованных состояний (N, 9)."""
+    packed = np.asarray(packed, dtype=np.uint8).reshape(-1, STATE_BYTES)
+    n = len(packed)
+    corners = np.ascontiguousarray(packed[:, :4]).view('<u4').ravel().astype(np.int64)
+    wide = np.zeros((n, 8), dtype=np.uint8)
+    wide[:, :5] = packed[:, 4:]
+    edges = wide.view('<u8').ravel().astype(np.int64)
+    cp, twist = np.divmod(corners, 3 ** 7)
+    ep, flip = np.divmod(edges, 2 ** 11)
+    return (_unrank_perm(cp, 8), _unrank_orientation(twist, 8, 3),
+            _unrank_perm(ep, 12), _unrank_orientation(flip, 12, 2))
+
+
+def pack_states(states):
+    """Упакованные состояния (N, 9) для массива допустимых состояний (N, 54)."""
+    return pack_cubies(*to_cubies(states))
+
+
+def unpack_states(packed):
+    """Массив состояний (N, 54) uint8 (буквы цветов, как в RubiksCube) из упакованных (N, 9)."""
+    return cubies_to_states(*unpack_cubies(packed))
+
+
+def pack_state(cube):
+    """9 байт состояния куба (куб должен быть раскрашен допустимо)."""
+    return pack_states(np.frombuffer(cube.state, dtype=np.uint8)[None]).tobytes()
+
+
+def unpack_state(data):
+    """RubiksCube по 9 байтам pack_state."""
+    return RubiksCube(unpack_states(np.frombuffer(data, dtype=np.uint8))[0].tobytes())
+
+
+def moves_bytes(max_moves):
+    """Размер упакованной последовательности из max_moves ходов, байт."""
+    return (max_moves * MOVE_BITS + 7) // 8
+
+
+def pack_codes(codes):
+    """
+    Упаковывает коды ходов (N, L) (NOP — пустой ход в конце) по 5 бит:
+    массив (N, moves_bytes(L)) uint8.
+    """
+    codes = np.asarray(codes, dtype=np.uint8)
+    bits = (codes[..., None] >> np.arange(MOVE_BITS - 1, -1, -1, dtype=np.uint8)) & 1
+    return np.packbits(bits.reshape(len(codes), codes.shape[-1] * MOVE_BITS), axis=1)
+
+
+def unpack_codes(packed, max_moves):
+    """Коды ходов (N, max_moves) из упакованных pack_codes."""
+    packed = np.asarray(packed, dtype=np.uint8)
+    bits = np.unpackbits(packed, axis=1)[:, :max_moves * MOVE_BITS].reshape(len(packed), max_moves, MOVE_BITS)
+    return bits @ (1 << np.arange(MOVE_BITS - 1, -1, -1)).astype(np.uint8)
+
+
+def pack_moves(moves):
+    """Последовательность ходов HTM (список или строка) в байтах по 5 бит на ход."""
+    codes = _codes(moves)
+    return pack_codes(codes[None]).tobytes()
+
+
+def unpack_moves(data, length):
+    """Список length ходов из байтов pack_moves."""
+    codes = unpack_codes(np.frombuffer(data, dtype=np.uint8)[None], length)[0]
+    return [MOVES[code] for code in codes]
+
+
+def _codes(moves):
+    if isinstance(moves, str):
+        moves = moves.split()
+    try:
+        return np.array([move_codes(move) for move in moves], dtype=np.uint8)
+    except KeyError as e:
+        raise ValueError(f"ход {e.args[0]} не входит в 18 ходов HTM") from None
+
+
+def record_dtype(max_moves):
+    """Тип записи корпуса: поля state (9 байт), length и moves."""
+    return np.dtype([('state', np.uint8, (STATE_BYTES,)), ('length', np.uint8),
+                     ('moves', np.uint8, (moves_bytes(max_moves),))])
+
+
+class CorpusWriter:
+    """
+    Потоковая запись корпуса: write() дописывает пачку записей. Файл пишется
+    во временный и переименовывается при close(), поэтому недописанный
+    корпус не виден под именем path.
+
+        with CorpusWriter('scrambles.rcp') as writer:
+            writer.write(states, moves)
+    """
+
+    def __init__(self, path, max_moves=MAX_MOVES):
+        if not 0 <= max_moves <= 255:
+            raise ValueError("max_moves должен быть от 0 до 255")
+        self.path = path
+        self.max_moves = max_moves
+        self.dtype = record_dtype(max_moves)
+        self.count = 0
+        folder = os.path.dirname(path) or '.'
+        fd, self._tmp = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        self._file = os.fdopen(fd, 'wb')
+        self._file.write(bytes(HEADER_SIZE))
+
+    def write(self, states, moves=None):
+        """
+        Дописывает записи: states — массив допустимых состояний (N, 54) или
+        CubeBatch; moves — None, список N последовательностей ходов (списки
+        или строки) или массив кодов (N, L), дополненный NOP.
+        """
+        if isinstance(states, CubeBatch):
+            states = states.states
+        states = np.asarray(states, dtype=np.uint8).reshape(-1, 54)
+        records = np.zeros(len(states), dtype=self.dtype)
+        records['state'] = pack_states(states)
+        if moves is not None:
+            codes, lengths = self._pad(moves, len(states))
+            records['length'] = lengths
+            if self.max_moves:
+                records['moves'] = pack_codes(codes)
+        self._file.write(records.tobytes())
+        self.count += len(records)
+
+    def _pad(self, moves, n):
+        if isinstance(moves, np.ndarray) and moves.ndim == 2:
+            codes = moves.astype(np.uint8)
+        else:
+            sequences = [s if isinstance(s, np.ndarray) else _codes(s) for s in moves]
+            codes = np.full((len(sequences), max(map(len, sequences), default=0)), NOP, dtype=np.uint8)
+            for row, sequence in zip(codes, sequences):
+                row[:len(sequence)] = sequence
+        if len(codes) != n:
+            raise ValueError("число последовательностей ходов не совпадает с числом состояний")
+        lengths = (codes != NOP).sum(axis=1)
+        if lengths.max(initial=0) > self.max_moves:
+            raise ValueError(f"последовательность длиннее max_moves={self.max_moves}")
+        padded = np.full((n, self.max_moves), NOP, dtype=np.uint8)
+        width = min(codes.shape[1], self.max_moves)
+        padded[:, :width] = codes[:, :width]
+        return padded, lengths
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, self.max_moves, self.count))
+        self._file.close()
+        os.chmod(self._tmp, 0o644)
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        """Прерывает запись: временный файл удаляется, path не меняется."""
+        if not self._file.closed:
+            self._file.close()
+            os.unlink(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class Corpus:
+    """
+    Корпус, отображённый в память. records — массив записей (record_dtype);
+    методы принимают номер, срез или массив номеров записей:
+
+        corpus = Corpus('scrambles.rcp')
+        batch = corpus.batch(slice(0, 100000))
+        batch.states = apply_sequences(batch.states, corpus.codes(slice(0, 100000)))
+    """
+
+    def __init__(self, path):
+        try:
+            with open(path, 'rb') as f:
+                magic, fmt, max_moves, count = _HEADER.unpack(f.read(_HEADER.size))
+            size = os.path.getsize(path)
+        except (OSError, struct.error) as e:
+            raise CorpusError(f"не удалось прочитать {path}: {e}") from None
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise CorpusError(f"{path}: неизвестный формат файла")
+        self.path = path
+        self.max_moves = max_moves
+        dtype = record_dtype(max_moves)
+        if size < HEADER_SIZE + count * dtype.itemsize:
+            raise CorpusError(f"{path}: файл обрезан")
+        if count:
+            self.records = np.memmap(path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.records = np.empty(0, dtype=dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    def packed(self, index=slice(None)):
+        """Упакованные состояния (N, 9) — для среза без копирования."""
+        return self.records['state'][index]
+
+    def lengths(self, index=slice(None)):
+        return self.records['length'][index]
+
+    def states(self, index=slice(None)):
+        """Массив состояний (N, 54) для rubik_batch."""
+        return unpack_states(self.packed(index))
+
+    def batch(self, index=slice(None)):
+        return CubeBatch(self.states(index))
+
+    def codes(self, index=slice(None)):
+        """Коды ходов (N, max_moves), после конца последовательности — NOP (для apply_sequences)."""
+        records = np.atleast_1d(self.records[index])
+        codes = unpack_codes(records['moves'], self.max_moves)
+        codes[np.arange(self.max_moves) >= records['length'][:, None]] = NOP
+        return codes
+
+    def cube(self, i):
+        return unpack_state(self.records['state'][i].tobytes())
+
+    def moves(self, i):
+        """Последовательность ходов записи i (список имён)."""
+        record = self.records[i]
+        return unpack_moves(record['moves'].tobytes(), int(record['length']))
+
+
+def pack_jsonl(stream, path, max_moves=MAX_MOVES):
+    """
+    Переводит JSONL-архив в корпус path: в каждой строке — "facelets"
+    (буквы граней URFDLB) или "state" (буквы цветов) и, если есть, ходы из
+    первого поля MOVE_FIELDS. Номер записи в корпусе — номер строки среди
+    записанных; id не сохраняются. Возвращает (записано, пропущено):
+    строки с ошибкой и недопустимые состояния пропускаются.
+    """
+    written = skipped = 0
+    with CorpusWriter(path, max_moves) as writer:
+        def flush(rows, moves):
+            nonlocal written, skipped
+            if not rows:
+                return
+            states = np.frombuffer(''.join(rows).encode('ascii'), dtype=np.uint8).reshape(-1, 54)
+            valid = validate(states) == 0
+            skipped += int((~valid).sum())
+            writer.write(states[valid], [m for m, ok in zip(moves, valid) if ok])
+            written += int(valid.sum())
+
+        rows, moves = [], []
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if 'facelets' in record:
+                    state = _COLOR_OF_FACE[np.frombuffer(record['facelets'].encode('ascii'), dtype=np.uint8)]
+                    state = state.tobytes().decode('ascii')
+                else:
+                    state = record['state']
+                    if not isinstance(state, str):
+                        raise TypeError
+                    state.encode('ascii')
+                sequence = next((record[field] for field in MOVE_FIELDS if field in record), '')
+                codes = _codes(sequence)
+                if len(state) != 54 or len(codes) > max_moves:
+                    raise ValueError
+            except (ValueError, KeyError, TypeError, AttributeError, UnicodeEncodeError):
+                skipped += 1
+                continue
+            rows.append(state)
+            moves.append(codes)
+            if len(rows) >= CHUNK:
+                flush(rows, moves)
+                rows, moves = [], []
+        flush(rows, moves)
+    return written, skipped
+
+
+def unpack_jsonl(corpus, out):
+    """Пишет корпус строками {"id": номер записи, "facelets": ..., "moves": ...} в out."""
+    for start in range(0, len(corpus), CHUNK):
+        index = slice(start, start + CHUNK)
+        facelets = states_to_facelets(corpus.states(index))
+        if corpus.max_moves:
+            lines = (json.dumps({'id': start + i, 'facelets': f, 'moves': ' '.join(MOVES[c] for c in row if c != NOP)})
+                     for i, (f, row) in enumerate(zip(facelets, corpus.codes(index))))
+        else:
+            lines = (json.dumps({'id': start + i, 'facelets': f}) for i, f in enumerate(facelets))
+        out.write(''.join(line + '\n' for line in lines))
@@ -1,61 +1,325 @@
+import time
+from collections.abc import MutableMapping, MutableSequence
+from operator import itemgetter
+
+# Порядок граней в буфере состояния (как в нотации Кочембы): U, R, F, D, L, B.
+# Каждая грань занимает 9 подряд идущих байт, клетки пронумерованы построчно
+# (0..8), если смотреть на грань снаружи куба.
+FACES = ('U', 'R', 'F', 'D', 'L', 'B')
+FACE_OFFSET = {face: 9 * i for i, face in enumerate(FACES)}
+
+# Центры зафиксированы
+CENTERS = {'U': 'W', 'R': 'R', 'F': 'G', 'D': 'Y', 'L': 'O', 'B': 'B'}
+
+# Все 18 ходов метрики HTM: U, U2, U', R, R2, R', ..., B'
+MOVES = tuple(face + suffix for face in FACES for suffix in ('', '2', "'"))
+MOVE_INDEX = {name: i for i, name in enumerate(MOVES)}
+
+# Внешняя нормаль каждой грани и направления роста номера строки и столбца
+_FACE_FRAME = {
+    'U': ((0, 1, 0), (0, 0, 1), (1, 0, 0)),
+    'R': ((1, 0, 0), (0, -1, 0), (0, 0, -1)),
+    'F': ((0, 0, 1), (0, -1, 0), (1, 0, 0)),
+    'D': ((0, -1, 0), (0, 0, -1), (1, 0, 0)),
+    'L': ((-1, 0, 0), (0, -1, 0), (0, 0, 1)),
+    'B': ((0, 0, -1), (0, -1, 0), (-1, 0, 0)),
+}
+
+
+def _sticker_geometry():
+    """
+    Возвращает для каждой из 54 клеток пару (позиция кубика, нормаль наклейки)
+    в целочисленных координатах {-1, 0, 1}.
+    """
+    stickers = []
+    for face in FACES:
+        normal, row_dir, col_dir = _FACE_FRAME[face]
+        for i in range(9):
+            r, c = divmod(i, 3)
+            pos = tuple(n + (r - 1) * rd + (c - 1) * cd
+                        for n, rd, cd in zip(normal, row_dir, col_dir))
+            stickers.append((pos, normal))
+    return stickers
+
+
+def _rotate_clockwise(v, axis):
+    # Поворот на 90° по часовой стрелке, если смотреть с конца оси:
+    # v' = a(a·v) - a×v
+    ax, ay, az = axis
+    x, y, z = v
+    dot = ax * x + ay * y + az * z
+    cross = (ay * z - az * y, az * x - ax * z, ax * y - ay * x)
+    return tuple(a * dot - c for a, c in zip(axis, cross))
+
+
+def compose(first, second):
+    """Перестановка, равная последовательному применению first, затем second."""
+    return tuple(first[i] for i in second)
+
+
+def _build_move_permutations():
+    stickers = _sticker_geometry()
+    index = {sticker: i for i, sticker in enumerate(stickers)}
+    perms = []
+    for face in FACES:
+        axis = _FACE_FRAME[face][0]
+        # perm[dest] = src: новое значение клетки dest берётся из клетки src
+        quarter = list(range(54))
+        for src, (pos, normal) in enumerate(stickers):
+            if sum(p * a for p, a in zip(pos, axis)) == 1:
+                dest = index[(_rotate_clockwise(pos, axis), _rotate_clockwise(normal, axis))]
+                quarter[dest] = src
+        quarter = tuple(quarter)
+        half = compose(quarter, quarter)
+        perms.extend((quarter, half, compose(half, quarter)))
+    return tuple(perms)
+
+
+# Перестановки клеток для всех 18 ходов, вычисляются один раз при импорте
+MOVE_PERMUTATIONS = _build_move_permutations()
+_MOVE_GETTERS = {name: itemgetter(*perm) for name, perm in zip(MOVES, MOVE_PERMUTATIONS)}
+
+
+class FaceView(MutableSequence):
+    """
+    Представление одной грани в виде списка из 9 букв цвета.
+    Чтение и запись идут напрямую в буфер состояния куба.
+    """
+    __slots__ = ('_cube', '_offset')
+
+    def __init__(self, cube, face):
+        self._cube = cube
+        self._offset = FACE_OFFSET[face]
+
+    def __len__(self):
+        return 9
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [chr(b) for b in self._cube._state[self._offset:self._offset + 9][index]]
+        if not -9 <= index < 9:
+            raise IndexError("индекс клетки вне диапазона 0..8")
+        return chr(self._cube._state[self._offset + index % 9])
+
+    def __setitem__(self, index, value):
+        if not -9 <= index < 9:
+            raise IndexError("индекс клетки вне диапазона 0..8")
+        self._cube._state[self._offset + index % 9] = ord(value)
+
+    def __delitem__(self, index):
+        raise TypeError("грань всегда состоит из 9 клеток")
+
+    def insert(self, index, value):
+        raise TypeError("грань всегда состоит из 9 клеток")
+
+    def __eq__(self, other):
+        if isinstance(other, (FaceView, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def copy(self):
+        return list(self)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class FacesView(MutableMapping):
+    """Словарь граней {'U': [...], ...} поверх компактного буфера состояния."""
+    __slots__ = ('_cube', '_views')
+
+    def __init__(self, cube):
+        self._cube = cube
+        self._views = {face: FaceView(cube, face) for face in FACES}
+
+    def __getitem__(self, face):
+        return self._views[face]
+
+    def __setitem__(self, face, stickers):
+        stickers = list(stickers)
+        if len(stickers) != 9:
+            raise ValueError("грань должна состоять из 9 клеток")
+        offset = FACE_OFFSET[face]
+        self._cube._state[offset:offset + 9] = ''.join(stickers).encode('ascii')
+
+    def __delitem__(self, face):
+        raise TypeError("набор граней куба фиксирован")
+
+    def __iter__(self):
+        return iter(FACES)
+
+    def __len__(self):
+        return len(FACES)
+
+    def __repr__(self):
+        return repr({face: list(view) for face, view in self._views.items()})
+
+
 class RubiksCube:
-    def __init__(self):
-        # Центры зафиксированы, остальные ячейки изначально не раскрашены (обозначены символом '-')
-        centers = {'U': 'W', 'D': 'Y', 'F': 'G', 'B': 'B', 'L': 'O', 'R': 'R'}
-        self.faces = {}
-        for face in centers:
-            self.faces[face] = []
-            for i in range(9):
-                if i == 4:
-                    self.faces[face].append(centers[face])
-                else:
-                    self.faces[face].append('-')
+    def __init__(self, state=None):
+        """
+        Состояние хранится в bytearray из 54 байт (буквы цветов в ASCII) в порядке
+        граней FACES. Если state не задан, центры зафиксированы, а остальные ячейки
+        изначально не раскрашены (обозначены символом '-').
+        """
+        if state is None:
+            state = ''.join(CENTERS[face] if i == 4 else '-'
+                            for face in FACES for i in range(9))
+        if isinstance(state, str):
+            state = state.encode('ascii')
+        if len(state) != 54:
+            raise ValueError("состояние куба должно содержать 54 клетки")
+        self._state = bytearray(state)
+        # Словарь граней для GUI: представление поверх self._state
+        self.faces = FacesView(self)
+
+    @classmethod
+    def solved(cls):
+        """Собранный куб."""
+        return cls(''.join(CENTERS[face] * 9 for face in FACES))
+
+    @property
+    def state(self):
+        """Неизменяемый снимок состояния (54 байта)."""
+        return bytes(self._state)
+
+    def to_string(self):
+        """Состояние в виде строки из 54 букв цветов в порядке граней FACES."""
+        return self._state.decode('ascii')
+
+    def copy(self):
+        return RubiksCube(self._state)
 
     def rotate_face_clockwise(self, face):
         """
-        Поворот указанной грани по часовой стрелке.
-        Эта функция поворачивает только элементы текущей грани.
-        """
-        old = self.faces[face][:]
-        self.faces[face][0] = old[6]
-        self.faces[face][1] = old[3]
-        self.faces[face][2] = old[0]
-        self.faces[face][3] = old[7]
-        # Центр остаётся неизменным
-        self.faces[face][4] = old[4]
-        self.faces[face][5] = old[1]
-        self.faces[face][6] = old[8]
-        self.faces[face][7] = old[5]
-        self.faces[face][8] = old[2]
+        Поворот указанной грани по часовой стрелке вместе с прилегающими
+        рядами соседних граней.
+        """
+        self.move(face)
 
     def is_solved(self):
         """
         Проверяет, собран ли куб. Если хотя бы одна нецентральная клетка не раскрашена,
         то куб считается незакрашенным (неготовым к сборке).
         """
-        for face in self.faces:
-            if len(set(self.faces[face])) != 1 or '-' in self.faces[face]:
+        s = self._state
+        for offset in range(0, 54, 9):
+            if s[offset:offset + 9] != s[offset + 4:offset + 5] * 9:
                 return False
         return True
 
     def move(self, move):
         """
-        Применяет заданный ход (например, 'U' или 'U'').
-        Реализован только базовый ход для верхней грани.
+        Применяет заданный ход в нотации HTM (например, 'U', 'R2' или "F'"),
+        а также широкие ходы, средние слои и повороты куба (Rw, M, x, ... — см. rubik_moves).
+        Каждый ход — одна заранее вычисленная перестановка 54 клеток.
         """
-        if move == "U":
-            self.rotate_face_clockwise('U')
-        elif move == "U'":
-            for _ in range(3):
-                self.rotate_face_clockwise('U')
-        else:
-            print(f"Ход {move} не реализован.")
+        getter = _MOVE_GETTERS.get(move)
+        if getter is None:
+            from rubik_moves import permutation
+            getter = itemgetter(*permutation(move))
+        self._state = bytearray(getter(self._state))
 
-    def solve(self):
+    def apply(self, sequence):
         """
-        Упрощённый алгоритм решения, который переводит куб в собранное состояние.
-        Здесь для каждой грани все клетки становятся равными фиксированному центру.
+        Применяет последовательность ходов (строку нотации "R U R' U'" или список)
+        одной перестановкой, заранее скомпонованной из всех ходов.
+        """
+        from rubik_moves import compile_getter
+
+        self._state = bytearray(compile_getter(sequence)(self._state))
+
+    def solve(self, max_length=22, optimal=False, cache=True, progress=None, cancel=None, stats=None,
+              max_time=None, on_solution=None):
+        """
+        Находит решение двухфазным алгоритмом Кочембы (не длиннее max_length ходов),
+        применяет его к кубу и возвращает список ходов.
+        С optimal=True ищет кратчайшее решение (IDA* с базами шаблонов, rubik_optimal).
+        Решения запоминаются в кэше с учётом симметрий (rubik_cache): cache=True —
+        общий кэш по умолчанию, cache=False — без кэша, либо свой SolutionCache.
+        progress(depth, nodes) сообщает о ходе поиска, а установленный флаг cancel
+        (threading.Event) прерывает его исключением rubik_solver.SolveCancelled.
+        stats (rubik_stats.SolveStats) заполняется статистикой решения; если он не
+        задан, но есть наблюдатели (rubik_stats.add_observer), создаётся свой.
+        Если куб раскрашен с ошибками, выбрасывается rubik_solver.SolveError.
+
+        max_time (секунды) включает поиск со сроком: первое найденное решение
+        сразу передаётся в on_solution(ходы), а поиск продолжает искать более
+        короткие до истечения срока; каждое улучшение тоже передаётся в
+        on_solution, а возвращается (и применяется) лучшее. Решение из кэша
+        считается первым найденным (оптимальное из кэша уже не улучшается).
+        Без max_time on_solution вызывается один раз.
         """
-        centers = {'U': 'W', 'D': 'Y', 'F': 'G', 'B': 'B', 'L': 'O', 'R': 'R'}
-        for face in self.faces:
-            self.faces[face] = [centers[face]] * 9
+        import rubik_stats
+        from rubik_solver import Deadline, SolveCancelled, SolveError, cube_to_facelets
+        if optimal:
+            from rubik_optimal import solve
+        else:
+            from rubik_solver import solve
+        if cache is True:
+            from rubik_cache import default_cache as cache
+        elif cache is False:
+            cache = None
+        if stats is None and rubik_stats.observed():
+            stats = rubik_stats.SolveStats('optimal' if optimal else 'kociemba')
+
+        started = time.perf_counter()
+        try:
+            facelets = cube_to_facelets(self)
+            moves = None
+            if cache is not None:
+                moves = cache.get(facelets, optimal, max_length)
+                if stats is not None:
+                    stats.add_time('cache', time.perf_counter() - started)
+                    stats.cache = 'miss' if moves is None else 'hit'
+            if moves is None:
+                moves = solve(self, max_length, progress=progress, cancel=cancel, stats=stats,
+                              max_time=max_time, on_solution=on_solution)
+                # Оптимальный поиск, прерванный по сроку, мог вернуть неоптимальное решение
+                timed_out = max_time is not None and time.perf_counter() - started >= max_time
+                if cache is not None and not (optimal and timed_out):
+                    cache.put(facelets, moves, optimal)
+            else:
+                if on_solution is not None:
+                    on_solution(list(moves))
+                if max_time is not None and moves and not optimal:
+                    # Решение из кэша — первое найденное; в оставшееся время ищется более короткое
+                    remaining = max_time - (time.perf_counter() - started)
+                    deadline = Deadline(remaining, cancel)
+                    found = []
+
+                    def improved(shorter):
+                        found.append(shorter)
+                        if on_solution is not None:
+                            on_solution(shorter)
+
+                    try:
+                        solve(self, len(moves) - 1, progress=progress, cancel=deadline, stats=stats,
+                              max_time=remaining, on_solution=improved)
+                    except SolveError:
+                        pass  # короче решений нет
+                    except SolveCancelled:
+                        # Найденные до истечения срока решения сохранены в found
+                        if not deadline.expired():
+                            raise
+                    if found:
+                        moves = found[-1]
+                        cache.put(facelets, moves, optimal)
+        except (SolveError, SolveCancelled) as e:
+            if stats is not None:
+                stats.finish(error=str(e) or type(e).__name__)
+                rubik_stats.emit(stats)
+            raise
+        if stats is not None:
+            stats.finish(len(moves))
+            rubik_stats.emit(stats)
+        for move in moves:
+            self.move(move)
+        return moves
+
+
+if __name__ == '__main__':
+    # Консольный режим: python -m rubik_cube solve --in states.jsonl --out solutions.jsonl
+    from rubik_cli import main
+
+    main()
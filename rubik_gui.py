@@ -1,39 +1,142 @@
+import ctypes
+import os
 import sys
-import math
+import threading
+import time
 import numpy as np
-import imageio
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QLabel, QPushButton,
-    QVBoxLayout, QHBoxLayout, QGridLayout, QTabWidget, QMessageBox, QFileDialog
+    QVBoxLayout, QHBoxLayout, QMessageBox, QFileDialog, QCheckBox, QDoubleSpinBox, QShortcut
 )
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, QObject, QRect, QRectF, QRunnable, QSize, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QBrush, QColor, QKeySequence, QPainter, QPen
 from PyQt5.QtOpenGL import QOpenGLWidget
 from OpenGL.GL import *
 from OpenGL.GLU import *
-from rubik_cube import RubiksCube
-
-# Сопоставление букв с реальными цветами
-COLOR_MAP = {
-    'W': 'white',
-    'Y': 'yellow',
-    'G': 'green',
-    'B': 'blue',
-    'O': 'orange',
-    'R': 'red'
+from rubik_cube import CENTERS, FACE_OFFSET, FACES, RubiksCube
+from rubik_render import OPENCOLOR_MAP, OUTLINE_INDICES, QUAD_VERTICES, turn_geometry, vertex_colors
+from rubik_animation import TurnScheduler
+from rubik_video import BackgroundWriter, FrameSpool, export
+# Решатель (и его таблицы) и imageio импортируются по требованию, чтобы окно
+# появлялось быстрее; решатель загружается в фоне после показа окна (warm_up)
+
+# Цвета наклеек в редакторе раскраски ('-' — клетка не раскрашена)
+STICKER_COLORS = {
+    '-': "#808080",
+    'W': "#ffffff",
+    'Y': "#ffff00",
+    'G': "#00ff00",
+    'B': "#0000ff",
+    'O': "#ff8c00",
+    'R': "#ff0000"
 }
 
-# Цвета для OpenGL: значения RGB в диапазоне [0, 1]
-OPENCOLOR_MAP = {
-    'W': (1.0, 1.0, 1.0),
-    'Y': (1.0, 1.0, 0.0),
-    'G': (0.0, 1.0, 0.0),
-    'B': (0.0, 0.0, 1.0),
-    'O': (1.0, 0.5, 0.0),
-    'R': (1.0, 0.0, 0.0),
-    '-': (0.5, 0.5, 0.5)
-}
+# Развёртка в редакторе: столбец и строка (в клетках) левого верхнего угла каждой грани
+#       U
+#     L F R B
+#       D
+NET_LAYOUT = {'U': (3, 0), 'L': (0, 3), 'F': (3, 3), 'R': (6, 3), 'B': (9, 3), 'D': (3, 6)}
+# Номер клетки в буфере состояния по положению (столбец, строка) на развёртке
+_NET_CELLS = {(col + i % 3, row + i // 3): FACE_OFFSET[face] + i
+              for face, (col, row) in NET_LAYOUT.items() for i in range(9)}
+
+# Частота записи кадров анимации (и кадров в сохранённом GIF/MP4)
+RECORD_FPS = 20
+
+
+class SolveSignals(QObject):
+    # Сигналы задачи решения; доставляются в главный поток через очередь событий Qt
+    progress = pyqtSignal(int, int)  # глубина поиска, число просмотренных узлов
+    finished = pyqtSignal(list)      # найденные ходы
+    improved = pyqtSignal(list)      # найдено решение (при поиске со сроком — каждое более короткое)
+    failed = pyqtSignal(str)         # куб раскрашен неверно или решение не найдено
+    cancelled = pyqtSignal()
+
+
+class SolveTask(QRunnable):
+    """
+    Поиск решения в потоке из QThreadPool, чтобы окно не зависало на долгих
+    (например, оптимальных) решениях. Прогресс отправляется не чаще, чем раз
+    в PROGRESS_INTERVAL секунд; cancel() прерывает поиск. С max_time поиск
+    продолжается после первого решения, пока не истечёт срок; если отменить
+    его после первого решения, результатом будет лучшее найденное.
+    """
+    PROGRESS_INTERVAL = 0.1
+
+    def __init__(self, cube, optimal=False, max_time=None):
+        super().__init__()
+        self.cube = cube.copy()
+        self.optimal = optimal
+        self.max_time = max_time
+        self.best = None
+        self.signals = SolveSignals()
+        self._cancel = threading.Event()
+        self._last_report = 0.0
+
+    def cancel(self):
+        self._cancel.set()
+
+    def report(self, depth, nodes):
+        now = time.monotonic()
+        if now - self._last_report >= self.PROGRESS_INTERVAL:
+            self._last_report = now
+            self.signals.progress.emit(depth, nodes)
+
+    def improve(self, moves):
+        self.best = moves
+        self.signals.improved.emit(moves)
+
+    def run(self):
+        from rubik_solver import SolveCancelled, SolveError
+
+        try:
+            moves = self.cube.solve(optimal=self.optimal, progress=self.report, cancel=self._cancel,
+                                    max_time=self.max_time, on_solution=self.improve)
+        except SolveCancelled:
+            if self.best is not None:
+                self.signals.finished.emit(self.best)
+            else:
+                self.signals.cancelled.emit()
+        except SolveError as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(moves)
+
+
+class ExportSignals(QObject):
+    finished = pyqtSignal(str)  # имя сохранённого файла
+    failed = pyqtSignal(str)
+
+
+class ExportTask(QRunnable):
+    """Кодирование записанных кадров в GIF/MP4 в фоновом потоке."""
+
+    def __init__(self, frames, filename, fps):
+        super().__init__()
+        self.frames = frames
+        self.filename = filename
+        self.fps = fps
+        self.signals = ExportSignals()
+
+    def run(self):
+        try:
+            export(self.frames, self.filename, self.fps, colors=OPENCOLOR_MAP.values())
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(self.filename)
+
 
 class Cube3DWidget(QOpenGLWidget):
+    """
+    3D-вид куба. Геометрия (216 вершин наклеек и индексы контуров) загружается
+    в вершинные буферы один раз; при изменении состояния обновляется только
+    буфер цветов. Кадр рисуется тремя вызовами: наклейки, контуры и
+    подсвеченные («мерцающие») контуры; во время поворота слоя — по три вызова
+    для неподвижной и поворачиваемой частей.
+    """
+    FLASH_TIME = 1.0  # время угасания подсветки, с
+
     def __init__(self, cube, parent=None):
         super().__init__(parent)
         self.cube = cube
@@ -44,6 +147,21 @@ class Cube3DWidget(QOpenGLWidget):
         # Словарь для хранения значений "мерцания" для отдельных клеток:
         # ключ (face, idx) -> float (от 0 до 1, где 1 – максимальное мерцание)
         self.flash_cells = {}
+        # Состояние, цвета которого сейчас лежат в буфере
+        self._drawn_state = None
+        self._last_paint = None
+        # Текущий поворот слоя (ход, угол в градусах) или None
+        self.turn = None
+        # Запись кадров: после отрисовки кадр копируется в буфер пикселей и
+        # отдаётся в frame_sink capture_frames раз при следующей отрисовке
+        self.frame_sink = None
+        self.capture_frames = 0
+        # Два буфера пикселей (PBO) для чтения кадров, их размеры в байтах и
+        # ещё не прочитанный кадр (номер буфера, ширина, высота, повторы)
+        self._pbos = ()
+        self._pbo_sizes = [0, 0]
+        self._next_pbo = 0
+        self._pending = None
 
     def initializeGL(self):
         glClearColor(0.1, 0.1, 0.1, 1.0)
@@ -52,6 +170,22 @@ class Cube3DWidget(QOpenGLWidget):
         # Включаем альфа-блендинг для прозрачности при отрисовке мерцания
         glEnable(GL_BLEND)
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        # Наклейки чуть отодвигаются вглубь, чтобы контуры рисовались поверх них
+        glPolygonOffset(1.0, 1.0)
+        self.vertex_vbo, self.color_vbo, self.outline_ibo = glGenBuffers(3)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_vbo)
+        glBufferData(GL_ARRAY_BUFFER, QUAD_VERTICES.nbytes, QUAD_VERTICES, GL_STATIC_DRAW)
+        colors = vertex_colors(self.cube.state)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_vbo)
+        glBufferData(GL_ARRAY_BUFFER, colors.nbytes, colors, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.outline_ibo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, OUTLINE_INDICES.nbytes, OUTLINE_INDICES, GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        self._pbos = tuple(glGenBuffers(2))
+        self._pbo_sizes = [0, 0]
+        self._pending = None
+        self._drawn_state = self.cube.state
 
     def resizeGL(self, w, h):
         if h == 0:
@@ -64,83 +198,156 @@ class Cube3DWidget(QOpenGLWidget):
         glMatrixMode(GL_MODELVIEW)
 
     def paintGL(self):
-        # Обновляем значения мерцания: у каждой клетки flash значение плавно уменьшается
+        # Мерцание угасает по времени, а не по числу кадров
+        now = time.monotonic()
+        decay = (now - self._last_paint) / self.FLASH_TIME if self._last_paint is not None else 0.0
+        self._last_paint = now
         for key in list(self.flash_cells.keys()):
-            self.flash_cells[key] = max(self.flash_cells[key] - 0.05, 0)
+            self.flash_cells[key] = max(self.flash_cells[key] - decay, 0)
             if self.flash_cells[key] == 0:
                 del self.flash_cells[key]
 
+        state = self.cube.state
+        if state != self._drawn_state:
+            colors = vertex_colors(state)
+            glBindBuffer(GL_ARRAY_BUFFER, self.color_vbo)
+            glBufferSubData(GL_ARRAY_BUFFER, 0, colors.nbytes, colors)
+            self._drawn_state = state
+
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         glLoadIdentity()
         # Фиксированное положение камеры
         gluLookAt(0, 0, 8, 0, 0, 0, 0, 1, 0)
         glRotatef(self.xRot, 1, 0, 0)
         glRotatef(self.yRot, 0, 1, 0)
-        # Отрисовка всех граней: F, B, U, D, L, R
-        for face in ['F', 'B', 'U', 'D', 'L', 'R']:
-            self.drawFace(face, self.cube.faces[face])
-        glFlush()
 
-    def drawFace(self, face, stickers):
-        glPushMatrix()
-        if face == 'F':
-            glTranslatef(0, 0, 1)
-        elif face == 'B':
-            glTranslatef(0, 0, -1)
-            glRotatef(180, 0, 1, 0)
-        elif face == 'U':
-            glTranslatef(0, 1, 0)
-            glRotatef(-90, 1, 0, 0)
-        elif face == 'D':
-            glTranslatef(0, -1, 0)
-            glRotatef(90, 1, 0, 0)
-        elif face == 'L':
-            glTranslatef(-1, 0, 0)
-            glRotatef(90, 0, 1, 0)
-        elif face == 'R':
-            glTranslatef(1, 0, 0)
-            glRotatef(-90, 0, 1, 0)
-        self.drawStickerGrid(face, stickers)
-        glPopMatrix()
-
-    def drawStickerGrid(self, face, stickers):
-        cell_size = 2.0 / 3.0
-        for i in range(3):
-            for j in range(3):
-                idx = i * 3 + j
-                x0 = -1 + j * cell_size
-                y0 = 1 - (i + 1) * cell_size
-                color_letter = stickers[idx]
-                color = OPENCOLOR_MAP.get(color_letter, (0.5, 0.5, 0.5))
-                # Рисуем заполненную прямоугольную наклейку
-                glColor3f(*color)
-                glBegin(GL_QUADS)
-                glVertex3f(x0, y0, 0)
-                glVertex3f(x0 + cell_size, y0, 0)
-                glVertex3f(x0 + cell_size, y0 + cell_size, 0)
-                glVertex3f(x0, y0 + cell_size, 0)
-                glEnd()
-                # Рисуем тонкую чёрную границу для каждой наклейки
-                glLineWidth(1.0)
-                glColor3f(0, 0, 0)
-                glBegin(GL_LINE_LOOP)
-                glVertex3f(x0, y0, 0)
-                glVertex3f(x0 + cell_size, y0, 0)
-                glVertex3f(x0 + cell_size, y0 + cell_size, 0)
-                glVertex3f(x0, y0 + cell_size, 0)
-                glEnd()
-                # Если для данной наклейки задан эффект мерцания,
-                # добавляем дополнительную желтую обводку с прозрачностью
-                if (face, idx) in self.flash_cells:
-                    alpha = self.flash_cells[(face, idx)]
-                    glLineWidth(2.0)
-                    glColor4f(1.0, 1.0, 0.0, alpha)  # желтый цвет с прозрачностью
-                    glBegin(GL_LINE_LOOP)
-                    glVertex3f(x0, y0, 0)
-                    glVertex3f(x0 + cell_size, y0, 0)
-                    glVertex3f(x0 + cell_size, y0 + cell_size, 0)
-                    glVertex3f(x0, y0 + cell_size, 0)
-                    glEnd()
+        glEnableClientState(GL_VERTEX_ARRAY)
+        if self.turn is None:
+            self.drawStickers()
+        else:
+            # Поворачиваемый слой рисуется отдельно со своей матрицей поворота
+            move, angle = self.turn
+            axis, _, moving, static, cuts = turn_geometry(move)
+            self.drawStickers(static, cuts)
+            glPushMatrix()
+            glRotatef(angle, *axis)
+            self.drawStickers(moving, cuts)
+            glPopMatrix()
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glFlush()
+        if self.capture_frames and self.frame_sink is not None:
+            # Если кадры отрисовывались реже частоты записи, кадр повторяется
+            self.readFrameAsync(self.capture_frames)
+        else:
+            self.flushFrame()
+        self.capture_frames = 0
+
+    def drawStickers(self, stickers=None, cuts=()):
+        """
+        Наклейки, их контуры и подсветка: все (индексы берутся из буферов) или
+        только с номерами из stickers; cuts — чёрные квадраты в плоскостях разреза.
+        """
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_vbo)
+        glVertexPointer(3, GL_FLOAT, 0, None)
+        # Заполненные наклейки
+        glEnableClientState(GL_COLOR_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_vbo)
+        glColorPointer(3, GL_FLOAT, 0, None)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glEnable(GL_POLYGON_OFFSET_FILL)
+        if stickers is None:
+            glDrawArrays(GL_QUADS, 0, len(QUAD_VERTICES))
+        else:
+            quads = np.ascontiguousarray((stickers[:, None] * 4 + np.arange(4)).ravel(), dtype=np.uint32)
+            glDrawElements(GL_QUADS, quads.size, GL_UNSIGNED_INT, quads)
+        glDisable(GL_POLYGON_OFFSET_FILL)
+        glDisableClientState(GL_COLOR_ARRAY)
+        # Тонкая чёрная граница каждой наклейки
+        glLineWidth(1.0)
+        glColor3f(0, 0, 0)
+        if stickers is None:
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.outline_ibo)
+            glDrawElements(GL_LINES, OUTLINE_INDICES.size, GL_UNSIGNED_INT, None)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        else:
+            glDrawElements(GL_LINES, len(stickers) * 8, GL_UNSIGNED_INT,
+                           np.ascontiguousarray(OUTLINE_INDICES[stickers]))
+        # Жёлтая полупрозрачная обводка мерцающих наклеек — одним вызовом
+        flash = {FACE_OFFSET[face] + idx: value for (face, idx), value in self.flash_cells.items()}
+        if stickers is not None:
+            flash = {cell: value for cell, value in flash.items() if cell in stickers}
+        if flash:
+            cells = list(flash)
+            alpha = np.repeat(np.array(list(flash.values()), dtype=np.float32), 4)
+            flash_colors = np.zeros((len(QUAD_VERTICES), 4), dtype=np.float32)
+            flash_colors[:, :2] = 1.0
+            flash_colors[np.array(cells)[:, None] * 4 + np.arange(4), 3] = alpha.reshape(-1, 4)
+            glEnableClientState(GL_COLOR_ARRAY)
+            glColorPointer(4, GL_FLOAT, 0, flash_colors)
+            glLineWidth(2.0)
+            glDrawElements(GL_LINES, len(cells) * 8, GL_UNSIGNED_INT,
+                           np.ascontiguousarray(OUTLINE_INDICES[cells]))
+            glDisableClientState(GL_COLOR_ARRAY)
+        # Внутренность куба в разрезе между слоями закрашивается чёрным
+        if len(cuts):
+            glColor3f(0, 0, 0)
+            glVertexPointer(3, GL_FLOAT, 0, cuts)
+            glDrawArrays(GL_QUADS, 0, len(cuts) * 4)
+
+    def readFrameAsync(self, count):
+        """
+        Начинает копирование текущего кадра в буфер пикселей: glReadPixels в
+        GL_PIXEL_PACK_BUFFER не ждёт окончания отрисовки. Кадр отдаётся в
+        frame_sink count раз при следующем вызове (flushFrame), когда копия
+        уже готова; предыдущий кадр отдаётся сейчас.
+        """
+        ratio = self.devicePixelRatioF()
+        w, h = int(self.width() * ratio), int(self.height() * ratio)
+        index, self._next_pbo = self._next_pbo, 1 - self._next_pbo
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self._pbos[index])
+        if self._pbo_sizes[index] != w * h * 3:
+            glBufferData(GL_PIXEL_PACK_BUFFER, w * h * 3, None, GL_STREAM_READ)
+            self._pbo_sizes[index] = w * h * 3
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        glReadPixels(0, 0, w, h, GL_RGB, GL_UNSIGNED_BYTE, 0)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.flushFrame()
+        self._pending = index, w, h, count
+
+    def flushFrame(self):
+        """Отдаёт в frame_sink кадр из буфера пикселей, если он есть (нужен текущий контекст)."""
+        if self._pending is None:
+            return
+        index, w, h, count = self._pending
+        self._pending = None
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self._pbos[index])
+        pointer = glMapBuffer(GL_PIXEL_PACK_BUFFER, GL_READ_ONLY)
+        try:
+            data = ctypes.string_at(pointer, w * h * 3) if pointer else None
+        finally:
+            if pointer:
+                glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        if data is None or self.frame_sink is None:
+            return
+        # OpenGL хранит строки снизу вверх; переворот — представление без копирования
+        frame = np.frombuffer(data, dtype=np.uint8).reshape(h, w, 3)[::-1]
+        for _ in range(count):
+            self.frame_sink.write(frame)
+
+    def stopCapture(self):
+        """Отдаёт в frame_sink последний прочитанный кадр и прекращает запись."""
+        try:
+            if self._pending is not None and self.frame_sink is not None:
+                self.makeCurrent()
+                try:
+                    self.flushFrame()
+                finally:
+                    self.doneCurrent()
+        finally:
+            self._pending = None
+            self.frame_sink = None
+            self.capture_frames = 0
 
     def mousePressEvent(self, event):
         self.lastPos = event.pos()
@@ -154,157 +361,140 @@ class Cube3DWidget(QOpenGLWidget):
         self.update()
 
 
-class FaceEditWidget(QWidget):
-    def __init__(self, face, cube, parent=None):
+def state_from_text(text):
+    """
+    Состояние (54 буквы цветов) по вставленному тексту: 54 буквы цветов
+    (WRGYOB, '-' — не раскрашено) или буквы граней URFDLB, как в нотации
+    Кочембы; пробелы и переводы строк пропускаются. ValueError, если текст
+    не похож на состояние или центры не совпадают с центрами куба.
+    """
+    letters = ''.join(text.split())
+    if len(letters) != 54:
+        raise ValueError(f"нужно 54 буквы, а не {len(letters)}")
+    if set(letters) <= set(CENTERS.values()) | {'-'}:
+        state = letters
+    elif set(letters) <= set(FACES):
+        state = ''.join(CENTERS[face] for face in letters)
+    else:
+        raise ValueError("ожидаются буквы цветов (WRGYOB) или граней (URFDLB)")
+    if state[4::9] != ''.join(CENTERS[face] for face in FACES):
+        raise ValueError("центры граней не совпадают с центрами куба")
+    return state
+
+
+class CubeNetWidget(QWidget):
+    """
+    Редактор раскраски: развёртка всех 54 наклеек, нарисованная одним
+    виджетом. Кисти создаются один раз, а refresh() перерисовывает только
+    клетки, изменившиеся с прошлого вызова. Клетки красятся цветом color
+    щелчком или протягиванием мыши; после каждой правки испускается edited
+    (повторные update() 3D-вида Qt сводит в одну перерисовку за кадр).
+    """
+    GAP = 4  # зазор между клетками, пикселей
+    edited = pyqtSignal()
+
+    def __init__(self, cube, parent=None):
         super().__init__(parent)
-        self.face = face
         self.cube = cube
-        self.labels = []
-        # Для сохранения анимации
-        self.animation_frames = []
-        self.record_animation = False
-        self.start_state = None
-        self.init_ui()
-
-    def init_ui(self):
-        layout = QGridLayout()
-        layout.setSpacing(4)
-        for i in range(3):
-            row_labels = []
-            for j in range(3):
-                label = QLabel()
-                label.setFixedSize(60, 60)
-                label.setAlignment(Qt.AlignCenter)
-                if i == 1 and j == 1:
-                    label.setStyleSheet(
-                        f"background-color: {self.qtColor(self.cube.faces[self.face][i * 3 + j])};"
-                        "border: 1px solid #2d89ef; border-radius: 5px;"
-                    )
-                else:
-                    label.setStyleSheet(
-                        f"background-color: {self.qtColor(self.cube.faces[self.face][i * 3 + j])};"
-                        "border: 1px solid #444444; border-radius: 5px;"
-                    )
-                    label.mousePressEvent = lambda event, r=i, c=j: self.label_clicked(r, c)
-                layout.addWidget(label, i, j)
-                row_labels.append(label)
-            self.labels.append(row_labels)
-        self.setLayout(layout)
-
-    def qtColor(self, letter):
-        color_map = {
-            '-': "#808080",
-            'W': "#ffffff",
-            'Y': "#ffff00",
-            'G': "#00ff00",
-            'B': "#0000ff",
-            'O': "#ff8c00",
-            'R': "#ff0000"
-        }
-        return color_map.get(letter, "#808080")
-
-    def label_clicked(self, row, col):
-        if row == 1 and col == 1:
+        self.color = 'W'
+        self.locked = False  # правка запрещена (например, пока идёт поиск решения)
+        self._shown = cube.state
+        self._brushes = {letter: QBrush(QColor(color)) for letter, color in STICKER_COLORS.items()}
+        self._pens = (QPen(QColor("#444444")), QPen(QColor("#2d89ef")))  # обычная клетка, центр
+        self._cell = 40
+        self._left = self._top = 0
+        self._last_pos = None
+        self.setMinimumSize(12 * 20, 9 * 20)
+        self.setToolTip("Щелчок или протягивание — закрасить выбранным цветом;\n"
+                        "Ctrl+V — вставить состояние (54 буквы цветов или граней URFDLB)")
+
+    def sizeHint(self):
+        return QSize(12 * 44, 9 * 44)
+
+    def resizeEvent(self, event):
+        self._cell = max(min(self.width() // 12, self.height() // 9), 1)
+        self._left = (self.width() - 12 * self._cell) // 2
+        self._top = (self.height() - 9 * self._cell) // 2
+        super().resizeEvent(event)
+
+    def cellRect(self, index):
+        """Место клетки index (номер в буфере состояния) на развёртке, вместе с зазором."""
+        col, row = NET_LAYOUT[FACES[index // 9]]
+        row, col = row + index % 9 // 3, col + index % 3
+        return QRect(self._left + col * self._cell, self._top + row * self._cell, self._cell, self._cell)
+
+    def cellAt(self, pos):
+        """Номер клетки под точкой pos или None."""
+        if pos.x() < self._left or pos.y() < self._top:
+            return None
+        return _NET_CELLS.get(((pos.x() - self._left) // self._cell, (pos.y() - self._top) // self._cell))
+
+    def refresh(self):
+        """Перерисовывает клетки, изменившиеся в кубе с прошлой отрисовки."""
+        state = self.cube.state
+        if state == self._shown:
             return
-        main_win = self.window()
-        if hasattr(main_win, "cellClicked"):
-            main_win.cellClicked(self.face, row, col)
-        self.updateFace()
-
-    def updateFace(self):
-        for i in range(3):
-            for j in range(3):
-                color = self.qtColor(self.cube.faces[self.face][i * 3 + j])
-                if i == 1 and j == 1:
-                    self.labels[i][j].setStyleSheet(
-                        f"background-color: {color}; border: 1px solid #2d89ef; border-radius: 5px;"
-                    )
-                else:
-                    self.labels[i][j].setStyleSheet(
-                        f"background-color: {color}; border: 1px solid #444444; border-radius: 5px;"
-                    )
-
-    def solve_cube(self):
-        # Проверка: все нецентральные клетки должны быть раскрашены
-        incomplete = False
-        for face in self.cube.faces:
-            for i, cell in enumerate(self.cube.faces[face]):
-                if i != 4 and cell == '-':
-                    incomplete = True
-                    break
-            if incomplete:
-                break
-        if incomplete:
-            QMessageBox.warning(self, "Ошибка", "Пожалуйста, разукрасьте все грани куба перед сборкой!")
+        for index, (old, new) in enumerate(zip(self._shown, state)):
+            if old != new:
+                self.update(self.cellRect(index))
+        self._shown = state
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        dirty = event.region()
+        state = self.cube.state
+        half = self.GAP // 2
+        for index in range(54):
+            rect = self.cellRect(index)
+            if not dirty.intersects(rect):
+                continue
+            painter.setPen(self._pens[index % 9 == 4])
+            painter.setBrush(self._brushes.get(chr(state[index]), self._brushes['-']))
+            painter.drawRoundedRect(QRectF(rect.adjusted(half, half, -half, -half)), 5, 5)
+
+    def set_cell(self, index, letter):
+        """Красит клетку index (центры не меняются)."""
+        if self.locked or index % 9 == 4:
             return
-        # Сохраняем текущее состояние куба для возможности повторного проигрывания анимации
-        self.start_state = {face: self.cube.faces[face].copy() for face in self.cube.faces}
-        self.play_assembly_animation()
+        face, idx = FACES[index // 9], index % 9
+        if self.cube.faces[face][idx] == letter:
+            return
+        self.cube.faces[face][idx] = letter
+        self.refresh()
+        self.edited.emit()
 
-    def replay_animation(self):
-        if self.start_state is None:
-            QMessageBox.warning(self, "Ошибка", "Сначала соберите куб, чтобы сохранить состояние для анимации!")
+    def set_state(self, state):
+        """Заменяет раскраску всего куба строкой из 54 букв цветов."""
+        if self.locked:
             return
-        for face in self.cube.faces:
-            self.cube.faces[face] = self.start_state[face].copy()
-        for widget in self.face_edit_widgets.values():
-            widget.updateFace()
-        self.cube3d.update()
-        self.play_assembly_animation()
+        for face, offset in FACE_OFFSET.items():
+            self.cube.faces[face] = state[offset:offset + 9]
+        self.refresh()
+        self.edited.emit()
+
+    def _paint_to(self, pos):
+        # Промежуточные точки, чтобы быстрое протягивание не пропускало клетки
+        start = self._last_pos or pos
+        steps = max(abs(pos.x() - start.x()), abs(pos.y() - start.y())) * 2 // self._cell + 1
+        for step in range(1, steps + 1):
+            point = start + (pos - start) * step / steps
+            index = self.cellAt(point)
+            if index is not None:
+                self.set_cell(index, self.color)
+        self._last_pos = pos
 
-    def play_assembly_animation(self):
-        # Для каждой грани определяем правильный (целевой) цвет – цвет центра
-        centers = {'U': 'W', 'D': 'Y', 'F': 'G', 'B': 'B', 'L': 'O', 'R': 'R'}
-        self.animation_tasks = []
-        for face in self.cube.faces:
-            target_color = centers[face]
-            for i in range(9):
-                if i != 4:
-                    self.animation_tasks.append((face, i, target_color))
-        self.animation_frames = []   # Очищаем список кадров
-        self.record_animation = True
-        self.animation_timer = QTimer(self)
-        self.animation_timer.timeout.connect(self.animation_step)
-        self.animation_timer.start(300)  # Интервал 300 мс для медленной анимации
-
-    def animation_step(self):
-        if self.animation_tasks:
-            face, idx, target_color = self.animation_tasks.pop(0)
-            self.cube.faces[face][idx] = target_color
-            # Добавляем эффект мерцания для изменённой клетки (максимальное значение flash = 1.0)
-            self.cube3d.flash_cells[(face, idx)] = 1.0
-            if face in self.face_edit_widgets:
-                self.face_edit_widgets[face].updateFace()
-            self.cube3d.update()
-            # Записываем кадр анимации из 3D-виджета
-            if self.record_animation:
-                frame = self.cube3d.grabFrameBuffer()
-                self.animation_frames.append(frame)
-        else:
-            self.animation_timer.stop()
-            self.record_animation = False
-            QMessageBox.information(self, "Собрано", "Куб успешно собран!")
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self._last_pos = None
+            self._paint_to(event.pos())
 
-    def save_animation(self):
-        if not self.animation_frames:
-            QMessageBox.warning(self, "Ошибка", "Анимация не записана!")
-            return
-        filename, _ = QFileDialog.getSaveFileName(self, "Сохранить анимацию", "", "GIF Files (*.gif)")
-        if not filename:
-            return
-        frames = []
-        # Преобразуем QImage в numpy-массив (RGBA8888)
-        for qimg in self.animation_frames:
-            qimg = qimg.convertToFormat(qimg.Format_RGBA8888)
-            width = qimg.width()
-            height = qimg.height()
-            ptr = qimg.bits()
-            ptr.setsize(height * width * 4)
-            arr = np.frombuffer(ptr, np.uint8).reshape((height, width, 4))
-            frames.append(arr)
-        # Сохраняем в GIF ; fps ~3 (300 мс)
-        imageio.mimsave(filename, frames, fps=3)
-        QMessageBox.information(self, "Сохранено", f"Анимация сохранена в файл {filename}")
+    def mouseMoveEvent(self, event):
+        if event.buttons() & Qt.LeftButton:
+            self._paint_to(event.pos())
+
+    def mouseReleaseEvent(self, event):
+        self._last_pos = None
 
 
 class MainWindow(QMainWindow):
@@ -313,9 +503,17 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("Решатель кубика Рубика — режим раскраски")
         self.cube = RubiksCube()  # Модель куба
         self.current_color_letter = 'W'
-        self.face_edit_widgets = {}
         self.start_state = None  # Состояние куба до запуска анимации сборки
+        self.solution = []  # Ходы найденного решения
+        self.solve_task = None  # Текущая фоновая задача решения
+        self.animation_frames = None  # Кадры последней анимации (FrameSpool на диске)
+        self.recorder = None  # Поток записи кадров во время анимации
+        self.animation_running = False
+        self.faces_dirty = False
         self.init_ui()
+        # Повороты слоёв по времени; следующий шаг — после показа каждого кадра
+        self.scheduler = TurnScheduler(self.cube, self.speed_box.value(), on_move=self.move_done)
+        self.cube3d.frameSwapped.connect(self.animation_tick)
 
     def init_ui(self):
         central_widget = QWidget()
@@ -323,13 +521,11 @@ class MainWindow(QMainWindow):
         # 3D‑виджет с изображением куба
         self.cube3d = Cube3DWidget(self.cube)
         main_layout.addWidget(self.cube3d, stretch=3)
-        # Вкладки для редактирования граней
-        self.tabs = QTabWidget()
-        for face in ['U', 'D', 'F', 'B', 'L', 'R']:
-            widget = FaceEditWidget(face, self.cube)
-            self.face_edit_widgets[face] = widget
-            self.tabs.addTab(widget, face)
-        main_layout.addWidget(self.tabs, stretch=2)
+        # Развёртка для раскраски всех граней
+        self.net = CubeNetWidget(self.cube)
+        self.net.edited.connect(self.cube3d.update)
+        main_layout.addWidget(self.net, stretch=2)
+        QShortcut(QKeySequence.Paste, self, self.paste_state)
         # Нижняя панель: выбор цвета и кнопки управления анимацией
         control_layout = QHBoxLayout()
         palette_label = QLabel("Выберите цвет: ")
@@ -359,10 +555,34 @@ class MainWindow(QMainWindow):
             "border: 1px solid #2d89ef; border-radius: 5px;"
         )
         control_layout.addWidget(self.selected_color_label)
-        solve_btn = QPushButton("Собрать куб")
-        solve_btn.setFixedHeight(50)
-        solve_btn.clicked.connect(self.solve_cube)
-        control_layout.addWidget(solve_btn)
+        self.optimal_check = QCheckBox("Оптимально")
+        control_layout.addWidget(self.optimal_check)
+        control_layout.addWidget(QLabel("Время:"))
+        # Сколько искать более короткие решения после первого; 0 — взять первое
+        self.time_box = QDoubleSpinBox()
+        self.time_box.setRange(0, 600)
+        self.time_box.setSingleStep(0.5)
+        self.time_box.setSuffix(" с")
+        self.time_box.setSpecialValueText("сразу")
+        self.time_box.setToolTip("Сколько секунд искать решения короче первого найденного")
+        control_layout.addWidget(self.time_box)
+        self.solve_btn = QPushButton("Собрать куб")
+        self.solve_btn.setFixedHeight(50)
+        self.solve_btn.clicked.connect(self.solve_cube)
+        control_layout.addWidget(self.solve_btn)
+        self.cancel_btn = QPushButton("Отмена")
+        self.cancel_btn.setFixedHeight(50)
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_solve)
+        control_layout.addWidget(self.cancel_btn)
+        control_layout.addWidget(QLabel("Скорость:"))
+        self.speed_box = QDoubleSpinBox()
+        self.speed_box.setRange(0.25, 16)
+        self.speed_box.setSingleStep(0.25)
+        self.speed_box.setValue(1.0)
+        self.speed_box.setSuffix("×")
+        self.speed_box.valueChanged.connect(self.set_speed)
+        control_layout.addWidget(self.speed_box)
         replay_btn = QPushButton("Повторить анимацию")
         replay_btn.setFixedHeight(50)
         replay_btn.clicked.connect(self.replay_animation)
@@ -382,13 +602,19 @@ class MainWindow(QMainWindow):
             f"background-color: {self.palette[letter]};"
             "border: 1px solid #2d89ef; border-radius: 5px;"
         )
+        self.net.color = letter
 
-    def cellClicked(self, face, row, col):
-        if row == 1 and col == 1:
+    def paste_state(self):
+        """Вставляет раскраску из буфера обмена (см. state_from_text)."""
+        if self.solve_task is not None:
             return
-        self.cube.faces[face][row * 3 + col] = self.current_color_letter
-        self.face_edit_widgets[face].updateFace()
-        self.cube3d.update()
+        try:
+            state = state_from_text(QApplication.clipboard().text())
+        except ValueError as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось вставить состояние: {e}")
+            return
+        self.stop_animation()
+        self.net.set_state(state)
 
     def solve_cube(self):
         # Проверка: все нецентральные клетки должны быть раскрашены
@@ -403,74 +629,200 @@ class MainWindow(QMainWindow):
         if incomplete:
             QMessageBox.warning(self, "Ошибка", "Пожалуйста, разукрасьте все грани куба перед сборкой!")
             return
+        if self.solve_task is not None:
+            return
+        from rubik_solver import SolveError, check_facelets, cube_to_facelets
+
+        # Невозможная раскраска отсекается сразу, не доходя до поиска
+        try:
+            error = check_facelets(cube_to_facelets(self.cube))
+        except SolveError as e:
+            error = e
+        if error is not None:
+            QMessageBox.warning(self, "Ошибка", f"Куб раскрашен неверно: {error}")
+            return
+        # Решение ищется для текущего состояния, поэтому анимация останавливается
+        self.stop_animation()
+        # Поиск идёт в фоновом потоке, анимация запускается по сигналу finished
+        task = SolveTask(self.cube, self.optimal_check.isChecked(), self.time_box.value() or None)
+        task.signals.progress.connect(self.solve_progress)
+        task.signals.improved.connect(self.solve_improved)
+        task.signals.finished.connect(self.solve_finished)
+        task.signals.failed.connect(self.solve_failed)
+        task.signals.cancelled.connect(self.solve_cancelled)
+        self.solve_task = task
+        # Пока идёт поиск, раскраску не меняем: решение ищется для снимка куба
+        self.net.locked = True
+        self.solve_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.statusBar().showMessage("Поиск решения...")
+        QThreadPool.globalInstance().start(task)
+
+    def cancel_solve(self):
+        if self.solve_task is not None:
+            self.solve_task.cancel()
+            self.cancel_btn.setEnabled(False)
+            self.statusBar().showMessage("Отмена поиска...")
+
+    def solve_progress(self, depth, nodes):
+        message = f"Поиск решения: глубина {depth}, узлов {nodes:,}".replace(',', ' ')
+        if self.solve_task is not None and self.solve_task.best is not None:
+            message += f"; лучшее решение — {len(self.solve_task.best)} ходов"
+        self.statusBar().showMessage(message)
+
+    def solve_improved(self, moves):
+        if self.solve_task is not None and self.solve_task.max_time is not None:
+            self.statusBar().showMessage(f"Найдено решение из {len(moves)} ходов, ищем короче...")
+
+    def solve_done(self):
+        self.solve_task = None
+        self.net.locked = False
+        self.solve_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        self.statusBar().clearMessage()
+
+    def solve_finished(self, moves):
+        self.solve_done()
+        self.solution = moves
         # Сохраняем текущее состояние куба для возможности повторного проигрывания анимации
         self.start_state = {face: self.cube.faces[face].copy() for face in self.cube.faces}
         self.play_assembly_animation()
 
+    def solve_failed(self, message):
+        self.solve_done()
+        QMessageBox.warning(self, "Ошибка", f"Куб раскрашен неверно: {message}")
+
+    def solve_cancelled(self):
+        self.solve_done()
+        self.statusBar().showMessage("Поиск отменён", 3000)
+
+    def closeEvent(self, event):
+        # Не держим окно открытым до конца долгого поиска
+        self.cancel_solve()
+        self.stop_animation()
+        super().closeEvent(event)
+
     def replay_animation(self):
         if self.start_state is None:
             QMessageBox.warning(self, "Ошибка", "Сначала соберите куб, чтобы сохранить состояние для анимации!")
             return
         for face in self.cube.faces:
             self.cube.faces[face] = self.start_state[face].copy()
-        for widget in self.face_edit_widgets.values():
-            widget.updateFace()
+        self.net.refresh()
         self.cube3d.update()
         self.play_assembly_animation()
 
     def play_assembly_animation(self):
-        # Для каждой грани определяем правильный (целевой) цвет – цвет центра
-        centers = {'U': 'W', 'D': 'Y', 'F': 'G', 'B': 'B', 'L': 'O', 'R': 'R'}
-        self.animation_tasks = []
-        for face in self.cube.faces:
-            target_color = centers[face]
-            for i in range(9):
-                if i != 4:
-                    self.animation_tasks.append((face, i, target_color))
-        self.animation_frames = []   # Очищаем список кадров
-        self.record_animation = True
-        self.animation_timer = QTimer(self)
-        self.animation_timer.timeout.connect(self.animation_step)
-        self.animation_timer.start(300)  # Интервал 300 мс для медленной анимации
-
-    def animation_step(self):
-        if self.animation_tasks:
-            face, idx, target_color = self.animation_tasks.pop(0)
-            self.cube.faces[face][idx] = target_color
-            # Добавляем эффект мерцания для изменённой клетки (максимальное значение flash = 1.0)
-            self.cube3d.flash_cells[(face, idx)] = 1.0
-            if face in self.face_edit_widgets:
-                self.face_edit_widgets[face].updateFace()
-            self.cube3d.update()
-            # Записываем кадр анимации из 3D-виджета
-            if self.record_animation:
-                frame = self.cube3d.grabFrameBuffer()
-                self.animation_frames.append(frame)
+        self.stop_animation()
+        # Кадры пишутся в фоновом потоке во временный файл, а не копятся в памяти
+        self.animation_frames = FrameSpool()
+        self.recorder = BackgroundWriter(self.animation_frames)
+        self.cube3d.frame_sink = self.recorder
+        self.record_start = time.monotonic()
+        # Очередь ходов найденного решения; дальше анимацию ведёт animation_tick
+        self.scheduler.start(self.solution, self.record_start)
+        self.animation_running = True
+        # Первый кадр — исходное состояние
+        self.cube3d.capture_frames = 1
+        self.recorded_frames = 1
+        self.cube3d.update()
+
+    def animation_tick(self):
+        # Вызывается после показа каждого кадра 3D-вида, поэтому темп анимации
+        # задаёт вертикальная синхронизация, а положение — прошедшее время
+        if not self.animation_running:
+            if self.cube3d.flash_cells:
+                self.cube3d.update()
+            return
+        if not self.scheduler.active:
+            # Последний кадр с собранным кубом уже показан и записан
+            self.animation_running = False
+            self.stop_recording()
+            QMessageBox.information(
+                self, "Собрано",
+                f"Куб успешно собран за {len(self.solution)} ходов:\n{' '.join(self.solution)}"
+            )
+            return
+        now = time.monotonic()
+        self.cube3d.turn = self.scheduler.advance(now)
+        if self.faces_dirty:
+            # Развёртка обновляется не чаще раза за кадр
+            self.faces_dirty = False
+            self.net.refresh()
+        if self.recorder is not None:
+            # Запись идёт с постоянной частотой RECORD_FPS по времени анимации
+            due = int((now - self.record_start) * RECORD_FPS) + 1
+            if not self.scheduler.active:
+                due = max(due, self.recorded_frames + 1)
+            self.cube3d.capture_frames = due - self.recorded_frames
+            self.recorded_frames = due
+        self.cube3d.update()
+
+    def move_done(self, move, before, after):
+        # Добавляем эффект мерцания для клеток, изменённых ходом (максимальное значение flash = 1.0)
+        for face, offset in FACE_OFFSET.items():
+            for idx in range(9):
+                if before[offset + idx] != after[offset + idx]:
+                    self.cube3d.flash_cells[(face, idx)] = 1.0
+        self.faces_dirty = True
+
+    def set_speed(self, speed):
+        self.scheduler.set_speed(speed)
+
+    def stop_animation(self):
+        """Прерывает анимацию; куб остаётся в состоянии после последнего завершённого хода."""
+        self.scheduler.stop()
+        self.animation_running = False
+        self.cube3d.turn = None
+        self.stop_recording()
+        self.cube3d.update()
+
+    def stop_recording(self):
+        if self.recorder is None:
+            self.cube3d.stopCapture()
         else:
-            self.animation_timer.stop()
-            self.record_animation = False
-            QMessageBox.information(self, "Собрано", "Куб успешно собран!")
+            recorder, self.recorder = self.recorder, None
+            try:
+                # Последний кадр ещё может лежать в буфере пикселей 3D-вида
+                self.cube3d.stopCapture()
+                recorder.close()
+            except Exception as e:
+                QMessageBox.warning(self, "Ошибка", f"Не удалось записать анимацию: {e}")
 
     def save_animation(self):
+        if self.recorder is not None:
+            QMessageBox.warning(self, "Ошибка", "Дождитесь окончания анимации!")
+            return
         if not self.animation_frames:
             QMessageBox.warning(self, "Ошибка", "Анимация не записана!")
             return
-        filename, _ = QFileDialog.getSaveFileName(self, "Сохранить анимацию", "", "GIF Files (*.gif)")
+        filename, selected = QFileDialog.getSaveFileName(
+            self, "Сохранить анимацию", "", "GIF Files (*.gif);;MP4 Video (*.mp4)")
         if not filename:
             return
-        frames = []
-        # Преобразуем QImage в numpy-массив (RGBA8888)
-        for qimg in self.animation_frames:
-            qimg = qimg.convertToFormat(qimg.Format_RGBA8888)
-            width = qimg.width()
-            height = qimg.height()
-            ptr = qimg.bits()
-            ptr.setsize(height * width * 4)
-            arr = np.frombuffer(ptr, np.uint8).reshape((height, width, 4))
-            frames.append(arr)
-        # Сохраняем в GIF ; fps ~3 (300 мс)
-        imageio.mimsave(filename, frames, fps=3)
-        QMessageBox.information(self, "Сохранено", f"Анимация сохранена в файл {filename}")
+        if not os.path.splitext(filename)[1]:
+            filename += '.mp4' if 'mp4' in selected else '.gif'
+        # Кодирование идёт в фоне, кадры читаются с диска по одному
+        task = ExportTask(self.animation_frames, filename, fps=RECORD_FPS)
+        task.signals.finished.connect(
+            lambda name: QMessageBox.information(self, "Сохранено", f"Анимация сохранена в файл {name}"))
+        task.signals.failed.connect(
+            lambda message: QMessageBox.warning(self, "Ошибка", f"Не удалось сохранить анимацию: {message}"))
+        self.export_task = task
+        QThreadPool.globalInstance().start(task)
+
+
+def warm_up():
+    """
+    Загружает решатель и его таблицы (при первом запуске — строит их) в фоновом
+    потоке, пока пользователь раскрашивает куб: первое решение не ждёт загрузки.
+    """
+    def load():
+        import rubik_solver
+        rubik_solver.get_tables()
+
+    threading.Thread(target=load, name='solver-warm-up', daemon=True).start()
+
 
 def run_app():
     app = QApplication(sys.argv)
@@ -497,24 +849,12 @@ def run_app():
     QPushButton:pressed {
         background-color: #202020;
     }
-    QTabWidget::pane {
-        border: 1px solid #444444;
-        background: #3c3c3c;
-    }
-    QTabBar::tab {
-        background: #3c3c3c;
-        color: #ffffff;
-        padding: 10px;
-        border-top-left-radius: 5px;
-        border-top-right-radius: 5px;
-    }
-    QTabBar::tab:selected {
-        background: #2d89ef;
-    }
     """
     app.setStyleSheet(style_sheet)
     window = MainWindow()
     window.show()
+    # Тяжёлые модули грузятся уже после появления окна
+    QTimer.singleShot(0, warm_up)
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+"""
+Последовательности ходов: разбор нотации, упрощение и компиляция.
+
+Кроме 18 ходов граней поддерживаются широкие ходы (Rw или r — два слоя),
+средние слои M, E, S и повороты всего куба x, y, z. Все они, как и ходы
+граней в rubik_cube, — перестановки 54 клеток, построенные по геометрии
+наклеек, поэтому последовательность любой длины можно заранее
+скомпоновать в одну перестановку и применить к состоянию за одну выборку.
+"""
+import re
+from functools import lru_cache
+from operator import itemgetter
+
+from rubik_cube import FACES, _FACE_FRAME, _rotate_clockwise, _sticker_geometry, compose
+
+# Базовый ход -> (ось поворота, слои вдоль оси). Ось — нормаль грани, ход
+# идёт по часовой стрелке, если смотреть на эту грань. M ходит как L, E — как D,
+# S — как F; x — как R, y — как U, z — как F (весь куб).
+_BASES = {face: (face, (1,)) for face in FACES}
+_BASES.update({face + 'w': (face, (1, 0)) for face in FACES})
+_BASES.update({
+    'M': ('L', (0,)), 'E': ('D', (0,)), 'S': ('F', (0,)),
+    'x': ('R', (1, 0, -1)), 'y': ('U', (1, 0, -1)), 'z': ('F', (1, 0, -1)),
+})
+_SUFFIXES = ('', '2', "'")
+
+_TOKEN = re.compile(r"\s*(?:([URFDLB]w|[URFDLBMESxyz])|([urfdlb]))(2'|2|')?")
+
+
+def _build_permutations():
+    stickers = _sticker_geometry()
+    index = {sticker: i for i, sticker in enumerate(stickers)}
+    perms = {}
+    for base, (face, layers) in _BASES.items():
+        axis = _FACE_FRAME[face][0]
+        quarter = list(range(54))
+        for src, (pos, normal) in enumerate(stickers):
+            if sum(p * a for p, a in zip(pos, axis)) in layers:
+                dest = index[(_rotate_clockwise(pos, axis), _rotate_clockwise(normal, axis))]
+                quarter[dest] = src
+        quarter = tuple(quarter)
+        half = compose(quarter, quarter)
+        for suffix, perm in zip(_SUFFIXES, (quarter, half, compose(half, quarter))):
+            perms[base + suffix] = perm
+    return perms
+
+
+# Перестановки клеток для всех ходов нотации (18 ходов граней совпадают с MOVE_PERMUTATIONS)
+PERMUTATIONS = _build_permutations()
+_IDENTITY = tuple(range(54))
+
+
+def _split(move):
+    """Ход -> (базовый ход, число четвертей поворота 1..3)."""
+    if move[-1:] == "'":
+        return move[:-1], 3
+    if move[-1:] == '2':
+        return move[:-1], 2
+    return move, 1
+
+
+def _join(base, power):
+    return base + _SUFFIXES[power - 1]
+
+
+def parse(notation):
+    """
+    Разбирает строку нотации в список ходов: "R U R' U'", "RUR'U'", "r2 M' x",
+    "U2'" (то же, что U2). Широкие ходы приводятся к виду Rw.
+    """
+    moves = []
+    pos = 0
+    notation = notation.strip()
+    while pos < len(notation):
+        match = _TOKEN.match(notation, pos)
+        if match is None:
+            raise ValueError(f"Неизвестный ход: {notation[pos:].split()[0]}")
+        base = match.group(1) or match.group(2).upper() + 'w'
+        suffix = match.group(3) or ''
+        moves.append(base + ('2' if suffix == "2'" else suffix))
+        pos = match.end()
+    return moves
+
+
+def _moves(sequence):
+    return parse(sequence) if isinstance(sequence, str) else list(sequence)
+
+
+def _axis(base):
+    # Ось хода грани (0 — U/D, 1 — R/L, 2 — F/B) или None для прочих ходов
+    return FACES.index(base) % 3 if base in FACES else None
+
+
+def simplify(sequence):
+    """
+    Упрощает последовательность: сокращает взаимно обратные ходы, склеивает
+    ходы одной грани (R R -> R2) с учётом того, что ходы противоположных граней
+    перестановочны (U D U' -> D), и упорядочивает такие пары (D U -> U D).
+    Прочие ходы (широкие, средние, повороты) склеиваются только с соседними
+    такими же.
+    """
+    result = []
+    for base, power in map(_split, _moves(sequence)):
+        i = len(result) - 1
+        axis = _axis(base)
+        if axis is not None:
+            while i >= 0 and result[i][0] != base and _axis(result[i][0]) == axis:
+                i -= 1
+        if i >= 0 and result[i][0] == base:
+            power = (result[i][1] + power) % 4
+            if power:
+                result[i][1] = power
+            else:
+                del result[i]
+        else:
+            result.append([base, power])
+    # Пары ходов противоположных граней — в порядке FACES
+    for i in range(len(result) - 1):
+        a, b = result[i][0], result[i + 1][0]
+        if _axis(a) is not None and _axis(a) == _axis(b) and FACES.index(a) > FACES.index(b):
+            result[i], result[i + 1] = result[i + 1], result[i]
+    return [_join(base, power) for base, power in result]
+
+
+def invert(sequence):
+    """Обратная последовательность: R U2 F' -> F U2 R'."""
+    return [_join(base, 4 - power) for base, power in map(_split, reversed(_moves(sequence)))]
+
+
+def layer_turn(move):
+    """
+    Геометрия хода для анимации: (грань, вокруг нормали которой идёт поворот,
+    слои вдоль этой нормали, число четвертей по часовой стрелке 1..3).
+    """
+    base, power = _split(move)
+    if base not in _BASES:
+        raise ValueError(f"Неизвестный ход: {move}")
+    face, layers = _BASES[base]
+    return face, layers, power
+
+
+def permutation(move):
+    """Перестановка клеток для одного хода нотации (ValueError для неизвестного хода)."""
+    perm = PERMUTATIONS.get(move)
+    if perm is None:
+        raise ValueError(f"Неизвестный ход: {move}")
+    return perm
+
+
+@lru_cache(maxsize=1024)
+def _compile(moves):
+    perm = _IDENTITY
+    for move in moves:
+        perm = compose(perm, permutation(move))
+    return perm
+
+
+def compile_sequence(sequence):
+    """
+    Одна перестановка 54 клеток, равная всей последовательности
+    (perm[dest] = src, как у ходов в rubik_cube). Результаты кэшируются.
+    """
+    return _compile(tuple(_moves(sequence)))
+
+
+def compile_getter(sequence):
+    """Функция state -> кортеж клеток после всей последовательности ходов."""
+    return itemgetter(*compile_sequence(sequence))
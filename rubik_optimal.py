@@ -0,0 +1,441 @@
+"""
+Оптимальный решатель: IDA* с базами шаблонов (pattern databases).
+
+Эвристика — максимум из трёх баз:
+- углы: перестановка (8!) x ориентация (3^7) = 88 179 840 состояний;
+- две группы по 6 рёбер (UR..DF и DL..BR): позиции (12!/6!) x ориентации (2^6)
+  = 42 577 920 состояний каждая.
+Расстояния (не больше 14) хранятся по два на байт в массивах NumPy, поэтому
+все три базы вместе занимают около 86 МБ. Таблицы хранятся в кэше на диске
+(rubik_tables) и отображаются в память. Ветви корня дерева поиска
+распределяются между процессами.
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import permutations
+import multiprocessing
+
+import numpy as np
+
+import rubik_solver
+from rubik_cube import MOVES
+from rubik_stats import SAMPLE_EVERY
+from rubik_tables import SharedTables, attach_shared, load_tables
+from rubik_solver import (
+    BASIC_MOVES, CHECK_EVERY, N_PERM8, N_TWIST, Deadline, SolveCancelled, SolveError, _PERM8, _PERM8_RANK,
+    _all_orientations, _ori_coord, _rank_perm, _twist, cube_to_facelets, facelets_to_cubies,
+)
+
+N_CORNER_STATES = N_PERM8 * N_TWIST
+N_EDGE6_POS = 12 * 11 * 10 * 9 * 8 * 7
+N_EDGE6_STATES = N_EDGE6_POS * 64
+EDGE_GROUPS = ((0, 1, 2, 3, 4, 5), (6, 7, 8, 9, 10, 11))
+# Значение «ещё не достигнуто» при построении базы (помещается в 4 бита)
+_UNKNOWN = 15
+# Версия набора таблиц в кэше
+TABLES_VERSION = 1
+
+
+def _rank_partial(pos):
+    """Номер размещения 6 различных позиций из 12 в лексикографическом порядке (векторно)."""
+    ranks = np.zeros(len(pos), dtype=np.int64)
+    for k in range(pos.shape[1]):
+        smaller = (pos[:, :k] < pos[:, k:k + 1]).sum(axis=1)
+        ranks = ranks * (12 - k) + pos[:, k] - smaller
+    return ranks
+
+
+def _build_move_tables():
+    n_moves = len(MOVES)
+    cp_moves = np.array([m[0] for m in BASIC_MOVES])
+    co_moves = np.array([m[1] for m in BASIC_MOVES], dtype=np.int8)
+    ep_moves = np.array([m[2] for m in BASIC_MOVES])
+    eo_moves = np.array([m[3] for m in BASIC_MOVES], dtype=np.int8)
+
+    corners = np.stack([_rank_perm(_PERM8[:, cp_moves[m]]) for m in range(n_moves)], axis=1)
+    co = _all_orientations(8, 3)
+    twist = np.stack([_ori_coord((co[:, cp_moves[m]] + co_moves[m]) % 3, 3)
+                      for m in range(n_moves)], axis=1)
+
+    # Ребро из позиции q после хода оказывается в позиции p, где M.ep[p] == q,
+    # и меняет ориентацию на M.eo[p]
+    dest = np.argsort(ep_moves, axis=1)
+    pos = np.array(list(permutations(range(12), 6)), dtype=np.int8)
+    edge_pos = np.empty((N_EDGE6_POS, n_moves), dtype=np.int32)
+    edge_flip = np.empty((N_EDGE6_POS, n_moves), dtype=np.uint8)
+    bits = 1 << np.arange(6, dtype=np.uint8)
+    for m in range(n_moves):
+        moved = dest[m][pos]
+        edge_pos[:, m] = _rank_partial(moved)
+        edge_flip[:, m] = (eo_moves[m][moved].astype(np.uint8) * bits).sum(axis=1)
+    return corners.astype(np.int32), twist.astype(np.int32), edge_pos, edge_flip
+
+
+def _bfs(n_states, start, neighbours, chunk=1 << 20):
+    """
+    Таблица расстояний от start до всех состояний. neighbours(idx) возвращает
+    соседей массива состояний для каждого хода. Когда фронт становится больше
+    числа недостигнутых состояний, обход идёт в обратную сторону: для каждого
+    недостигнутого состояния проверяется, есть ли сосед на текущей глубине.
+    Таблица просматривается блоками, чтобы не держать весь фронт в памяти.
+    """
+    table = np.full(n_states, _UNKNOWN, dtype=np.uint8)
+    table[start] = 0
+    depth, reached, remaining = 0, 1, n_states - 1
+    while remaining:
+        backward = reached > remaining
+        target = _UNKNOWN if backward else depth
+        for base in range(0, n_states, chunk):
+            part = np.flatnonzero(table[base:base + chunk] == target) + base
+            if backward:
+                found = np.zeros(len(part), dtype=bool)
+                for nb in neighbours(part):
+                    found |= table[nb] == depth
+                table[part[found]] = depth + 1
+            else:
+                for nb in neighbours(part):
+                    table[nb[table[nb] == _UNKNOWN]] = depth + 1
+        depth += 1
+        reached = int(np.count_nonzero(table == depth))
+        remaining -= reached
+    return table
+
+
+def _pack(table):
+    """Упаковка по два 4-битных значения в байт: чётный индекс — младшие биты."""
+    if len(table) % 2:
+        table = np.append(table, np.uint8(_UNKNOWN))
+    return table[0::2] | (table[1::2] << 4)
+
+
+def _edge_index(ep, eo, group):
+    where = [ep.index(e) for e in group]
+    rank = int(_rank_partial(np.array([where], dtype=np.int8))[0])
+    ori = sum(eo[p] << k for k, p in enumerate(where))
+    return rank, ori
+
+
+def _build_databases():
+    corners, twist, edge_pos, edge_flip = _build_move_tables()
+    n_moves = len(MOVES)
+
+    def corner_neighbours(idx):
+        c, t = np.divmod(idx, N_TWIST)
+        return (corners[c, m].astype(np.int64) * N_TWIST + twist[t, m] for m in range(n_moves))
+
+    def edge_neighbours(idx):
+        p, o = idx >> 6, (idx & 63).astype(np.uint8)
+        return ((edge_pos[p, m].astype(np.int64) << 6) | (o ^ edge_flip[p, m])
+                for m in range(n_moves))
+
+    tables = {
+        'corners_move': corners, 'twist_move': twist,
+        'edge_pos_move': edge_pos, 'edge_flip_move': edge_flip,
+        'corner_pdb': _pack(_bfs(N_CORNER_STATES, 0, corner_neighbours)),
+    }
+    for name, group in zip(('edge_pdb_a', 'edge_pdb_b'), EDGE_GROUPS):
+        rank, _ = _edge_index(list(range(12)), [0] * 12, group)
+        tables[name] = _pack(_bfs(N_EDGE6_STATES, rank << 6, edge_neighbours))
+    return tables
+
+
+_databases = None
+_load_lock = threading.Lock()
+
+
+def get_databases():
+    """
+    Таблицы переходов и упакованные базы шаблонов. При первом обращении
+    загружаются из кэша на диске или строятся (около полуминуты).
+    """
+    global _databases
+    if _databases is None:
+        # Таблицы могут запросить сразу несколько потоков (например, фоновая загрузка в GUI)
+        with _load_lock:
+            if _databases is None:
+                _databases = load_tables('optimal', TABLES_VERSION, _build_databases)
+    return _databases
+
+
+def _initial_state(cubies):
+    cp, co, ep, eo = cubies
+    state = [_PERM8_RANK[cp], _twist(co)]
+    for group in EDGE_GROUPS:
+        state.extend(_edge_index(ep, eo, group))
+    return tuple(state)
+
+
+class _Searcher:
+    """Поиск в глубину с ограничением по оценке; один экземпляр на процесс."""
+
+    def __init__(self, db, stop=None, progress=None, sample=False):
+        self.corners_move = memoryview(db['corners_move'].ravel())
+        self.twist_move = db['twist_move'].ravel().tolist()
+        self.edge_pos_move = memoryview(db['edge_pos_move'].ravel())
+        self.edge_flip_move = memoryview(db['edge_flip_move'].ravel())
+        self.corner_pdb = memoryview(db['corner_pdb'])
+        self.edge_pdb_a = memoryview(db['edge_pdb_a'])
+        self.edge_pdb_b = memoryview(db['edge_pdb_b'])
+        self.stop = stop
+        self.progress = progress
+        self.nodes = 0
+        # Выборка для оценки обращений к базам: [узлов, обращений у их потомков]
+        self.sample = sample
+        self.sampled = [0, 0]
+
+    def checkpoint(self, bound):
+        if self.progress is not None:
+            self.progress(bound, self.nodes)
+        if self.stop is not None and self.stop.is_set():
+            raise _Cancelled
+
+    def lookups(self, state, togo, last_face):
+        """Сколько раз проверка потомков узла state обращается к базам шаблонов."""
+        count = 0
+        for m in range(len(MOVES)):
+            face = m // 3
+            if face == last_face or face == last_face - 3:
+                continue
+            c, t, pa, oa, pb, ob = self.apply(state, m)
+            i, ja = c * N_TWIST + t, pa << 6 | oa
+            count += 1
+            if (self.corner_pdb[i >> 1] >> ((i & 1) << 2)) & 15 >= togo:
+                continue
+            count += 1
+            if (self.edge_pdb_a[ja >> 1] >> ((ja & 1) << 2)) & 15 >= togo:
+                continue
+            count += 1
+        return count
+
+    def heuristic(self, state):
+        c, t, pa, oa, pb, ob = state
+        i = c * N_TWIST + t
+        ja, jb = pa << 6 | oa, pb << 6 | ob
+        return max((self.corner_pdb[i >> 1] >> ((i & 1) << 2)) & 15,
+                   (self.edge_pdb_a[ja >> 1] >> ((ja & 1) << 2)) & 15,
+                   (self.edge_pdb_b[jb >> 1] >> ((jb & 1) << 2)) & 15)
+
+    def apply(self, state, m):
+        c, t, pa, oa, pb, ob = state
+        n = len(MOVES)
+        return (self.corners_move[c * n + m], self.twist_move[t * n + m],
+                self.edge_pos_move[pa * n + m], oa ^ self.edge_flip_move[pa * n + m],
+                self.edge_pos_move[pb * n + m], ob ^ self.edge_flip_move[pb * n + m])
+
+    def search(self, state, bound, last_face=-1):
+        """Решение ровно из bound ходов (список номеров ходов) или None."""
+        corners_move, twist_move = self.corners_move, self.twist_move
+        edge_pos_move, edge_flip_move = self.edge_pos_move, self.edge_flip_move
+        corner_pdb, pdb_a, pdb_b = self.corner_pdb, self.edge_pdb_a, self.edge_pdb_b
+        checking = self.stop is not None or self.progress is not None or self.sample
+        every = SAMPLE_EVERY if self.sample else CHECK_EVERY
+        n = len(MOVES)
+        moves = [(m, m // 3) for m in range(n)]
+        path = []
+
+        def dfs(c, t, pa, oa, pb, ob, togo, last_face):
+            # Сюда попадают только состояния с оценкой меньше togo, поэтому
+            # при togo == 0 все три базы дают 0 и куб собран
+            if togo == 0:
+                return True
+            self.nodes += 1
+            if checking and self.nodes % every == 0:
+                if self.sample:
+                    self.sampled[0] += 1
+                    self.sampled[1] += self.lookups((c, t, pa, oa, pb, ob), togo, last_face)
+                if self.nodes % CHECK_EVERY == 0:
+                    self.checkpoint(bound)
+            for m, face in moves:
+                if face == last_face or face == last_face - 3:
+                    continue
+                c2 = corners_move[c * n + m]
+                t2 = twist_move[t * n + m]
+                i = c2 * N_TWIST + t2
+                if (corner_pdb[i >> 1] >> ((i & 1) << 2)) & 15 >= togo:
+                    continue
+                ia, ib = pa * n + m, pb * n + m
+                pa2, oa2 = edge_pos_move[ia], oa ^ edge_flip_move[ia]
+                j = pa2 << 6 | oa2
+                if (pdb_a[j >> 1] >> ((j & 1) << 2)) & 15 >= togo:
+                    continue
+                pb2, ob2 = edge_pos_move[ib], ob ^ edge_flip_move[ib]
+                j = pb2 << 6 | ob2
+                if (pdb_b[j >> 1] >> ((j & 1) << 2)) & 15 >= togo:
+                    continue
+                path.append(m)
+                if dfs(c2, t2, pa2, oa2, pb2, ob2, togo - 1, face):
+                    return True
+                path.pop()
+            return False
+
+        if dfs(*state, bound, last_face):
+            return path
+        return None
+
+
+class _Cancelled(Exception):
+    """Поиск остановлен: другой процесс уже нашёл решение или поиск отменён."""
+
+
+_worker = None
+
+
+def _init_worker(stop, descriptor, sample=False):
+    global _worker
+    _worker = _Searcher(attach_shared(descriptor), stop, sample=sample)
+
+
+def _search_branch(prefix, state, bound):
+    """Задача рабочего процесса: поиск в поддереве после ходов prefix."""
+    _worker.nodes = 0
+    _worker.sampled = [0, 0]
+    try:
+        tail = _worker.search(state, bound, prefix[-1] // 3)
+    except _Cancelled:
+        tail = None
+    return (prefix + tail if tail is not None else None), _worker.nodes, _worker.sampled
+
+
+def _branches(searcher, state, bound, depth=2):
+    """Все префиксы длины depth, не отсечённые эвристикой, вместе с состояниями."""
+    level = [((), state)]
+    for togo in range(bound, bound - depth, -1):
+        nxt = []
+        for prefix, st in level:
+            last_face = prefix[-1] // 3 if prefix else -1
+            for m in range(len(MOVES)):
+                face = m // 3
+                if face == last_face or face == last_face - 3:
+                    continue
+                child = searcher.apply(st, m)
+                if searcher.heuristic(child) < togo:
+                    nxt.append((prefix + (m,), child))
+        level = nxt
+    return level
+
+
+def solve_cubies(cubies, max_length=20, workers=None, progress=None, cancel=None, stats=None):
+    """
+    Оптимальное решение (список номеров ходов) не длиннее max_length или None.
+    workers — число процессов (по умолчанию по числу ядер), 1 — поиск в текущем процессе.
+    progress(depth, nodes), cancel и stats — как в rubik_solver.solve_cubies
+    (узлы по глубинам — по границам IDA*).
+    """
+    started = time.perf_counter()
+    db = get_databases()
+    if stats is not None:
+        stats.add_time('tables', time.perf_counter() - started)
+    searcher = _Searcher(db, cancel, progress, sample=stats is not None)
+    started = time.perf_counter()
+    try:
+        return _search(db, searcher, _initial_state(cubies), max_length, workers, progress, cancel, stats)
+    finally:
+        if stats is not None:
+            stats.nodes += searcher.nodes
+            stats.phase_nodes['search'] = stats.phase_nodes.get('search', 0) + searcher.nodes
+            stats.sampled['search'] = searcher.sampled
+            stats.add_time('search', time.perf_counter() - started)
+
+
+def _search(db, searcher, state, max_length, workers, progress, cancel, stats):
+    workers = workers or os.cpu_count() or 1
+    start = searcher.heuristic(state)
+    if workers == 1:
+        try:
+            for bound in range(start, max_length + 1):
+                searcher.checkpoint(bound)
+                before = searcher.nodes
+                path = searcher.search(state, bound)
+                if stats is not None:
+                    stats.nodes_by_depth[bound] = searcher.nodes - before
+                if path is not None:
+                    return path
+        except _Cancelled:
+            raise SolveCancelled from None
+        return None
+
+    # Корневые ветви (префиксы из двух ходов) — задачи для пула процессов
+    # Базы публикуются в разделяемой памяти один раз на все рабочие процессы.
+    # Процессы запускаются через spawn: fork процесса с потоками (окно, поиск
+    # в фоновом потоке) может унаследовать захваченные блокировки и зависнуть
+    context = multiprocessing.get_context('spawn')
+    stop = context.Event()
+    with SharedTables(db) as shared, ProcessPoolExecutor(
+            workers, mp_context=context, initializer=_init_worker,
+            initargs=(stop, shared.descriptor, searcher.sample)) as pool:
+        for bound in range(start, max_length + 1):
+            before = searcher.nodes
+            if bound < 3:
+                path = searcher.search(state, bound)
+                if stats is not None:
+                    stats.nodes_by_depth[bound] = searcher.nodes - before
+                if path is not None:
+                    return path
+                continue
+            pending = {pool.submit(_search_branch, list(prefix), st, bound - len(prefix))
+                       for prefix, st in _branches(searcher, state, bound)}
+            while pending:
+                # С флагом отмены ждём с таймаутом, чтобы вовремя его заметить
+                timeout = 0.1 if cancel is not None else None
+                done, pending = wait(pending, timeout, return_when=FIRST_COMPLETED)
+                if cancel is not None and cancel.is_set():
+                    stop.set()
+                    for f in pending:
+                        f.cancel()
+                    raise SolveCancelled
+                for future in done:
+                    path, nodes, sampled = future.result()
+                    searcher.nodes += nodes
+                    searcher.sampled = [a + b for a, b in zip(searcher.sampled, sampled)]
+                    if stats is not None:
+                        stats.nodes_by_depth[bound] = searcher.nodes - before
+                    if path is not None:
+                        stop.set()
+                        for f in pending:
+                            f.cancel()
+                        return path
+                if done and progress is not None:
+                    progress(bound, searcher.nodes)
+    return None
+
+
+def solve(cube, max_length=20, workers=None, progress=None, cancel=None, stats=None, max_time=None,
+          on_solution=None):
+    """
+    Оптимальное решение куба RubiksCube в виде списка ходов HTM.
+    С max_time (секунды) сначала находится решение двухфазным алгоритмом, а
+    оптимальный поиск идёт только среди более коротких и прерывается по
+    истечении срока — тогда возвращается лучшее из найденных решений.
+    on_solution(ходы) вызывается для каждого найденного решения.
+    """
+    started = time.perf_counter()
+    cubies = facelets_to_cubies(cube_to_facelets(cube))
+    if stats is not None:
+        stats.add_time('parse', time.perf_counter() - started)
+    best = None
+    if max_time is not None:
+        deadline = Deadline(max_time - (time.perf_counter() - started), cancel)
+        best = rubik_solver.solve_cubies(cubies, max_length, progress, cancel, stats)
+        if best is not None:
+            if on_solution is not None:
+                on_solution([MOVES[m] for m in best])
+            max_length = len(best) - 1
+        try:
+            solution = solve_cubies(cubies, max_length, workers, progress, deadline, stats)
+        except SolveCancelled:
+            if not deadline.expired() or best is None:
+                raise
+            solution = None
+    else:
+        solution = solve_cubies(cubies, max_length, workers, progress, cancel, stats)
+    if solution is None:
+        solution = best
+    elif stats is not None:
+        stats.improvement(len(solution))
+    if solution is None:
+        raise SolveError(f"решение длиной не более {max_length} ходов не найдено")
+    if on_solution is not None and solution is not best:
+        on_solution([MOVES[m] for m in solution])
+    return [MOVES[m] for m in solution]
@@ -0,0 +1,166 @@
+"""
+Равномерно случайные допустимые состояния куба и перемешивания к ним.
+
+Случайные ходы из собранного состояния дают смещённое распределение (короткие
+последовательности не успевают перемешать куб, а ходы по одному через
+RubiksCube.move медленны). Здесь состояние собирается прямо из случайных
+кубиковых координат: перестановки углов и рёбер — равномерные случайные
+перестановки (argsort случайных чисел), ориентации случайны, кроме последней,
+которая дополняет сумму до нуля, а чётность перестановки рёбер выравнивается
+с чётностью углов обменом двух последних рёбер. Так каждое из
+43 252 003 274 489 856 000 состояний выпадает с одной и той же вероятностью.
+Всё считается векторно для пачек по CHUNK состояний.
+
+    python -m rubik_cube random --count 1000000 --seed 1 --out states.jsonl
+
+Перемешивание к состоянию — обращённое решение двухфазного алгоритма (не
+длиннее 22 ходов); оно требует решения каждого состояния и поэтому намного
+медленнее самой генерации.
+"""
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import rubik_solver
+from rubik_batch import _parity
+from rubik_cube import CENTERS, FACES
+from rubik_moves import invert
+from rubik_solver import CORNER_FACELETS, CORNERS, EDGE_FACELETS, EDGES
+
+# Сколько состояний генерируется за один векторный шаг
+CHUNK = 65536
+# Размер записи двоичного файла: буфер состояния RubiksCube
+STATE_SIZE = 54
+
+
+def _build_piece_colors():
+    # Цвета клеток позиции (в порядке CORNER_FACELETS/EDGE_FACELETS) для кубика c
+    # с ориентацией o: строка c * 3 + o (углы) или e * 2 + o (рёбра).
+    # Ориентация угла — номер клетки с цветом U/D, как в facelets_to_cubies.
+    corners = np.zeros((len(CORNERS) * 3, 3), dtype=np.uint8)
+    for c, name in enumerate(CORNERS):
+        for o in range(3):
+            for k in range(3):
+                corners[c * 3 + o, (o + k) % 3] = ord(CENTERS[name[k]])
+    edges = np.zeros((len(EDGES) * 2, 2), dtype=np.uint8)
+    for e, name in enumerate(EDGES):
+        colors = [ord(CENTERS[face]) for face in name]
+        edges[e * 2] = colors
+        edges[e * 2 + 1] = colors[::-1]
+    return corners, edges
+
+
+_CORNER_COLORS, _EDGE_COLORS = _build_piece_colors()
+_CORNER_CELLS = np.array(CORNER_FACELETS, dtype=np.intp)
+_EDGE_CELLS = np.array(EDGE_FACELETS, dtype=np.intp)
+_CENTER_COLORS = np.array([ord(CENTERS[face]) for face in FACES], dtype=np.uint8)
+# Буква грани (URFDLB) по коду цвета наклейки
+_FACE_OF_COLOR = np.zeros(256, dtype=np.uint8)
+_FACE_OF_COLOR[_CENTER_COLORS] = np.frombuffer(''.join(FACES).encode('ascii'), dtype=np.uint8)
+
+
+def _orientations(rng, n, pieces, modulo):
+    # Все ориентации, кроме последней, случайны; последняя дополняет сумму до 0 по модулю
+    ori = np.empty((n, pieces), dtype=np.int8)
+    ori[:, :-1] = rng.integers(0, modulo, size=(n, pieces - 1), dtype=np.int8)
+    ori[:, -1] = -ori[:, :-1].sum(axis=1, dtype=np.int64) % modulo
+    return ori
+
+
+def random_cubies(n, rng):
+    """
+    Кубиковые координаты n равномерно случайных допустимых состояний:
+    массивы cp (n, 8), co (n, 8), ep (n, 12), eo (n, 12) int8.
+    rng — numpy.random.Generator.
+    """
+    cp = rng.random((n, 8)).argsort(axis=1).astype(np.int8)
+    ep = rng.random((n, 12)).argsort(axis=1).astype(np.int8)
+    # Обмен двух последних рёбер — взаимно однозначное отображение между
+    # чётными и нечётными перестановками, поэтому равномерность сохраняется
+    odd = _parity(cp) != _parity(ep)
+    ep[odd, -2:] = ep[odd, -1:-3:-1]
+    return cp, _orientations(rng, n, 8, 3), ep, _orientations(rng, n, 12, 2)
+
+
+def cubies_to_states(cp, co, ep, eo):
+    """Массив состояний (N, 54) uint8 (буквы цветов, как в RubiksCube) по кубиковым координатам."""
+    n = len(cp)
+    states = np.empty((n, STATE_SIZE), dtype=np.uint8)
+    states[:, 4::9] = _CENTER_COLORS
+    states[:, _CORNER_CELLS] = _CORNER_COLORS[cp.astype(np.intp) * 3 + co]
+    states[:, _EDGE_CELLS] = _EDGE_COLORS[ep.astype(np.intp) * 2 + eo]
+    return states
+
+
+def iter_random_states(count, seed=None):
+    """
+    Пачки (до CHUNK строк) равномерно случайных состояний (N, 54) uint8,
+    всего count. Одинаковые seed и count дают одинаковые состояния.
+    """
+    rng = np.random.default_rng(seed)
+    for start in range(0, count, CHUNK):
+        yield cubies_to_states(*random_cubies(min(CHUNK, count - start), rng))
+
+
+def random_states(count, seed=None):
+    """Массив (count, 54) равномерно случайных состояний."""
+    chunks = list(iter_random_states(count, seed))
+    return np.concatenate(chunks) if chunks else np.empty((0, STATE_SIZE), dtype=np.uint8)
+
+
+def states_to_facelets(states):
+    """Строки из 54 букв граней (URFDLB) для массива состояний (N, 54)."""
+    data = _FACE_OF_COLOR[states].tobytes().decode('ascii')
+    return [data[i:i + STATE_SIZE] for i in range(0, len(data), STATE_SIZE)]
+
+
+def scramble_for(facelets, max_length=22):
+    """Перемешивание, приводящее собранный куб в состояние facelets (обращённое решение)."""
+    return invert(rubik_solver.solve_facelets(facelets, max_length))
+
+
+def write_jsonl(out, count, seed=None, scrambles=False, workers=1, first_id=0):
+    """
+    Пишет count состояний в out строками {"id": ..., "facelets": "..."}
+    (формат входа python -m rubik_cube solve); со scrambles=True — ещё и
+    "scramble": ходы, переводящие собранный куб в это состояние.
+    """
+    record_id = first_id
+    if not scrambles:
+        for states in iter_random_states(count, seed):
+            out.write(''.join(f'{{"id": {record_id + i}, "facelets": "{facelets}"}}\n'
+                              for i, facelets in enumerate(states_to_facelets(states))))
+            record_id += len(states)
+        return
+
+    def write(solve_all):
+        nonlocal record_id
+        for states in iter_random_states(count, seed):
+            facelets = states_to_facelets(states)
+            for f, moves in zip(facelets, solve_all(facelets)):
+                out.write(json.dumps({'id': record_id, 'facelets': f, 'scramble': ' '.join(moves)}) + '\n')
+                record_id += 1
+
+    # Таблицы загружаются до запуска пула, чтобы не строить их в каждом процессе
+    rubik_solver.get_tables()
+    if workers <= 1:
+        write(lambda facelets: map(scramble_for, facelets))
+        return
+    with rubik_solver.share_tables() as shared, ProcessPoolExecutor(
+            workers, initializer=rubik_solver.init_worker, initargs=(shared.descriptor,)) as pool:
+        write(lambda facelets: pool.map(scramble_for, facelets, chunksize=64))
+
+
+def write_binary(out, count, seed=None):
+    """
+    Пишет count состояний в двоичный поток out: подряд записи по 54 байта
+    (буфер RubiksCube, буквы цветов). Файл читается read_binary.
+    """
+    for states in iter_random_states(count, seed):
+        out.write(states.tobytes())
+
+
+def read_binary(path):
+    """Состояния из файла write_binary: массив (N, 54) uint8, отображённый в память."""
+    return np.memmap(path, dtype=np.uint8, mode='r').reshape(-1, STATE_SIZE)
@@ -0,0 +1,221 @@
+"""
+Геометрия и цвета 3D-модели куба, общие для всех способов отрисовки.
+
+Куб имеет ребро 2 (координаты от -1 до 1), каждая грань разбита на 3x3
+наклейки со стороной 2/3. Расположение наклеек берётся из той же геометрии,
+что и перестановки ходов в rubik_cube, поэтому номер клетки в буфере
+состояния совпадает с номером наклейки в вершинных массивах.
+"""
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from rubik_cube import FACES, _FACE_FRAME
+
+# Цвета для OpenGL: значения RGB в диапазоне [0, 1]
+OPENCOLOR_MAP = {
+    'W': (1.0, 1.0, 1.0),
+    'Y': (1.0, 1.0, 0.0),
+    'G': (0.0, 1.0, 0.0),
+    'B': (0.0, 0.0, 1.0),
+    'O': (1.0, 0.5, 0.0),
+    'R': (1.0, 0.0, 0.0),
+    '-': (0.5, 0.5, 0.5)
+}
+
+STICKER_SIZE = 2.0 / 3.0
+
+# Цвет наклейки по коду буквы (байт буфера состояния); неизвестные буквы — серые
+COLOR_TABLE = np.full((256, 3), 0.5, dtype=np.float32)
+for _letter, _rgb in OPENCOLOR_MAP.items():
+    COLOR_TABLE[ord(_letter)] = _rgb
+
+
+def _build_sticker_quads():
+    """Углы наклеек: массив (54, 4, 3) в порядке обхода против часовой стрелки снаружи."""
+    quads = np.empty((54, 4, 3), dtype=np.float32)
+    half = STICKER_SIZE / 2
+    for f, face in enumerate(FACES):
+        normal, row_dir, col_dir = (np.array(v, dtype=np.float32) for v in _FACE_FRAME[face])
+        for i in range(9):
+            r, c = divmod(i, 3)
+            center = normal + (r - 1) * STICKER_SIZE * row_dir + (c - 1) * STICKER_SIZE * col_dir
+            # Номер строки растёт вниз, поэтому «низ» наклейки — это +row_dir
+            quads[9 * f + i] = (
+                center + half * (row_dir - col_dir),
+                center + half * (row_dir + col_dir),
+                center + half * (col_dir - row_dir),
+                center - half * (row_dir + col_dir),
+            )
+    return quads
+
+
+STICKER_QUADS = _build_sticker_quads()
+# Вершины всех наклеек подряд (216, 3) — статический вершинный буфер
+QUAD_VERTICES = np.ascontiguousarray(STICKER_QUADS.reshape(-1, 3))
+# Индексы рёбер контура каждой наклейки для GL_LINES: (54, 8)
+OUTLINE_INDICES = (np.arange(54, dtype=np.uint32)[:, None] * 4
+                   + np.array([0, 1, 1, 2, 2, 3, 3, 0], dtype=np.uint32))
+
+
+def sticker_colors(state):
+    """Цвета наклеек (54, 3) float32 по 54-байтовому буферу состояния."""
+    return COLOR_TABLE[np.frombuffer(bytes(state), dtype=np.uint8)]
+
+
+def vertex_colors(state):
+    """Цвета вершин (216, 3): у всех четырёх углов наклейки один цвет."""
+    return np.ascontiguousarray(np.repeat(sticker_colors(state), 4, axis=0))
+
+
+@lru_cache(maxsize=None)
+def turn_geometry(move):
+    """
+    Геометрия анимации хода: (ось поворота, полный угол в градусах для
+    glRotatef, номера поворачиваемых наклеек, номера неподвижных наклеек,
+    чёрные квадраты (n, 4, 3) в плоскостях разреза между слоями).
+    """
+    from rubik_moves import layer_turn
+
+    face, layers, power = layer_turn(move)
+    axis = np.array(_FACE_FRAME[face][0], dtype=np.float32)
+    # По часовой стрелке при взгляде на грань — отрицательный угол вокруг её нормали;
+    # три четверти показываем как одну четверть в обратную сторону
+    angle = {1: -90.0, 2: -180.0, 3: 90.0}[power]
+    layer = np.rint(STICKER_QUADS.mean(axis=1) @ axis * 1.5).clip(-1, 1).astype(int)
+    moving = np.isin(layer, layers)
+    u = np.roll(axis, 1)
+    v = np.cross(axis, u)
+    cuts = []
+    for k in (-1, 0):
+        if (k in layers) != (k + 1 in layers):
+            center = axis * (2 * k + 1) / 3
+            cuts.append([center - u - v, center + u - v, center + u + v, center - u + v])
+    return (tuple(axis), angle, np.flatnonzero(moving), np.flatnonzero(~moving),
+            np.array(cuts, dtype=np.float32).reshape(-1, 4, 3))
+
+
+# Камера окна: gluPerspective(45, ...), gluLookAt(0, 0, 8, ...) и повороты мышью
+FOV_Y = 45.0
+CAMERA_DISTANCE = 8.0
+BACKGROUND = (0.1, 0.1, 0.1)
+FLASH_COLOR = (1.0, 1.0, 0.0)
+
+
+def _rotation(axis, degrees):
+    """Матрица поворота как у glRotatef (против часовой стрелки при взгляде с конца оси)."""
+    a = np.radians(degrees)
+    c, s = np.cos(a), np.sin(a)
+    x, y, z = axis
+    k = np.array([[0, -z, y], [z, 0, -x], [-y, x, 0]], dtype=np.float64)
+    return np.eye(3) + s * k + (1 - c) * (k @ k)
+
+
+def project(size, x_rot=30, y_rot=30):
+    """
+    Экранные координаты углов наклеек (54, 4, 2) в пикселях (ось y вниз)
+    и маска наклеек, обращённых к камере.
+    """
+    width, height = size
+    rotation = _rotation((1, 0, 0), x_rot) @ _rotation((0, 1, 0), y_rot)
+    eye = STICKER_QUADS.astype(np.float64) @ rotation.T
+    eye[..., 2] -= CAMERA_DISTANCE
+    f = 1.0 / np.tan(np.radians(FOV_Y) / 2)
+    ndc_x = f * height / width * eye[..., 0] / -eye[..., 2]
+    ndc_y = f * eye[..., 1] / -eye[..., 2]
+    screen = np.stack([(ndc_x + 1) * width / 2, (1 - ndc_y) * height / 2], axis=-1)
+    # Куб выпуклый: видимы ровно наклейки, нормаль которых смотрит на камеру
+    normals = np.cross(eye[:, 1] - eye[:, 0], eye[:, 2] - eye[:, 1])
+    facing = np.einsum('ij,ij->i', normals, -eye.mean(axis=1)) > 0
+    return screen, facing
+
+
+class Rasterizer:
+    """
+    Отрисовка куба без OpenGL (для машин без дисплея). Камера неподвижна,
+    поэтому пиксели каждой видимой наклейки, её контура и подсветки
+    вычисляются один раз, а кадр — это заливка 54 цветов по готовым индексам.
+    """
+
+    def __init__(self, size=(480, 352), x_rot=30, y_rot=30, line_width=0.75, flash_width=1.5):
+        self.size = width, height = size
+        screen, facing = project(size, x_rot, y_rot)
+        base = np.empty((height * width, 3), dtype=np.uint8)
+        base[:] = np.round(np.array(BACKGROUND) * 255)
+        self.fill, self.flash = {}, {}
+        for sticker in np.flatnonzero(facing):
+            quad = screen[sticker]
+            x0, y0 = np.maximum(np.floor(quad.min(axis=0)).astype(int), 0)
+            x1, y1 = np.minimum(np.ceil(quad.max(axis=0)).astype(int), (width, height))
+            if x0 >= x1 or y0 >= y1:
+                continue
+            ys, xs = np.mgrid[y0:y1, x0:x1]
+            px, py = xs.ravel() + 0.5, ys.ravel() + 0.5
+            # Расстояние со знаком до каждой стороны (внутри — положительное)
+            a, b = quad, np.roll(quad, -1, axis=0)
+            edge = b - a
+            length = np.hypot(edge[:, 0], edge[:, 1])[:, None]
+            dist = (edge[:, 0:1] * (py - a[:, 1:2]) - edge[:, 1:2] * (px - a[:, 0:1])) / length
+            # Проекция переворачивает обход, поэтому ориентацию определяем по площади
+            area = np.sum(a[:, 0] * b[:, 1] - b[:, 0] * a[:, 1])
+            nearest = (dist if area > 0 else -dist).min(axis=0)
+            pixels = ys.ravel() * width + xs.ravel()
+            self.fill[sticker] = pixels[nearest >= line_width]
+            self.flash[sticker] = pixels[(nearest >= 0) & (nearest < flash_width)]
+            # Контуры наклеек чёрные и не зависят от состояния
+            base[pixels[(nearest >= 0) & (nearest < line_width)]] = 0
+        self.base = base
+
+    def render(self, state, flash=()):
+        """
+        Кадр (H, W, 3) uint8 для 54-байтового состояния; наклейки из flash
+        (номера клеток буфера или пары (номер, яркость 0..1)) обводятся жёлтым.
+        """
+        width, height = self.size
+        frame = self.base.copy()
+        colors = np.round(sticker_colors(state) * 255).astype(np.uint8)
+        for sticker, pixels in self.fill.items():
+            frame[pixels] = colors[sticker]
+        for item in flash:
+            sticker, alpha = item if isinstance(item, tuple) else (item, 1.0)
+            pixels = self.flash.get(sticker)
+            if pixels is not None:
+                blended = (1 - alpha) * frame[pixels] + alpha * np.array(FLASH_COLOR) * 255
+                frame[pixels] = np.round(blended).astype(np.uint8)
+        return frame.reshape(height, width, 3)
+
+
+def render_animation(state, moves, path, size=(480, 352), fps=3, x_rot=30, y_rot=30, flash=True,
+                     rasterizer=None):
+    """
+    Записывает анимацию решения в GIF/MP4 (по расширению path): исходное
+    состояние и по кадру после каждого хода, как в окне приложения.
+    Кадры кодируются по одному. Возвращает число кадров; при ошибке
+    недописанный файл удаляется.
+    """
+    from rubik_cube import RubiksCube
+    from rubik_video import open_writer
+
+    rasterizer = rasterizer or Rasterizer(size, x_rot, y_rot)
+    cube = RubiksCube(state)
+    writer = open_writer(path, fps, colors=OPENCOLOR_MAP.values())
+    try:
+        writer.append_data(rasterizer.render(cube.state))
+        for move in moves:
+            before = cube.state
+            cube.move(move)
+            after = cube.state
+            changed = [i for i in range(54) if before[i] != after[i]] if flash else ()
+            # В окне подсветка успевает один раз угаснуть на 0.05 до отрисовки кадра
+            writer.append_data(rasterizer.render(after, [(i, 0.95) for i in changed]))
+    except BaseException:
+        try:
+            writer.close()
+        except Exception:
+            pass
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    writer.close()
+    return len(moves) + 1
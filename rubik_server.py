@@ -0,0 +1,426 @@
+"""
+Резидентный сервис решения: HTTP/1.1 поверх asyncio (TCP или Unix-сокет),
+только стандартная библиотека.
+
+    python -m rubik_cube serve --port 8765 --workers 4
+    curl -d '{"facelets": "UUUUUUUUURRRRRRRRRFFFFFFFFFDDDDDDDDDLLLLLLLLLBBBBBBBBB"}' \\
+         http://127.0.0.1:8765/solve
+
+Эндпоинты:
+    POST /solve    {"facelets": "..."} (54 буквы граней URFDLB) или {"state": "..."}
+                   (54 буквы цветов, как в RubiksCube), необязательно "max_length"
+                   (от 19 до 30). Ответ {"solution": "R U ...", "length": N,
+                   "cached": false} или 422 {"error": "..."}, в том числе когда
+                   решение не найдено за --max-time секунд. {"batch": [запрос, ...]} решает несколько
+                   состояний и возвращает {"results": [...]}.
+    GET /health    {"status": "ok", ...}
+    GET /metrics   счётчики запросов, пакетов, кэша и перцентили задержки (JSON)
+
+Таблицы решателя загружаются один раз и публикуются в разделяемой памяти для
+пула процессов. Запросы, пришедшие почти одновременно, собираются в пакеты
+(до --batch-size состояний или --batch-wait-ms ожидания) — один пакет на одну
+задачу пула. Очередь ограничена: если она заполнена, сервис сразу отвечает
+503 с заголовком Retry-After, а не копит запросы в памяти.
+"""
+import asyncio
+import json
+import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import rubik_solver
+from rubik_cache import SolutionCache
+from rubik_cube import RubiksCube
+
+# Максимальный размер тела запроса, байт
+MAX_BODY = 1 << 20
+# Сколько последних задержек хранится для перцентилей в /metrics
+LATENCY_WINDOW = 4096
+# Допустимые max_length: более короткие решения двухфазный поиск может искать
+# очень долго, а ограничения длиннее 30 ходов ничего не ускоряют
+MIN_MAX_LENGTH = 19
+MAX_MAX_LENGTH = 30
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 422: 'Unprocessable Entity', 503: 'Service Unavailable'}
+
+
+class ServiceBusy(Exception):
+    """Очередь сервиса заполнена; запрос нужно повторить позже."""
+
+
+class _BadRequest(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _warm_worker():
+    # Первая задача рабочего процесса: подключение таблиц до прихода запросов
+    rubik_solver.get_tables()
+    return os.getpid()
+
+
+def _solve_batch(items, max_time=None):
+    """
+    Задача пула: [(facelets, max_length), ...] -> [результат, ...]. На каждое
+    состояние даётся не больше max_time секунд, иначе результат — ошибка.
+    """
+    results = []
+    for facelets, max_length in items:
+        cancel = None if max_time is None else rubik_solver.Deadline(max_time)
+        try:
+            solution = rubik_solver.solve_facelets(facelets, max_length, cancel=cancel)
+        except rubik_solver.SolveError as e:
+            results.append({'error': str(e)})
+        except rubik_solver.SolveCancelled:
+            results.append({'error': f"решение не найдено за {max_time} с"})
+        else:
+            results.append({'solution': ' '.join(solution), 'length': len(solution)})
+    return results
+
+
+def _request_facelets(item):
+    """Строка facelets из запроса {"facelets": ...} или {"state": ...}."""
+    if not isinstance(item, dict):
+        raise _BadRequest(400, "запрос должен быть JSON-объектом")
+    if 'facelets' in item:
+        facelets = item['facelets']
+        if not isinstance(facelets, str):
+            raise _BadRequest(400, "facelets должно быть строкой")
+        return facelets
+    if 'state' in item:
+        state = item['state']
+        if not isinstance(state, str):
+            raise _BadRequest(400, "state должно быть строкой")
+        return rubik_solver.cube_to_facelets(RubiksCube(state))
+    raise _BadRequest(400, "нужно поле facelets или state")
+
+
+def _check_max_length(max_length):
+    if not MIN_MAX_LENGTH <= max_length <= MAX_MAX_LENGTH:
+        raise ValueError(f"max_length должно быть от {MIN_MAX_LENGTH} до {MAX_MAX_LENGTH}")
+    return max_length
+
+
+class SolverService:
+    """
+    Пул процессов с тёплыми таблицами, очередь запросов и сборщик пакетов.
+    В пуле одновременно не больше 2 пакетов на процесс; пока пул занят,
+    запросы ждут в очереди (не длиннее queue_size), дальше — ServiceBusy.
+    Решение одного состояния в пуле ограничено max_time секундами (None — без
+    ограничения).
+    """
+
+    def __init__(self, workers=None, batch_size=32, batch_wait=0.002, queue_size=1024,
+                 max_length=22, cache_size=100000, max_time=2.0):
+        _check_max_length(max_length)
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_length = max_length
+        self.max_time = max_time
+        self.cache = SolutionCache(cache_size) if cache_size else None
+        self._queue = asyncio.Queue(queue_size)
+        self._slots = asyncio.Semaphore(2 * self.workers)
+        self._shared = None
+        self._pool = None
+        self._batcher = None
+        self._running = set()
+        self.started = time.time()
+        self.counters = dict.fromkeys(
+            ('requests', 'solved', 'errors', 'rejected', 'cache_hits', 'batches', 'batched_states'), 0)
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        # Таблицы загружаются (или строятся) один раз, до открытия сокета
+        await loop.run_in_executor(None, rubik_solver.get_tables)
+        self._shared = rubik_solver.share_tables()
+        self._pool = ProcessPoolExecutor(self.workers, initializer=rubik_solver.init_worker,
+                                         initargs=(self._shared.descriptor,))
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _warm_worker) for _ in range(self.workers)))
+        self._batcher = asyncio.create_task(self._collect())
+
+    async def close(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+        if self._shared is not None:
+            self._shared.close()
+
+    def check_capacity(self, count):
+        """ServiceBusy, если в очереди нет места для count состояний."""
+        if self._queue.maxsize and self._queue.qsize() + count > self._queue.maxsize:
+            self.counters['rejected'] += 1
+            raise ServiceBusy
+
+    async def solve(self, facelets, max_length=None):
+        """Результат {"solution", "length", "cached"} или {"error"} для одной строки facelets."""
+        max_length = self.max_length if max_length is None else _check_max_length(max_length)
+        start = time.perf_counter()
+        result = self._cached(facelets, max_length, start)
+        if result is not None:
+            return result
+        self.check_capacity(1)
+        return await self._wait(facelets, self._enqueue(facelets, max_length), start)
+
+    def _cached(self, facelets, max_length, start):
+        # Результат из кэша или None, если состояние нужно решать в пуле
+        if self.cache is None or len(facelets) != 54:
+            return None
+        solution = self.cache.get(facelets, max_length=max_length)
+        if solution is None:
+            return None
+        self.counters['cache_hits'] += 1
+        self.counters['solved'] += 1
+        self._latencies.append(time.perf_counter() - start)
+        return {'solution': ' '.join(solution), 'length': len(solution), 'cached': True}
+
+    def _enqueue(self, facelets, max_length):
+        # Место в очереди проверяется заранее (check_capacity)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((facelets, max_length, future))
+        return future
+
+    async def _wait(self, facelets, future, start):
+        result = await future
+        if 'solution' in result:
+            self.counters['solved'] += 1
+            if self.cache is not None:
+                self.cache.put(facelets, result['solution'].split())
+            result['cached'] = False
+        else:
+            self.counters['errors'] += 1
+        self._latencies.append(time.perf_counter() - start)
+        return result
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Пока пул занят, новые пакеты не собираются и очередь копится (до queue_size)
+            await self._slots.acquire()
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch):
+        try:
+            self.counters['batches'] += 1
+            self.counters['batched_states'] += len(batch)
+            items = [(facelets, max_length) for facelets, max_length, _ in batch]
+            try:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    self._pool, _solve_batch, items, self.max_time)
+            except Exception as e:
+                results = [{'error': f"{type(e).__name__}: {e}"}] * len(batch)
+            for (_, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(dict(result))
+        finally:
+            self._slots.release()
+
+    def health(self):
+        return {
+            'status': 'ok' if self._pool is not None else 'starting',
+            'workers': self.workers,
+            'queue': self._queue.qsize(),
+            'uptime_s': round(time.time() - self.started, 3),
+        }
+
+    def metrics(self):
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3)
+
+        batches = self.counters['batches']
+        return dict(
+            self.counters,
+            queue=self._queue.qsize(),
+            queue_limit=self._queue.maxsize,
+            batches_running=len(self._running),
+            mean_batch_size=round(self.counters['batched_states'] / batches, 2) if batches else None,
+            cache_size=len(self.cache) if self.cache is not None else None,
+            latency_p50_ms=percentile(0.5),
+            latency_p90_ms=percentile(0.9),
+            latency_p99_ms=percentile(0.99),
+            uptime_s=round(time.time() - self.started, 3),
+        )
+
+    async def handle_solve(self, body):
+        try:
+            data = json.loads(body or b'null')
+        except ValueError:
+            raise _BadRequest(400, "некорректный JSON")
+        batch = data.get('batch') if isinstance(data, dict) else None
+        items = batch if isinstance(batch, list) else [data]
+        start = time.perf_counter()
+        results = [None] * len(items)
+        misses = []
+        for i, item in enumerate(items):
+            # В пакете ошибка запроса относится только к своему элементу
+            try:
+                facelets, max_length = self._parse_item(item)
+            except _BadRequest as e:
+                if batch is None:
+                    raise
+                self.counters['errors'] += 1
+                results[i] = {'error': str(e)}
+                continue
+            results[i] = self._cached(facelets, max_length, start)
+            if results[i] is None:
+                misses.append((i, facelets, max_length))
+        # В очередь попадают только состояния, которых нет в кэше
+        self.check_capacity(len(misses))
+        futures = [(i, facelets, self._enqueue(facelets, max_length)) for i, facelets, max_length in misses]
+        for i, facelets, future in futures:
+            results[i] = await self._wait(facelets, future, start)
+        if batch is None:
+            result = results[0]
+            return (422 if 'error' in result else 200), result
+        return 200, {'results': results}
+
+    def _parse_item(self, item):
+        """(facelets, max_length) из элемента запроса; _BadRequest, если он некорректен."""
+        try:
+            facelets = _request_facelets(item)
+        except (rubik_solver.SolveError, ValueError) as e:
+            raise _BadRequest(422, str(e))
+        max_length = item.get('max_length', self.max_length)
+        if not isinstance(max_length, int) or isinstance(max_length, bool):
+            raise _BadRequest(400, "max_length должно быть целым числом")
+        try:
+            return facelets, _check_max_length(max_length)
+        except ValueError as e:
+            raise _BadRequest(400, str(e))
+
+    async def route(self, method, path, body):
+        path = path.split('?', 1)[0]
+        self.counters['requests'] += path == '/solve'
+        if path == '/solve':
+            if method != 'POST':
+                return 405, {'error': "нужен метод POST"}
+            try:
+                return await self.handle_solve(body)
+            except ServiceBusy:
+                return 503, {'error': "сервис перегружен, повторите запрос позже"}
+        if path in ('/health', '/metrics'):
+            if method != 'GET':
+                return 405, {'error': "нужен метод GET"}
+            return 200, self.health() if path == '/health' else self.metrics()
+        return 404, {'error': f"неизвестный путь {path}"}
+
+    async def handle_connection(self, reader, writer):
+        """Соединение HTTP/1.1 с keep-alive: запросы обрабатываются по очереди."""
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except _BadRequest as e:
+                    _write_response(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, version, headers, body = request
+                try:
+                    status, payload = await self.route(method, path, body)
+                except _BadRequest as e:
+                    status, payload = e.status, {'error': str(e)}
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+                _write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _read_request(reader):
+    """(метод, путь, версия, заголовки, тело) или None, если клиент закрыл соединение."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, version = line.decode('latin-1').split()
+    except ValueError:
+        raise _BadRequest(400, "некорректная строка запроса")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise _BadRequest(400, "некорректный Content-Length")
+    if length > MAX_BODY:
+        raise _BadRequest(413, "слишком большой запрос")
+    body = await reader.readexactly(length) if length else b''
+    return method, path, version, headers, body
+
+
+def _write_response(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+            "Content-Type: application/json; charset=utf-8",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    if status == 503:
+        head.append("Retry-After: 1")
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+
+
+async def serve(host='127.0.0.1', port=8765, unix=None, ready=None, **options):
+    """
+    Запускает сервис и работает до SIGINT/SIGTERM. options — параметры
+    SolverService. ready(service) вызывается, когда сокет открыт.
+    """
+    service = SolverService(**options)
+    await service.start()
+    if unix:
+        server = await asyncio.start_unix_server(service.handle_connection, unix)
+    else:
+        server = await asyncio.start_server(service.handle_connection, host, port)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError, ValueError):  # Windows или не главный поток
+            pass
+    if ready is not None:
+        ready(service)
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        await service.close()
+        if unix and os.path.exists(unix):
+            os.unlink(unix)
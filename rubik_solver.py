@@ -0,0 +1,729 @@
+"""
+Двухфазный алгоритм Кочембы.
+
+Фаза 1 переводит куб в подгруппу G1 = <U, D, R2, L2, F2, B2> (все ориентации
+нулевые, рёбра среднего слоя на своём слое), фаза 2 собирает куб ходами этой
+подгруппы. Обе фазы — поиск IDA* по координатам с таблицами переходов и
+таблицами обрезки (расстояний). Таблицы строятся с помощью NumPy один раз
+и сохраняются в кэш на диске (rubik_tables).
+
+Узлы раскрываются не по одному, а целыми уровнями поиска операциями NumPy.
+Фаза 2 идёт навстречу окрестности собранного состояния: все состояния G1 не
+дальше PHASE2_BALL_DEPTH ходов от него хранятся в таблицах с расстояниями.
+На равномерно случайных состояниях медиана решения — около 8,5 мс, среднее —
+около 15 мс, 90-й перцентиль — около 33 мс (python -m rubik_cube bench
+--only solve); время делится между фазами примерно поровну.
+"""
+import threading
+import time
+from itertools import combinations, permutations, product
+
+import numpy as np
+
+from rubik_cube import FACES, MOVE_INDEX, MOVES, MOVE_PERMUTATIONS
+from rubik_moves import invert, simplify
+from rubik_tables import SharedTables, attach_shared, load_tables
+
+# Угловые и рёберные кубики в нотации Кочембы
+CORNERS = ('URF', 'UFL', 'ULB', 'UBR', 'DFR', 'DLF', 'DBL', 'DRB')
+EDGES = ('UR', 'UF', 'UL', 'UB', 'DR', 'DF', 'DL', 'DB', 'FR', 'FL', 'BL', 'BR')
+
+# Номера клеток буфера RubiksCube, принадлежащих каждой позиции кубика.
+# Первой идёт клетка грани U/D (для рёбер среднего слоя — F/B).
+CORNER_FACELETS = (
+    (8, 9, 20), (6, 18, 38), (0, 36, 47), (2, 45, 11),
+    (29, 26, 15), (27, 44, 24), (33, 53, 42), (35, 17, 51),
+)
+EDGE_FACELETS = (
+    (5, 10), (7, 19), (3, 37), (1, 46), (32, 16), (28, 25),
+    (30, 43), (34, 52), (23, 12), (21, 41), (50, 39), (48, 14),
+)
+
+N_TWIST = 3 ** 7
+N_FLIP = 2 ** 11
+N_SLICE = 495
+N_SLICE_SORTED = N_SLICE * 24
+N_PERM8 = 40320
+# Версия набора таблиц в кэше; увеличивается при изменении определения координат
+# или состава таблиц (в версии 2 добавлена окрестность собранного состояния фазы 2)
+TABLES_VERSION = 2
+
+# Ходы подгруппы G1 (номера в MOVES): U, U2, U', R2, F2, D, D2, D', L2, B2
+PHASE2_MOVES = tuple(i for i, name in enumerate(MOVES) if name[0] in 'UD' or name[1:] == '2')
+
+
+# Как часто (в узлах) поиск вызывает progress
+CHECK_EVERY = 4096
+# Сколько узлов уровня фазы 1 раскрывается за раз (ограничивает память)
+PHASE1_CHUNK = 1 << 15
+# Все состояния фазы 2 не дальше этого числа ходов от собранного хранятся
+# с расстояниями: поиск фазы 2 останавливается на столько же ходов раньше.
+# Окрестность хранится в кэше таблиц: при изменении нужно увеличить TABLES_VERSION
+PHASE2_BALL_DEPTH = 8
+# Размер битового фильтра окрестности (log2 числа битов): отсеивает почти все
+# состояния вне окрестности до двоичного поиска по её ключам
+PHASE2_FILTER_BITS = 27
+
+
+class SolveError(ValueError):
+    """Состояние куба не может быть собрано."""
+
+
+class SolveCancelled(Exception):
+    """Поиск прерван по флагу отмены (cancel.set())."""
+
+
+class _SearchDone(Exception):
+    """Поиск с бюджетом закончен досрочно: истёк срок или короче решений искать негде."""
+
+
+class Deadline:
+    """
+    Флаг для параметра cancel, который считается установленным через seconds
+    секунд после создания или когда установлен cancel (threading.Event).
+    """
+
+    def __init__(self, seconds, cancel=None):
+        self.at = time.perf_counter() + seconds
+        self.cancel = cancel
+
+    def expired(self):
+        return time.perf_counter() >= self.at
+
+    def is_set(self):
+        return self.expired() or self.cancel is not None and self.cancel.is_set()
+
+
+# Виды ошибок раскраски в порядке проверки (для пакетной проверки — код i + 1)
+INVALID_CODES = ('length', 'centers', 'color_count', 'corner', 'edge', 'duplicate', 'twist', 'flip', 'parity')
+
+
+class InvalidStateError(SolveError):
+    """
+    Раскраска не соответствует ни одному состоянию куба. code — вид ошибки
+    из INVALID_CODES, piece — позиция кубика или грань (если применимо).
+    """
+
+    def __init__(self, code, message, piece=None):
+        super().__init__(message)
+        self.code = code
+        self.piece = piece
+
+
+def facelets_to_cubies(facelets):
+    """
+    Переводит строку из 54 букв граней (URFDLB) в кубиковое представление
+    (cp, co, ep, eo): перестановки и ориентации углов и рёбер.
+    """
+    if not isinstance(facelets, str) or len(facelets) != 54:
+        raise InvalidStateError('length', "состояние должно быть строкой из 54 букв граней")
+    if facelets[4::9] != ''.join(FACES):
+        raise InvalidStateError('centers', "центры граней должны идти в порядке URFDLB")
+    for face in FACES:
+        if facelets.count(face) != 9:
+            raise InvalidStateError('color_count', f"цвет грани {face} встречается "
+                                    f"{facelets.count(face)} раз вместо 9", face)
+    cp, co, ep, eo = [], [], [], []
+    for pos, cells in enumerate(CORNER_FACELETS):
+        for ori in range(3):
+            if facelets[cells[ori]] in 'UD':
+                break
+        else:
+            raise InvalidStateError('corner', f"у углового кубика {CORNERS[pos]} нет наклейки цвета U/D",
+                                    CORNERS[pos])
+        colors = facelets[cells[ori]] + facelets[cells[(ori + 1) % 3]] + facelets[cells[(ori + 2) % 3]]
+        for corner, name in enumerate(CORNERS):
+            if name == colors:
+                cp.append(corner)
+                co.append(ori)
+                break
+        else:
+            raise InvalidStateError('corner', f"недопустимые цвета углового кубика {CORNERS[pos]}",
+                                    CORNERS[pos])
+    for pos, (a, b) in enumerate(EDGE_FACELETS):
+        colors = facelets[a] + facelets[b]
+        for edge, name in enumerate(EDGES):
+            if name == colors:
+                ep.append(edge)
+                eo.append(0)
+                break
+            if name == colors[::-1]:
+                ep.append(edge)
+                eo.append(1)
+                break
+        else:
+            raise InvalidStateError('edge', f"недопустимые цвета рёберного кубика {EDGES[pos]}", EDGES[pos])
+    for pieces, names in ((cp, CORNERS), (ep, EDGES)):
+        seen = set()
+        for pos, piece in enumerate(pieces):
+            if piece in seen:
+                raise InvalidStateError('duplicate', f"кубик {names[piece]} встречается дважды "
+                                        f"(второй раз на месте {names[pos]})", names[piece])
+            seen.add(piece)
+    if sum(co) % 3:
+        raise InvalidStateError('twist', "повёрнут угловой кубик")
+    if sum(eo) % 2:
+        raise InvalidStateError('flip', "перевёрнут рёберный кубик")
+    if _parity(cp) != _parity(ep):
+        raise InvalidStateError('parity', "нарушена чётность перестановки (переставлены два кубика)")
+    return tuple(cp), tuple(co), tuple(ep), tuple(eo)
+
+
+def cube_to_facelets(cube):
+    """Строка из 54 букв граней (URFDLB) по цветам наклеек куба."""
+    face_of_color = {cube.faces[face][4]: face for face in FACES}
+    if len(face_of_color) != len(FACES):
+        raise InvalidStateError('centers', "центры двух граней одного цвета")
+    try:
+        return ''.join(face_of_color[chr(b)] for b in cube.state)
+    except KeyError:
+        raise InvalidStateError('color_count', "куб раскрашен не полностью") from None
+
+
+def check_facelets(facelets):
+    """Ошибка раскраски (InvalidStateError) или None, если состояние допустимо."""
+    try:
+        facelets_to_cubies(facelets)
+    except InvalidStateError as e:
+        return e
+    return None
+
+
+def _parity(perm):
+    return sum(perm[i] > perm[j] for i in range(len(perm)) for j in range(i + 1, len(perm))) % 2
+
+
+def _build_basic_moves():
+    # Кубиковое представление каждого из 18 ходов: результат хода из собранного состояния
+    solved = ''.join(face * 9 for face in FACES)
+    return tuple(facelets_to_cubies(''.join(solved[i] for i in perm)) for perm in MOVE_PERMUTATIONS)
+
+
+BASIC_MOVES = _build_basic_moves()
+# (A*M).cp[i] = A.cp[M.cp[i]] — применение хода к строкам перестановок (take_along_axis)
+_CP_MOVES = np.array([m[0] for m in BASIC_MOVES], dtype=np.intp)
+_EP_MOVES = np.array([m[2] for m in BASIC_MOVES], dtype=np.intp)
+
+
+def _allowed_moves(faces):
+    # allowed[последний ход, ход]: ход не по той же грани и не по противоположной
+    # в обратном порядке; последняя строка — для корня поиска
+    allowed = np.ones((len(faces) + 1, len(faces)), dtype=bool)
+    for last, last_face in enumerate(faces):
+        allowed[last] = [face != last_face and face != last_face - 3 for face in faces]
+    return allowed
+
+
+_ALLOWED1 = _allowed_moves([m // 3 for m in range(len(MOVES))])
+_ALLOWED2 = _allowed_moves([m // 3 for m in PHASE2_MOVES])
+# Ходы, выводящие из G1: только ими может заканчиваться решение фазы 1
+_LEAVE_G1 = np.array([m for m in range(len(MOVES)) if m not in PHASE2_MOVES])
+
+_PERM8 = np.array(list(permutations(range(8))), dtype=np.int8)
+_PERM8_RANK = {p: i for i, p in enumerate(permutations(range(8)))}
+# Сочетания позиций рёбер среднего слоя; собранному положению (8, 9, 10, 11) соответствует 0
+_SLICE_COMBOS = list(combinations(range(12), 4))[::-1]
+_SLICE_RANK = np.zeros(4096, dtype=np.int32)
+for _i, _combo in enumerate(_SLICE_COMBOS):
+    _SLICE_RANK[sum(1 << p for p in _combo)] = _i
+del _i, _combo
+
+
+def _rank_perm(perms):
+    """Лексикографический номер каждой строки-перестановки (векторно)."""
+    n = perms.shape[1]
+    ranks = np.zeros(len(perms), dtype=np.int64)
+    for i in range(n - 1):
+        smaller = (perms[:, i + 1:] < perms[:, i:i + 1]).sum(axis=1)
+        ranks = ranks * (n - i) + smaller
+    return ranks
+
+
+def _slice_sorted_coord(ep):
+    """Координата положения и порядка рёбер среднего слоя: 24 * сочетание + порядок."""
+    is_slice = ep >= 8
+    weights = 1 << np.arange(12)
+    combo = _SLICE_RANK[(is_slice * weights).sum(axis=1)]
+    order = ep[is_slice].reshape(-1, 4) - 8
+    return 24 * combo + _rank_perm(order)
+
+
+def _ori_coord(ori, base):
+    coord = np.zeros(len(ori), dtype=np.int64)
+    for i in range(ori.shape[1] - 1):
+        coord = coord * base + ori[:, i]
+    return coord
+
+
+def _all_orientations(n, base):
+    ori = np.array(list(product(range(base), repeat=n - 1)), dtype=np.int8)
+    last = (-ori.sum(axis=1)) % base
+    return np.hstack([ori, last[:, None]]).astype(np.int8)
+
+
+def _build_move_tables():
+    moves = range(len(MOVES))
+    cp_moves = np.array([m[0] for m in BASIC_MOVES])
+    co_moves = np.array([m[1] for m in BASIC_MOVES], dtype=np.int8)
+    ep_moves = np.array([m[2] for m in BASIC_MOVES])
+    eo_moves = np.array([m[3] for m in BASIC_MOVES], dtype=np.int8)
+
+    # Ориентации углов: (A*M).co[i] = A.co[M.cp[i]] + M.co[i]
+    co = _all_orientations(8, 3)
+    twist = np.stack([_ori_coord((co[:, cp_moves[m]] + co_moves[m]) % 3, 3) for m in moves], axis=1)
+    eo = _all_orientations(12, 2)
+    flip = np.stack([_ori_coord((eo[:, ep_moves[m]] + eo_moves[m]) % 2, 2) for m in moves], axis=1)
+
+    # Все расстановки рёбер среднего слоя; остальные рёбра заполняют свободные места по порядку
+    ep = np.empty((N_SLICE_SORTED, 12), dtype=np.int8)
+    row = 0
+    for combo in _SLICE_COMBOS:
+        rest = [p for p in range(12) if p not in combo]
+        for order in permutations(range(8, 12)):
+            ep[row, list(combo)] = order
+            ep[row, rest] = range(8)
+            row += 1
+    slice_sorted = np.empty((N_SLICE_SORTED, len(MOVES)), dtype=np.int64)
+    slice_sorted[_slice_sorted_coord(ep)] = np.stack(
+        [_slice_sorted_coord(ep[:, ep_moves[m]]) for m in moves], axis=1)
+    slice_ = slice_sorted[::24] // 24
+
+    # Перестановки углов и рёбер слоёв U/D нужны только в фазе 2
+    corners = np.stack([_rank_perm(_PERM8[:, cp_moves[m]]) for m in PHASE2_MOVES], axis=1)
+    ud_ep = np.hstack([_PERM8, np.tile(np.arange(8, 12, dtype=np.int8), (N_PERM8, 1))])
+    ud_edges = np.stack([_rank_perm(ud_ep[:, ep_moves[m]][:, :8]) for m in PHASE2_MOVES], axis=1)
+    slice24 = slice_sorted[:24, list(PHASE2_MOVES)]
+    return twist, flip, slice_, corners, ud_edges, slice24
+
+
+def _build_pruning_table(move_a, move_b):
+    """
+    Расстояния до собранного состояния для пары координат (a, b), индекс a * len(b) + b.
+    Обход в ширину выполняется сразу для всего фронта.
+    """
+    n_b = len(move_b)
+    table = np.full(len(move_a) * n_b, 255, dtype=np.uint8)
+    table[0] = 0
+    frontier = np.zeros(1, dtype=np.int64)
+    depth = 0
+    while frontier.size:
+        a, b = np.divmod(frontier, n_b)
+        reached = []
+        for m in range(move_a.shape[1]):
+            idx = move_a[a, m] * n_b + move_b[b, m]
+            idx = idx[table[idx] == 255]
+            table[idx] = depth + 1
+            reached.append(idx)
+        frontier = np.unique(np.concatenate(reached))
+        depth += 1
+    return table
+
+
+def _phase2_key(corner, edges, sl):
+    return (corner.astype(np.int64) * N_PERM8 + edges) * 24 + sl
+
+
+def _build_phase2_ball(corners_move, ud_edges_move, slice24_move, depth):
+    """
+    Состояния фазы 2 не дальше depth ходов от собранного (обход в ширину):
+    отсортированные ключи _phase2_key, расстояния и номер хода фазы 2,
+    приближающего состояние к собранному.
+    """
+    inverse = [PHASE2_MOVES.index(MOVE_INDEX[invert([MOVES[m]])[0]]) for m in PHASE2_MOVES]
+    corner = edges = sl = np.zeros(1, dtype=np.int32)
+    keys, dists, steps = [_phase2_key(corner, edges, sl)], [np.zeros(1, dtype=np.uint8)], [np.zeros(1, dtype=np.int8)]
+    seen = keys[0]
+    for dist in range(1, depth + 1):
+        corner, edges, sl = corners_move[corner].ravel(), ud_edges_move[edges].ravel(), slice24_move[sl].ravel()
+        key, first = np.unique(_phase2_key(corner, edges, sl), return_index=True)
+        new = ~np.isin(key, seen, assume_unique=True)
+        key, first = key[new], first[new]
+        corner, edges, sl = corner[first], edges[first], sl[first]
+        seen = np.union1d(seen, key)
+        keys.append(key)
+        dists.append(np.full(len(key), dist, dtype=np.uint8))
+        # Состояние получено ходом first % 10 из предыдущего уровня; обратный ход ведёт назад
+        steps.append(np.array(inverse, dtype=np.int8)[first % len(PHASE2_MOVES)])
+    keys = np.concatenate(keys)
+    order = np.argsort(keys)
+    return keys[order], np.concatenate(dists)[order], np.concatenate(steps)[order]
+
+
+def _filter_bit(key):
+    # Номер бита фильтра окрестности для ключа _phase2_key (мультипликативное хеширование)
+    return (key.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(64 - PHASE2_FILTER_BITS)
+
+
+def _build_phase2_filter(keys):
+    bits = np.zeros(1 << PHASE2_FILTER_BITS, dtype=bool)
+    bits[_filter_bit(keys)] = True
+    return np.packbits(bits, bitorder='little')
+
+
+def _build_tables():
+    twist, flip, slice_, corners, ud_edges, slice24 = _build_move_tables()
+    ball_keys, ball_dist, ball_step = _build_phase2_ball(corners, ud_edges, slice24, PHASE2_BALL_DEPTH)
+    return {
+        'twist_move': twist.astype(np.uint16),
+        'flip_move': flip.astype(np.uint16),
+        'slice_move': slice_.astype(np.uint16),
+        'corners_move': corners.astype(np.uint16),
+        'ud_edges_move': ud_edges.astype(np.uint16),
+        'slice24_move': slice24.astype(np.uint8),
+        'slice_twist_prune': _build_pruning_table(slice_, twist),
+        'slice_flip_prune': _build_pruning_table(slice_, flip),
+        'twist_flip_prune': _build_pruning_table(twist, flip),
+        'corners_slice_prune': _build_pruning_table(corners, slice24),
+        'edges_slice_prune': _build_pruning_table(ud_edges, slice24),
+        'phase2_ball_keys': ball_keys,
+        'phase2_ball_dist': ball_dist,
+        'phase2_ball_step': ball_step,
+        'phase2_ball_filter': _build_phase2_filter(ball_keys),
+    }
+
+
+class SolverTables:
+    """
+    Таблицы в виде, удобном для векторного поиска: таблицы переходов —
+    массивы (координата, ход) int32, таблицы обрезки — плоские массивы uint8
+    поверх исходных (в памяти, отображённых из кэша или в разделяемой памяти)
+    без копирования (как и окрестность собранного состояния фазы 2).
+    """
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        for name, array in arrays.items():
+            if name.endswith('_move'):
+                setattr(self, name, np.array(array, dtype=np.int32))
+            else:
+                # Обычный ndarray: индексация np.memmap заметно медленнее
+                setattr(self, name, array.view(np.ndarray).ravel())
+
+
+_tables = None
+_load_lock = threading.Lock()
+
+
+def get_tables():
+    """Таблицы решателя; при первом обращении загружаются из кэша или строятся."""
+    global _tables
+    if _tables is None:
+        # Таблицы могут запросить сразу несколько потоков (например, фоновая загрузка в GUI)
+        with _load_lock:
+            if _tables is None:
+                _tables = SolverTables(load_tables('kociemba', TABLES_VERSION, _build_tables))
+    return _tables
+
+
+def share_tables():
+    """
+    Публикует таблицы решателя в разделяемой памяти для пула процессов:
+
+        with share_tables() as shared, ProcessPoolExecutor(
+                initializer=init_worker, initargs=(shared.descriptor,)) as pool:
+            solutions = pool.map(solve_facelets, states)
+    """
+    return SharedTables(get_tables().arrays)
+
+
+def init_worker(descriptor):
+    """Инициализатор рабочего процесса: подключает опубликованные таблицы без копирования."""
+    global _tables
+    _tables = SolverTables(attach_shared(descriptor))
+
+
+def _twist(co):
+    coord = 0
+    for c in co[:7]:
+        coord = 3 * coord + c
+    return coord
+
+
+def _flip(eo):
+    coord = 0
+    for e in eo[:11]:
+        coord = 2 * coord + e
+    return coord
+
+
+def _slice(ep):
+    return int(_SLICE_RANK[sum(1 << i for i, e in enumerate(ep) if e >= 8)])
+
+
+def solve_cubies(cubies, max_length=22, progress=None, cancel=None, stats=None, max_time=None,
+                 on_solution=None):
+    """
+    Ищет решение длиной не более max_length ходов для кубикового состояния.
+    Возвращает список номеров ходов (индексы в MOVES) или None.
+    progress(depth, nodes) вызывается при переходе к новой глубине фазы 1 и
+    каждые CHECK_EVERY узлов; если cancel (threading.Event или аналог)
+    установлен, выбрасывается SolveCancelled. stats (rubik_stats.SolveStats)
+    получает время загрузки таблиц и фаз, узлы по глубинам фазы 1 и число
+    обращений к таблицам обрезки.
+
+    Поиск идёт не по узлу, а по уровню: все узлы одной глубины раскрываются
+    сразу операциями NumPy над таблицами переходов (см. _search_phase1 и
+    _search_phase2). Фаза 1 отдаёт решения пачками; фаза 2 запускается для
+    решений пачки по очереди, начиная с самой короткой оценки её длины.
+
+    С max_time (секунды от вызова) поиск не останавливается на первом решении,
+    а продолжает перебор фазы 1, ища решения короче лучшего найденного, пока
+    не истечёт срок (float('inf') — пока не будет исчерпан перебор или не
+    установлен cancel); возвращается лучшее решение. До первого решения срок
+    не действует — оно обычно находится за миллисекунды. on_solution(решение)
+    вызывается для каждого найденного решения, начиная с первого.
+    """
+    started = time.perf_counter()
+    deadline = None if max_time is None else started + max_time
+    t = get_tables()
+    if stats is not None:
+        stats.add_time('tables', time.perf_counter() - started)
+    cp, co, ep, eo = cubies
+    nodes = 0
+    next_check = CHECK_EVERY
+    phase2_nodes = 0
+    phase2_time = 0.0
+    # Лучшее найденное решение и ограничение длины для следующих (в поиске со сроком)
+    best = None
+    length_limit = max_length
+    checking = progress is not None or cancel is not None
+
+    def checkpoint():
+        if progress is not None:
+            progress(depth1, nodes)
+        if cancel is not None and cancel.is_set():
+            raise SolveCancelled
+
+    def expanded(phase, count, lookups):
+        # Учёт раскрытого уровня поиска; между уровнями проверяются срок и отмена
+        nonlocal nodes, next_check
+        nodes += count
+        if stats is not None:
+            stats.sample(phase, lookups, count)
+        if deadline is not None and best is not None and time.perf_counter() >= deadline:
+            raise _SearchDone
+        if nodes >= next_check:
+            next_check = nodes + CHECK_EVERY
+            if checking:
+                checkpoint()
+        elif cancel is not None and cancel.is_set():
+            raise SolveCancelled
+
+    def improve(solution, depth1):
+        # Найдено решение короче лучшего: запоминаем его и ищем дальше только более короткие
+        nonlocal best, length_limit
+        best = solution
+        length_limit = len(best) - 1
+        if stats is not None:
+            stats.improvement(len(best))
+        if on_solution is not None:
+            on_solution(list(best))
+        if length_limit < depth1 or time.perf_counter() >= deadline:
+            raise _SearchDone
+
+    tw, fl, sl = _twist(co), _flip(eo), _slice(ep)
+    depth1 = int(max(t.slice_twist_prune[sl * N_TWIST + tw], t.slice_flip_prune[sl * N_FLIP + fl],
+                     t.twist_flip_prune[tw * N_FLIP + fl]))
+    root = tuple(np.array([x]) for x in (tw, fl, sl, len(MOVES)))
+    started = time.perf_counter()
+    before = nodes
+    try:
+        while depth1 <= length_limit:
+            if checking:
+                checkpoint()
+            for paths, starts in _phase1_solutions(t, cp, ep, root, depth1, expanded):
+                if length_limit < depth1:
+                    break
+                phase2_started, phase2_before = time.perf_counter(), nodes
+                try:
+                    found = None
+                    # Фаза 2 запускается, только если оценка её длины укладывается в ограничение;
+                    # первыми — пути с самой короткой оценкой
+                    rows = np.flatnonzero(starts[3] <= length_limit - depth1)
+                    for row in rows[np.argsort(starts[3][rows], kind='stable')]:
+                        found = _search_phase2(t, starts[0][row], starts[1][row], starts[2][row],
+                                               length_limit - depth1, expanded)
+                        if found is not None:
+                            break
+                finally:
+                    phase2_nodes += nodes - phase2_before
+                    phase2_time += time.perf_counter() - phase2_started
+                if found is None:
+                    continue
+                raw = [MOVES[m] for m in paths[row]] + [MOVES[m] for m in found]
+                solution = [MOVE_INDEX[m] for m in simplify(raw)]
+                if deadline is not None:
+                    improve(solution, depth1)
+                    continue
+                if stats is not None:
+                    stats.improvement(len(solution))
+                if on_solution is not None:
+                    on_solution(list(solution))
+                return solution
+            if stats is not None:
+                stats.nodes_by_depth[depth1] = nodes - before
+            before = nodes
+            depth1 += 1
+        return best
+    except _SearchDone:
+        return best
+    finally:
+        if stats is not None:
+            if nodes > before:
+                stats.nodes_by_depth[depth1] = nodes - before
+            # Узлы и время фазы 2 входят в итерации фазы 1, их вычитаем
+            stats.nodes += nodes
+            stats.phase_nodes['phase1'] = stats.phase_nodes.get('phase1', 0) + nodes - phase2_nodes
+            stats.phase_nodes['phase2'] = stats.phase_nodes.get('phase2', 0) + phase2_nodes
+            stats.add_time('phase1', time.perf_counter() - started - phase2_time)
+            stats.add_time('phase2', phase2_time)
+
+
+def _phase1_solutions(t, cp, ep, root, depth1, expanded):
+    """
+    Пачки решений фазы 1 длины depth1 вместе с начальными координатами фазы 2:
+    (пути, (углы, рёбра U/D, рёбра среднего слоя, оценка длины фазы 2)).
+    """
+    for paths in _search_phase1(t, *root, depth1, [], expanded):
+        # Применяем решения фазы 1 к перестановкам кубиков
+        perm_c = np.tile(np.array(cp, dtype=np.intp), (len(paths), 1))
+        perm_e = np.tile(np.array(ep, dtype=np.intp), (len(paths), 1))
+        for step in paths.T:
+            perm_c = np.take_along_axis(perm_c, _CP_MOVES[step], axis=1)
+            perm_e = np.take_along_axis(perm_e, _EP_MOVES[step], axis=1)
+        corner, edges, sl = _rank_perm(perm_c), _rank_perm(perm_e[:, :8]), _rank_perm(perm_e[:, 8:] - 8)
+        bound = np.maximum(t.corners_slice_prune[corner * 24 + sl], t.edges_slice_prune[edges * 24 + sl])
+        yield paths, (corner, edges, sl, bound)
+
+
+def _search_phase1(t, tw, fl, sl, last, togo, history, expanded):
+    """
+    Решения фазы 1 ровно из togo ходов от узлов (tw, fl, sl) с последними
+    ходами last: генератор пачек путей (K, длина) номеров ходов. history —
+    (номер родителя, ход) для каждого уровня выше. Уровень раскрывается
+    целиком; если он больше PHASE1_CHUNK узлов, дальше он идёт по частям.
+    """
+    if togo == 0:
+        yield _paths(history, np.arange(len(tw)))
+        return
+    twist, flip, slice_ = t.twist_move[tw], t.flip_move[fl], t.slice_move[sl]
+    allowed = _ALLOWED1[last]
+    if togo == 1:
+        # Последний ход фазы 1 не должен принадлежать G1, иначе решение фазы 1 было бы короче
+        twist, flip, slice_, allowed = twist[:, _LEAVE_G1], flip[:, _LEAVE_G1], slice_[:, _LEAVE_G1], allowed[:, _LEAVE_G1]
+    # Обрезка по двум небольшим таблицам проверяется для всего уровня сразу,
+    # по большой таблице twist × flip — только для прошедших
+    parent, move = np.nonzero(allowed & (t.slice_twist_prune[slice_ * N_TWIST + twist] < togo)
+                              & (t.slice_flip_prune[slice_ * N_FLIP + flip] < togo))
+    twist, flip, slice_ = twist[parent, move], flip[parent, move], slice_[parent, move]
+    keep = np.flatnonzero(t.twist_flip_prune[twist * N_FLIP + flip] < togo)
+    expanded('phase1', len(tw), 2 * allowed.size + len(parent))
+    if togo == 1:
+        move = _LEAVE_G1[move]
+    parent, move, twist, flip, slice_ = parent[keep], move[keep], twist[keep], flip[keep], slice_[keep]
+    for start in range(0, len(parent), PHASE1_CHUNK):
+        part = slice(start, start + PHASE1_CHUNK)
+        yield from _search_phase1(t, twist[part], flip[part], slice_[part], move[part], togo - 1,
+                                  history + [(parent[part], move[part])], expanded)
+
+
+def _paths(history, rows):
+    """Пути (len(rows), len(history)) от корня до узлов rows последнего уровня."""
+    paths = np.empty((len(rows), len(history)), dtype=np.intp)
+    for level in range(len(history) - 1, -1, -1):
+        parent, move = history[level]
+        paths[:, level] = move[rows]
+        rows = parent[rows]
+    return paths
+
+
+def _search_phase2(t, corner, edges, sl, limit, expanded):
+    """
+    Самое короткое (не длиннее limit ходов) решение фазы 2 из координат
+    (corner, edges, sl): список номеров ходов или None. Поиск в ширину с
+    отсечением по таблицам обрезки идёт навстречу окрестности собранного
+    состояния (PHASE2_BALL_DEPTH ходов), поэтому на столько же уровней
+    короче.
+    """
+    corner, edges, sl = np.array([corner]), np.array([edges]), np.array([sl])
+    # Первый ход фазы 2 может совпасть по грани с последним ходом фазы 1,
+    # такие ходы склеиваются при упрощении (rubik_moves.simplify)
+    last = np.array([len(PHASE2_MOVES)])
+    history = []
+    best = None
+    # В окрестности могут быть только узлы с оценкой не больше её радиуса
+    near = np.array([0])
+    for level in range(max(limit - PHASE2_BALL_DEPTH, 0) + 1):
+        key = _phase2_key(corner[near], edges[near], sl[near])
+        bit = _filter_bit(key)
+        maybe = (t.phase2_ball_filter[bit >> np.uint64(3)] >> (bit & np.uint64(7)).astype(np.uint8)) & 1 == 1
+        near, key = near[maybe], key[maybe]
+        pos = np.searchsorted(t.phase2_ball_keys, key)
+        pos[pos == len(t.phase2_ball_keys)] = 0
+        hits = np.flatnonzero(t.phase2_ball_keys[pos] == key)
+        if len(hits):
+            hit = hits[np.argmin(t.phase2_ball_dist[pos[hits]])]
+            row = near[hit]
+            length = level + int(t.phase2_ball_dist[pos[hit]])
+            if length <= limit and (best is None or length < best[0]):
+                best = length, _phase2_path(t, history, row, corner[row], edges[row], sl[row])
+        # Решения длиннее level + PHASE2_BALL_DEPTH найдутся не раньше следующего уровня
+        if best is not None and best[0] <= level + PHASE2_BALL_DEPTH + 1:
+            break
+        togo = limit - level
+        if togo == 0 or not len(corner):
+            break
+        corners, edge, slices = t.corners_move[corner], t.ud_edges_move[edges], t.slice24_move[sl]
+        allowed = _ALLOWED2[last]
+        bound = np.maximum(t.corners_slice_prune[corners * 24 + slices], t.edges_slice_prune[edge * 24 + slices])
+        parent, last = np.nonzero(allowed & (bound < togo))
+        corner, edges, sl = corners[parent, last], edge[parent, last], slices[parent, last]
+        near = np.flatnonzero(bound[parent, last] <= PHASE2_BALL_DEPTH)
+        expanded('phase2', len(allowed), 2 * allowed.size)
+        history.append((parent, last))
+    return None if best is None else best[1]
+
+
+def _phase2_path(t, history, row, corner, edges, sl):
+    # Ходы фазы 2 до узла row последнего уровня и дальше по окрестности до собранного состояния
+    moves = []
+    for parent, move in reversed(history):
+        moves.append(PHASE2_MOVES[move[row]])
+        row = parent[row]
+    moves.reverse()
+    key = _phase2_key(np.array([corner]), edges, sl)
+    while key[0]:
+        i = np.searchsorted(t.phase2_ball_keys, key)[0]
+        step = int(t.phase2_ball_step[i])
+        moves.append(PHASE2_MOVES[step])
+        corner = t.corners_move[corner, step]
+        edges, sl = t.ud_edges_move[edges, step], t.slice24_move[sl, step]
+        key = _phase2_key(np.array([corner]), edges, sl)
+    return moves
+
+
+def solve(cube, max_length=22, progress=None, cancel=None, stats=None, max_time=None, on_solution=None):
+    """
+    Решает куб RubiksCube (не изменяя его) и возвращает список ходов
+    в нотации HTM, например ["R", "U2", "F'"]. max_time и on_solution — как
+    в solve_cubies, но on_solution получает список ходов HTM.
+    """
+    return solve_facelets(cube_to_facelets(cube), max_length, progress, cancel, stats, max_time, on_solution)
+
+
+def solve_facelets(facelets, max_length=22, progress=None, cancel=None, stats=None, max_time=None,
+                   on_solution=None):
+    """Решение для строки из 54 букв граней (URFDLB); удобно для пула процессов."""
+    started = time.perf_counter()
+    cubies = facelets_to_cubies(facelets)
+    if stats is not None:
+        stats.add_time('parse', time.perf_counter() - started)
+
+    def _report(solution):
+        on_solution([MOVES[m] for m in solution])
+
+    report = _report if on_solution is not None else None
+    solution = solve_cubies(cubies, max_length, progress, cancel, stats, max_time, report)
+    if solution is None:
+        raise SolveError(f"решение длиной не более {max_length} ходов не найдено")
+    return [MOVES[m] for m in solution]
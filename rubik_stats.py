@@ -0,0 +1,158 @@
+"""
+Статистика решений: время по этапам, узлы поиска по глубинам, обращения
+к таблицам обрезки, попадания в кэш решений и пиковая память процесса.
+
+Решатели заполняют переданный им SolveStats, не замедляя поиск: узлы и так
+считаются, узлы по глубинам — это разность счётчика между итерациями IDA*,
+а число обращений к таблицам обрезки оценивается по выборке: у каждого
+SAMPLE_EVERY-го узла проверки потомков повторяются с подсчётом, и среднее
+умножается на число узлов.
+
+Готовая статистика передаётся наблюдателям (add_observer), например
+JsonLinesLogger, который пишет в поток строки JSON для части решений.
+"""
+import json
+import random
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Как часто (в узлах) поиск учитывает узел в выборке; делитель CHECK_EVERY
+SAMPLE_EVERY = 256
+
+
+def peak_memory_kb():
+    """Пиковый объём резидентной памяти процесса в КБ (None, если недоступно)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В macOS ru_maxrss в байтах, в Linux — в килобайтах
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+class SolveStats:
+    """
+    Статистика одного решения. phases — время этапов в секундах
+    ('cache', 'parse', 'tables', 'phase1', 'phase2' или 'search', 'total'),
+    nodes_by_depth — узлы, раскрытые на каждой итерации IDA* (по глубине фазы 1
+    вместе с запущенными из неё поисками фазы 2 или по границе оптимального
+    поиска), phase_nodes — узлы по фазам поиска.
+    """
+
+    def __init__(self, solver='kociemba'):
+        self.solver = solver
+        self.phases = {}
+        self.nodes = 0
+        self.nodes_by_depth = {}
+        self.phase_nodes = {}
+        self.sampled = {}  # фаза -> [узлов в выборке, обращений к таблицам у их потомков]
+        self.improvements = []  # [мс от начала, длина] для каждого найденного решения
+        self.cache = None  # 'hit', 'miss' или None (без кэша)
+        self.length = None
+        self.error = None
+        self.peak_memory_kb = None
+        self._start = time.perf_counter()
+
+    def add_time(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def sample(self, phase, lookups, nodes=1):
+        """
+        Учитывает nodes узлов выборки: lookups обращений к таблицам обрезки при
+        проверке их потомков (векторный поиск передаёт сразу весь уровень).
+        """
+        entry = self.sampled.setdefault(phase, [0, 0])
+        entry[0] += nodes
+        entry[1] += lookups
+
+    @property
+    def prune_lookups(self):
+        """Оценка числа обращений к таблицам обрезки (None, если в выборку не попал ни один узел)."""
+        total = None
+        for phase, (count, lookups) in self.sampled.items():
+            if count:
+                total = (total or 0) + round(self.phase_nodes.get(phase, 0) * lookups / count)
+        return total
+
+    def improvement(self, length):
+        """Отмечает найденное решение длины length (в поиске со сроком — каждое улучшение)."""
+        self.improvements.append([round((time.perf_counter() - self._start) * 1000, 3), length])
+
+    def finish(self, length=None, error=None):
+        """Завершает замер: длина решения или текст ошибки, общее время и пиковая память."""
+        self.length = length
+        self.error = error
+        self.phases['total'] = time.perf_counter() - self._start
+        self.peak_memory_kb = peak_memory_kb()
+
+    def as_dict(self):
+        return {
+            'solver': self.solver,
+            'length': self.length,
+            'error': self.error,
+            'cache': self.cache,
+            'phases_ms': {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()},
+            'nodes': self.nodes,
+            'phase_nodes': dict(self.phase_nodes),
+            'nodes_by_depth': {str(depth): n for depth, n in sorted(self.nodes_by_depth.items())},
+            'prune_lookups': self.prune_lookups,
+            'improvements': [list(item) for item in self.improvements],
+            'peak_memory_kb': self.peak_memory_kb,
+        }
+
+
+_observers = []
+
+
+def add_observer(callback):
+    """callback(stats) вызывается после каждого решения через RubiksCube.solve."""
+    _observers.append(callback)
+
+
+def remove_observer(callback):
+    _observers.remove(callback)
+
+
+def observed():
+    return bool(_observers)
+
+
+def emit(stats):
+    for callback in list(_observers):
+        callback(stats)
+
+
+class JsonLinesLogger:
+    """
+    Наблюдатель, который пишет статистику строкой JSON в stream. Записывается
+    доля sample решений (случайная выборка), а также все решения с ошибкой и
+    решения дольше slow_ms миллисекунд. Принимает SolveStats или готовый
+    словарь as_dict() (например, из рабочего процесса); extra — поля,
+    добавляемые к каждой записи.
+    """
+
+    def __init__(self, stream, sample=1.0, slow_ms=None, seed=None):
+        self.stream = stream
+        self.sample = sample
+        self.slow_ms = slow_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, stats, **extra):
+        record = stats.as_dict() if isinstance(stats, SolveStats) else dict(stats)
+        total = record['phases_ms'].get('total', 0.0)
+        keep = (record['error'] is not None
+                or self.slow_ms is not None and total >= self.slow_ms
+                or self._random.random() < self.sample)
+        if not keep:
+            return
+        record.update(extra)
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
@@ -0,0 +1,229 @@
+"""
+Хранилище таблиц решателей на диске.
+
+Таблицы строятся один раз и записываются в двоичный файл:
+
+    заголовок   <8sIIII: сигнатура, версия формата, версия набора таблиц,
+                длина каталога, CRC32 каталога
+    каталог     JSON: имя, dtype, форма, смещение от начала данных и CRC32
+                каждой таблицы
+    данные      начинаются и для каждой таблицы выровнены по границе
+                страницы (4096 байт)
+
+При загрузке файл отображается в память (numpy.memmap), поэтому страницы
+читаются с диска только при первом обращении, а несколько процессов на одной
+машине используют общий страничный кэш.
+
+Для пулов процессов набор таблиц можно один раз опубликовать в
+multiprocessing.shared_memory (SharedTables) и подключать в рабочих процессах
+без копирования (attach_shared).
+"""
+import json
+import os
+import struct
+import tempfile
+import zlib
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+MAGIC = b'RUBIKTBL'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<8sIIII')
+_ALIGN = 4096
+
+
+class TableStoreError(Exception):
+    """Файл таблиц отсутствует, повреждён или относится к другой версии."""
+
+
+def default_directory():
+    """Каталог кэша: $RUBIK_TABLES_DIR или ~/.cache/rubiks_solver."""
+    return os.environ.get('RUBIK_TABLES_DIR') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'rubiks_solver')
+
+
+def table_path(name, version, directory=None):
+    return os.path.join(directory or default_directory(), f"{name}-v{version}.tbl")
+
+
+def _align(offset):
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def write_tables(path, version, tables):
+    """
+    Записывает словарь {имя: numpy-массив} в файл path. Запись идёт во временный
+    файл, который затем атомарно переименовывается.
+    """
+    entries = []
+    # Смещения считаются от начала области данных, которая идёт сразу после
+    # каталога (с выравниванием по странице)
+    offset = 0
+    for name, array in tables.items():
+        array = np.ascontiguousarray(array)
+        entries.append({
+            'name': name, 'dtype': array.dtype.str, 'shape': list(array.shape),
+            'offset': offset, 'crc32': zlib.crc32(array),
+        })
+        offset = _align(offset + array.nbytes)
+    directory = json.dumps(entries).encode('utf-8')
+    data_start = _align(_HEADER.size + len(directory))
+
+    folder = os.path.dirname(path) or '.'
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, version, len(directory), zlib.crc32(directory)))
+            f.write(directory)
+            for entry, array in zip(entries, tables.values()):
+                f.seek(data_start + entry['offset'])
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.truncate(data_start + offset)
+        # Файл кэша могут читать и процессы других пользователей
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def read_tables(path, version, verify=False):
+    """
+    Отображает файл таблиц в память и возвращает словарь {имя: numpy-массив}.
+    Заголовок проверяется всегда; verify=True дополнительно сверяет CRC32 данных
+    (при этом читаются все страницы файла).
+    """
+    try:
+        with open(path, 'rb') as f:
+            magic, fmt, file_version, dir_len, dir_crc = _HEADER.unpack(f.read(_HEADER.size))
+            directory = f.read(dir_len)
+    except (OSError, struct.error) as e:
+        raise TableStoreError(f"не удалось прочитать {path}: {e}") from None
+    if magic != MAGIC or fmt != FORMAT_VERSION:
+        raise TableStoreError(f"{path}: неизвестный формат файла")
+    if file_version != version:
+        raise TableStoreError(f"{path}: версия таблиц {file_version}, ожидалась {version}")
+    if zlib.crc32(directory) != dir_crc:
+        raise TableStoreError(f"{path}: повреждён каталог таблиц")
+
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    data_start = _align(_HEADER.size + dir_len)
+    tables = {}
+    for entry in json.loads(directory):
+        dtype = np.dtype(entry['dtype'])
+        count = int(np.prod(entry['shape'], dtype=np.int64))
+        start = data_start + entry['offset']
+        end = start + count * dtype.itemsize
+        if end > len(data):
+            raise TableStoreError(f"{path}: файл обрезан")
+        array = data[start:end].view(dtype).reshape(entry['shape'])
+        if verify and zlib.crc32(array) != entry['crc32']:
+            raise TableStoreError(f"{path}: не совпадает контрольная сумма таблицы {entry['name']}")
+        tables[entry['name']] = array
+    return tables
+
+
+def load_tables(name, version, build, directory=None, verify=False):
+    """
+    Загружает набор таблиц name из кэша. Если файла нет или он не подходит,
+    вызывает build() -> {имя: массив}, сохраняет результат и загружает его
+    уже через отображение в память.
+    """
+    path = table_path(name, version, directory)
+    try:
+        return read_tables(path, version, verify)
+    except TableStoreError:
+        pass
+    tables = build()
+    try:
+        write_tables(path, version, tables)
+    except OSError:
+        # Кэш недоступен для записи — работаем с таблицами в памяти
+        return tables
+    del tables
+    return read_tables(path, version, verify=True)
+
+
+class SharedTables:
+    """
+    Набор таблиц, скопированный в один блок multiprocessing.shared_memory.
+    descriptor — небольшой кортеж (имя блока и расположение таблиц), который
+    передаётся рабочим процессам; они подключаются к блоку через attach_shared().
+    Блок освобождается методом close() или при выходе из блока with.
+    """
+
+    def __init__(self, tables):
+        layout = []
+        offset = 0
+        for name, array in tables.items():
+            layout.append((name, array.dtype.str, tuple(array.shape), offset))
+            offset = _align(offset + array.nbytes)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for (name, dtype, shape, start), array in zip(layout, tables.values()):
+            np.ndarray(shape, dtype, buffer=self._shm.buf, offset=start)[...] = array
+        self.descriptor = (self._shm.name, tuple(layout))
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Подключённые блоки разделяемой памяти должны жить, пока живут массивы над ними
+_attached = {}
+
+
+def _attach_untracked(name):
+    # До Python 3.13 SharedMemory(name=...) регистрирует блок в трекере ресурсов,
+    # и трекер процесса со своим трекером удалил бы блок при выходе. Снимать
+    # регистрацию после подключения нельзя: рабочие процессы пула делят трекер
+    # с владельцем, и снялась бы регистрация владельца. Поэтому регистрация
+    # при подключении пропускается, как с track=False
+    register = resource_tracker.register
+
+    def skip_shared_memory(resource, rtype):
+        if rtype != 'shared_memory':
+            register(resource, rtype)
+
+    resource_tracker.register = skip_shared_memory
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def attach_shared(descriptor):
+    """Словарь {имя: numpy-массив} поверх опубликованного блока, без копирования."""
+    name, layout = descriptor
+    shm = _attached.get(name)
+    if shm is None:
+        try:
+            # Блоком владеет опубликовавший процесс, рабочий не должен его удалять
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:  # Python < 3.13
+            shm = _attach_untracked(name)
+        _attached[name] = shm
+    return {table: np.ndarray(shape, dtype, buffer=shm.buf, offset=start)
+            for table, dtype, shape, start in layout}
+
+
+if __name__ == '__main__':
+    # Предварительное построение всех таблиц: python rubik_tables.py
+    import time
+
+    import rubik_optimal
+    import rubik_solver
+
+    for name, version, get in (('kociemba', rubik_solver.TABLES_VERSION, rubik_solver.get_tables),
+                               ('optimal', rubik_optimal.TABLES_VERSION, rubik_optimal.get_databases)):
+        start = time.perf_counter()
+        get()
+        path = table_path(name, version)
+        print(f"{path}: {os.path.getsize(path) / 2 ** 20:.1f} МБ, {time.perf_counter() - start:.2f} с")
@@ -0,0 +1,244 @@
+"""
+Запись анимации сборки без накопления кадров в памяти.
+
+Кадры (массивы (H, W, 3) uint8) передаются в BackgroundWriter, который через
+ограниченную очередь отдаёт их приёмнику в отдельном потоке, поэтому запись
+не задерживает интерфейс. Приёмник — FrameSpool (сырые кадры во временном
+файле на диске) или кодировщик из open_writer() (GIF или MP4).
+"""
+import io
+import os
+import queue
+import struct
+import tempfile
+import threading
+
+import numpy as np
+
+# Форматы, которые пишутся через ffmpeg (нужен пакет imageio-ffmpeg)
+VIDEO_EXTENSIONS = ('.mp4', '.m4v', '.mkv', '.mov', '.webm')
+
+
+def _fit(frame, shape):
+    """Обрезает или дополняет чёрным кадр до размера shape (если окно изменило размер)."""
+    out = np.zeros(shape, dtype=np.uint8)
+    h, w = min(shape[0], frame.shape[0]), min(shape[1], frame.shape[1])
+    out[:h, :w] = frame[:h, :w]
+    return out
+
+
+class FrameSpool:
+    """
+    Последовательность кадров одного размера во временном файле.
+    Размер задаёт первый кадр; память не растёт с числом кадров.
+    """
+
+    def __init__(self, directory=None):
+        self._file = tempfile.TemporaryFile(dir=directory)
+        self.shape = None
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def append_data(self, frame):
+        frame = np.asarray(frame, dtype=np.uint8)[..., :3]
+        if self.shape is None:
+            self.shape = frame.shape
+        elif frame.shape != self.shape:
+            frame = _fit(frame, self.shape)
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            self._file.write(np.ascontiguousarray(frame).tobytes())
+            self._count += 1
+
+    def __iter__(self):
+        size = int(np.prod(self.shape)) if self.shape else 0
+        for i in range(self._count):
+            with self._lock:
+                self._file.seek(i * size)
+                data = self._file.read(size)
+            yield np.frombuffer(data, dtype=np.uint8).reshape(self.shape)
+
+    def close(self):
+        self._file.close()
+
+
+def _gif_blocks(data):
+    """
+    Блок изображения однокадрового GIF data с таблицей цветов кадра:
+    (флаги дескриптора с локальной таблицей, таблица, код LZW).
+    """
+    packed = data[10]
+    pos = 13
+    table, bits = None, 0
+    if packed & 0x80:
+        size = 3 << ((packed & 7) + 1)
+        table, pos = data[pos:pos + size], pos + size
+        bits = packed & 7
+    while data[pos] == 0x21:
+        # Расширения кадра (управление показом, комментарии) пропускаются
+        pos += 2
+        while data[pos]:
+            pos += data[pos] + 1
+        pos += 1
+    if data[pos] != 0x2C:
+        raise ValueError("в кадре GIF нет изображения")
+    local = data[pos + 9]
+    pos += 10
+    if local & 0x80:
+        size = 3 << ((local & 7) + 1)
+        table, pos = data[pos:pos + size], pos + size
+        bits = local & 7
+    if table is None:
+        raise ValueError("в кадре GIF нет таблицы цветов")
+    end = pos + 1
+    while data[end]:
+        end += data[end] + 1
+    # Чересстрочность сохраняется, таблица цветов становится локальной
+    return 0x80 | (local & 0x40) | bits, table, data[pos:end + 1]
+
+
+class _GifWriter:
+    """
+    GIF с одной оптимизированной палитрой на всю анимацию: палитра строится по
+    первому кадру и обязательным цветам colors (медианное сечение), остальные
+    кадры приводятся к ней без дизеринга. Каждый кадр сразу сжимается (Pillow)
+    и дописывается в файл — только прямоугольник, изменившийся с прошлого
+    кадра, — поэтому память не растёт с длиной анимации.
+    """
+
+    def __init__(self, path, fps, palette_size=256, colors=()):
+        self.path = path
+        self.duration = round(1000 / fps)
+        self.palette_size = palette_size
+        self.colors = np.array([[round(255 * c) for c in rgb] for rgb in colors], dtype=np.uint8)
+        self._palette = None
+        self._previous = None
+        self._file = None
+
+    def append_data(self, frame):
+        from PIL import Image
+
+        frame = np.ascontiguousarray(np.asarray(frame, dtype=np.uint8)[..., :3])
+        image = Image.fromarray(frame)
+        if self._palette is None:
+            # Цвета, которых может не быть в первом кадре, добавляются строкой снизу
+            sample = frame
+            if len(self.colors):
+                strip = np.zeros((1, frame.shape[1], 3), dtype=np.uint8)
+                strip[0, :] = np.resize(self.colors, (frame.shape[1], 3))
+                sample = np.concatenate([frame, strip])
+            self._palette = Image.fromarray(sample).quantize(self.palette_size, Image.Quantize.MEDIANCUT)
+        image = image.quantize(palette=self._palette, dither=Image.Dither.NONE)
+        indices = np.asarray(image)
+        left, top, right, bottom = 0, 0, image.width, image.height
+        if self._previous is not None and self._previous.shape == indices.shape:
+            changed = self._previous != indices
+            rows, columns = np.flatnonzero(changed.any(axis=1)), np.flatnonzero(changed.any(axis=0))
+            if len(rows):
+                top, bottom, left, right = rows[0], rows[-1] + 1, columns[0], columns[-1] + 1
+            else:
+                right = bottom = 1
+            image = image.crop((left, top, right, bottom))
+        self._previous = indices
+        buffer = io.BytesIO()
+        image.save(buffer, 'GIF')
+        flags, table, pixels = _gif_blocks(buffer.getvalue())
+        if self._file is None:
+            self._file = open(self.path, 'wb')
+            # Заголовок без общей таблицы цветов и бесконечный повтор (NETSCAPE2.0)
+            self._file.write(b'GIF89a' + struct.pack('<HHBBB', frame.shape[1], frame.shape[0], 0, 0, 0))
+            self._file.write(b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')
+        # Задержка кадра в сотых долях секунды; кадр остаётся под следующим
+        # (способ удаления 1), таблица цветов — локальная для кадра
+        self._file.write(struct.pack('<4BHBB', 0x21, 0xF9, 4, 0x04, round(self.duration / 10), 0, 0))
+        self._file.write(struct.pack('<B4HB', 0x2C, left, top, right - left, bottom - top, flags) + table + pixels)
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.write(b'\x3b')
+        self._file.close()
+        self._file = None
+
+
+def open_writer(path, fps=3, palette_size=256, colors=(), quality=8):
+    """
+    Кодировщик по расширению path: GIF с общей палитрой (colors — цвета RGB
+    в диапазоне [0, 1], которые обязательно попадут в палитру) или видео (H.264).
+    Возвращает объект с методами append_data(frame) и close().
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.gif':
+        return _GifWriter(path, fps, palette_size, colors)
+    if ext in VIDEO_EXTENSIONS:
+        import imageio
+
+        # macro_block_size=16: размеры кадра дополняются до кратных 16 для H.264
+        return imageio.get_writer(path, fps=fps, codec='libx264', quality=quality,
+                                  pixelformat='yuv420p', macro_block_size=16)
+    raise ValueError(f"неподдерживаемый формат анимации: {ext or path}")
+
+
+def export(frames, path, fps=3, **options):
+    """Кодирует кадры (любой итерируемый источник, например FrameSpool) в файл path."""
+    writer = open_writer(path, fps, **options)
+    try:
+        for frame in frames:
+            writer.append_data(frame)
+    finally:
+        writer.close()
+
+
+class BackgroundWriter:
+    """
+    Передаёт кадры приёмнику sink (append_data/close не вызываются из
+    вызывающего потока) через очередь не длиннее maxsize: если приёмник не
+    успевает, write() ждёт, и память остаётся ограниченной.
+    Ошибка приёмника выбрасывается из следующего write() или из close().
+    """
+
+    def __init__(self, sink, maxsize=16, close_sink=False):
+        self.sink = sink
+        self.close_sink = close_sink
+        self.error = None
+        self._queue = queue.Queue(maxsize)
+        self._thread = threading.Thread(target=self._run, name='frame-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+            if self.error is None:
+                try:
+                    self.sink.append_data(frame)
+                except Exception as e:
+                    self.error = e
+        if self.close_sink:
+            try:
+                self.sink.close()
+            except Exception as e:
+                self.error = self.error or e
+
+    def write(self, frame):
+        if self.error is not None:
+            raise self.error
+        self._queue.put(frame)
+
+    def close(self):
+        """Дожидается записи всех кадров из очереди."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
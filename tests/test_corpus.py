@@ -0,0 +1,32 @@
+import io
+import json
+
+import rubik_corpus
+from rubik_cube import RubiksCube
+
+SOLVED = 'U' * 9 + 'R' * 9 + 'F' * 9 + 'D' * 9 + 'L' * 9 + 'B' * 9
+
+
+def test_pack_jsonl_skips_malformed_lines(tmp_path):
+    cube = RubiksCube.solved()
+    cube.apply("R U R' U'")
+    lines = [
+        {'facelets': SOLVED, 'moves': "R U"},
+        {'state': 'é' * 54},
+        {'state': list(cube.to_string())},
+        {'state': 123},
+        {'facelets': SOLVED, 'moves': "R Q"},
+        {'facelets': SOLVED[:53]},
+        {'state': cube.to_string(), 'scramble': "U R U' R'"},
+        {'state': 'W' * 54},
+    ]
+    stream = io.StringIO('\n'.join(json.dumps(line) for line in lines) + '\nnot json\n')
+    path = tmp_path / 'mixed.rcp'
+
+    assert rubik_corpus.pack_jsonl(stream, path) == (2, 7)
+
+    corpus = rubik_corpus.Corpus(path)
+    assert len(corpus) == 2
+    assert corpus.moves(0) == ['R', 'U']
+    assert corpus.cube(1).to_string() == cube.to_string()
+    assert corpus.moves(1) == ['U', 'R', "U'", "R'"]
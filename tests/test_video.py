@@ -0,0 +1,56 @@
+import io
+import struct
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+import rubik_video
+
+
+def _frame(color, square=None):
+    frame = np.zeros((12, 16, 3), dtype=np.uint8)
+    frame[:] = color
+    if square is not None:
+        frame[3:7, 5:9] = square
+    return frame
+
+
+def test_gif_blocks_round_trip():
+    indices = (np.arange(9 * 7).reshape(9, 7) % 5).astype(np.uint8)
+    image = Image.fromarray(indices, 'P')
+    image.putpalette([0, 0, 0, 255, 0, 0, 0, 255, 0, 0, 0, 255, 255, 255, 255])
+    buffer = io.BytesIO()
+    image.save(buffer, 'GIF')
+
+    flags, table, pixels = rubik_video._gif_blocks(buffer.getvalue())
+
+    assert flags & 0x80
+    assert len(table) == 3 << ((flags & 7) + 1)
+    assert pixels[-1] == 0
+    # Из блоков собирается GIF без общей таблицы цветов с теми же пикселями
+    data = (b'GIF89a' + struct.pack('<HHBBB', 7, 9, 0, 0, 0)
+            + struct.pack('<B4HB', 0x2C, 0, 0, 7, 9, flags) + table + pixels + b'\x3b')
+    decoded = Image.open(io.BytesIO(data))
+    assert np.array_equal(np.asarray(decoded.convert('RGB')), np.asarray(image.convert('RGB')))
+
+
+def test_gif_writer_frames_round_trip(tmp_path):
+    frames = [
+        _frame((200, 30, 30)),
+        _frame((200, 30, 30), square=(30, 30, 200)),
+        _frame((200, 30, 30), square=(30, 30, 200)),
+        _frame((30, 200, 30)),
+    ]
+    path = tmp_path / 'anim.gif'
+
+    # Палитра строится по первому кадру, цвета следующих кадров задаются явно
+    colors = [(30 / 255, 30 / 255, 200 / 255), (30 / 255, 200 / 255, 30 / 255)]
+    rubik_video.export(frames, str(path), fps=10, colors=colors)
+
+    with Image.open(path) as gif:
+        assert gif.size == (16, 12)
+        assert gif.info.get('loop') == 0
+        decoded = [np.asarray(frame.convert('RGB')) for frame in ImageSequence.Iterator(gif)]
+    assert len(decoded) == len(frames)
+    for frame, expected in zip(decoded, frames):
+        assert np.array_equal(frame, expected)